@@ -0,0 +1,67 @@
+"""Compares HTMLNode.to_html against compiled render plans on a synthetic page, and measures the cost
+of escaping leaf text inside a plan. Builds compile and render each page once, so "compile+render" is the
+end-to-end comparison; "plan.render" alone only applies when a plan is reused.
+
+    python3 benchmarks/bench_render.py [--paragraphs N] [--repeat N]
+"""
+import argparse
+import pathlib
+import sys
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "src"))
+
+from htmlnode import compile_html
+from utils import markdown_to_html_node
+
+
+def synthetic_markdown(paragraphs:int) -> str:
+    blocks = ["# Benchmark page"]
+    for i in range(paragraphs):
+        blocks.append(f"Paragraph {i} with **bold**, _italic_, `code` and a [link](/blog/{i}) plus ![img](/images/{i}.png).")
+        blocks.append("\n".join(f"- item {j} with [a link](https://example.com/{j})" for j in range(5)))
+        blocks.append("\n".join(f"{j + 1}. step {j}" for j in range(3)))
+    return "\n\n".join(blocks)
+
+
+def unescaped_render(plan) -> str:
+    parts = [None] * (2 * len(plan.slots) + 1)
+    parts[::2] = plan.fragments
+    parts[1::2] = [slot.value for slot in plan.slots]
+    return "".join(parts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paragraphs", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    root = markdown_to_html_node(synthetic_markdown(args.paragraphs))
+    plan = compile_html(root)
+    assert plan.render() == root.to_html()
+
+    to_html = timeit.timeit(root.to_html, number=args.repeat)
+    compile_once = timeit.timeit(lambda: compile_html(root), number=args.repeat)
+    execute = timeit.timeit(plan.render, number=args.repeat)
+    print(f"to_html:        {to_html / args.repeat * 1e3:8.3f} ms/render")
+    print(f"compile_html:   {compile_once / args.repeat * 1e3:8.3f} ms/compile")
+    print(f"plan.render:    {execute / args.repeat * 1e3:8.3f} ms/render  (plan reused; {to_html / execute:.1f}x faster than to_html)")
+    # a build compiles each page's tree once and renders it once, so this is the number that applies to builds
+    print(f"compile+render: {(compile_once + execute) / args.repeat * 1e3:8.3f} ms/page    ({(compile_once + execute) / to_html:.2f}x the time of to_html)")
+
+    # escaping cost: the same plan joined without escaping leaf values, on clean and on hostile text
+    unescaped = lambda: unescaped_render(plan)
+    raw = timeit.timeit(unescaped, number=args.repeat)
+    print(f"escaping:       {(execute - raw) / args.repeat * 1e3:8.3f} ms/render  ({(execute - raw) / execute:.1%} of plan.render, {(execute - raw) / (compile_once + execute):.1%} of compile+render)")
+
+    hostile = markdown_to_html_node(synthetic_markdown(args.paragraphs).replace("item", "a<b & c>d"))
+    hostile_plan = compile_html(hostile)
+    hostile_unescaped = lambda: unescaped_render(hostile_plan)
+    h_exec = timeit.timeit(hostile_plan.render, number=args.repeat)
+    h_raw = timeit.timeit(hostile_unescaped, number=args.repeat)
+    print(f"escaping (<&>): {(h_exec - h_raw) / args.repeat * 1e3:8.3f} ms/render  ({(h_exec - h_raw) / h_exec:.1%} of plan.render, {(h_exec - h_raw) / (compile_once + execute):.1%} of compile+render)")
+
+
+if __name__ == '__main__':
+    main()
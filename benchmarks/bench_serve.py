@@ -0,0 +1,122 @@
+"""Load-tests serve.py against python3 -m http.server on the same directory.
+
+Each server runs in its own process. Client threads then request the site's files for a fixed time, each
+thread on one keep-alive connection (http.server answers HTTP/1.0 and closes it, so its clients reconnect
+per request), and the requests per second and latency percentiles are reported. --revalidate sends the
+ETag from the previous response, as a browser revalidating its cache would. http.server has no
+validators, so it answers 200 with the full body every time.
+
+    python3 benchmarks/bench_serve.py [--root docs] [--clients 16] [--seconds 5] [--revalidate]
+"""
+import argparse
+import http.client
+import http.server
+import multiprocessing
+import os
+import pathlib
+import socket
+import sys
+import threading
+import time
+from functools import partial
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "src"))
+
+from serve import StaticServer
+
+
+def run_stdlib(root: str, ready) -> None:
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=root))
+    ready.send(server.server_address[1])
+    server.serve_forever()
+
+
+def run_serve_static(root: str, ready) -> None:
+    server = StaticServer(("127.0.0.1", 0), root, quiet=True)
+    ready.send(server.server_address[1])
+    server.serve_forever()
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def site_paths(root: pathlib.Path) -> list[str]:
+    paths = list()
+    for path in sorted(root.rglob("*")):
+        if path.is_file() and path.suffix not in (".gz", ".br"):
+            relative = path.relative_to(root).as_posix()
+            paths.append("/" + (relative[:-len("index.html")] if relative.endswith("index.html") else relative))
+    return paths
+
+
+def client(port: int, paths: list[str], deadline: float, revalidate: bool, latencies: list, errors: list) -> None:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    tags = dict()
+    n = 0
+    while time.perf_counter() < deadline:
+        path = paths[n % len(paths)]
+        n += 1
+        headers = {"Accept-Encoding": "gzip, br"}
+        if revalidate and path in tags:
+            headers["If-None-Match"] = tags[path]
+        start = time.perf_counter()
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors.append(path)
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - start)
+        if response.getheader("ETag"):
+            tags[path] = response.getheader("ETag")
+        if response.will_close:
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    connection.close()
+
+
+def load(name: str, target, root: pathlib.Path, clients: int, seconds: float, revalidate: bool) -> None:
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=target, args=(str(root), sender), daemon=True)
+    process.start()
+    port = receiver.recv()
+    paths = site_paths(root)
+    latencies = list()
+    errors = list()
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=client, args=(port, paths, deadline, revalidate, latencies, errors)) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    process.terminate()
+    process.join()
+    latencies.sort()
+    if not latencies:
+        print(f"{name:<14} no successful requests ({len(errors)} errors)")
+        return
+    p = lambda q: latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1e3
+    print(f"{name:<14} {len(latencies) / seconds:9.0f} req/s   p50 {p(0.5):6.2f} ms   p99 {p(0.99):6.2f} ms   {len(errors)} errors")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", type=pathlib.Path, default=pathlib.Path("docs"))
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--revalidate", action="store_true", help="send If-None-Match with the ETag of the previous response")
+    args = parser.parse_args(argv)
+    if not site_paths(args.root):
+        parser.error(f"nothing to serve under {args.root}; build the site first")
+    print(f"{len(site_paths(args.root))} files under {args.root}, {args.clients} clients, {args.seconds:g} s each")
+    load("http.server", run_stdlib, args.root, args.clients, args.seconds, args.revalidate)
+    load("serve-static", run_serve_static, args.root, args.clients, args.seconds, args.revalidate)
+
+
+if __name__ == '__main__':
+    main()
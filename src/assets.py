@@ -0,0 +1,103 @@
+"""Which static assets the built site references, for --prune-assets.
+
+Every src and href in the finished pages (content and template alike) is resolved to a path below the
+static directory, and so are the url(...) targets in their <style> elements and the url(...) and @import
+targets of the stylesheets found that way. Static files that nothing references are orphans: a pruned
+build doesn't copy them, and the build lists them.
+References to other sites, fragments and data: URLs are ignored; a reference to a directory means its
+index.html. Files matching a keep pattern (DEFAULT_KEEP plus --keep-assets) are always copied, since
+crawlers and hosts request them without a link.
+"""
+import fnmatch
+import pathlib
+import posixpath
+import re
+import urllib.parse
+from typing import Optional
+
+DEFAULT_KEEP = ["robots.txt", "favicon.ico", "CNAME", ".nojekyll", "404.html"]
+
+REFERENCE_PATTERN = re.compile(r"""\b(?:src|href)\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.IGNORECASE)
+CSS_REFERENCE_PATTERN = re.compile(r"""url\(\s*(?:"([^"]*)"|'([^']*)'|([^)'"\s]*))\s*\)|@import\s+(?:"([^"]*)"|'([^']*)')""", re.IGNORECASE)
+STYLE_PATTERN = re.compile(r"<style\b[^>]*>(.*?)</style\s*>", re.IGNORECASE | re.DOTALL)
+_SCHEME = re.compile(r"[a-zA-Z][a-zA-Z0-9+.-]*:")
+
+
+def style_urls(html: str) -> list[str]:
+    """The url(...) and @import targets of the page's <style> elements, e.g. stylesheets inlined by --inline-css"""
+    return [next(group for group in m.groups() if group is not None)
+            for style in STYLE_PATTERN.finditer(html) for m in CSS_REFERENCE_PATTERN.finditer(style.group(1))]
+
+
+def site_root(basepath: str) -> str:
+    """"/", or basepath as "/name/" """
+    return "/" + basepath.strip("/") + "/" if basepath.strip("/") else "/"
+
+
+def resolve_url(url: str, base: str, root: str="/") -> Optional[str]:
+    """The site-relative path url refers to from the file at base (itself site-relative) on a site served at
+    root (see site_root), or None when it points outside the site"""
+    url = url.strip().split("#", 1)[0].split("?", 1)[0]
+    if not url or url.startswith("//") or _SCHEME.match(url):
+        return None
+    url = urllib.parse.unquote(url)
+    if url.startswith("/"):
+        if not (url + "/").startswith(root):
+            return None
+        path = url[len(root):]
+    else:
+        path = posixpath.join(posixpath.dirname(base), url)
+    if path == "" or path.endswith("/"):
+        path += "index.html"
+    path = posixpath.normpath(path)
+    if path.startswith("../") or path in (".", ".."):
+        return None
+    return path
+
+
+class AssetReferences:
+    def __init__(self, basepath: str="/", keep: list[str]=()) -> None:
+        self.root = site_root(basepath)
+        self.keep = list(DEFAULT_KEEP) + list(keep)
+        self.referenced = set()   # paths relative to the site root, / separated
+
+    def resolve(self, url: str, base: str) -> Optional[str]:
+        return resolve_url(url, base, self.root)
+
+    def add_page(self, page: str, html: str) -> None:
+        """page - the output's path relative to the destination"""
+        for m in REFERENCE_PATTERN.finditer(html):
+            path = self.resolve(m.group(1) if m.group(1) is not None else m.group(2), page)
+            if path is not None:
+                self.referenced.add(path)
+        for url in style_urls(html):
+            path = self.resolve(url, page)
+            if path is not None:
+                self.referenced.add(path)
+
+    def add_stylesheets(self, static_dir: pathlib.Path) -> None:
+        """Follows url(...) and @import in the referenced stylesheets of static_dir, and in those they reach"""
+        pending = [path for path in self.referenced if path.endswith(".css")]
+        seen = set(pending)
+        while pending:
+            stylesheet = pending.pop()
+            try:
+                css = (static_dir / stylesheet).read_text(errors="replace")
+            except OSError:
+                continue
+            for m in CSS_REFERENCE_PATTERN.finditer(css):
+                url = next(group for group in m.groups() if group is not None)
+                path = self.resolve(url, stylesheet)
+                if path is None:
+                    continue
+                self.referenced.add(path)
+                if path.endswith(".css") and path not in seen:
+                    seen.add(path)
+                    pending.append(path)
+
+    def wanted(self, path: str) -> bool:
+        """Whether the static file at path (relative to the static directory) should be copied"""
+        if path in self.referenced:
+            return True
+        name = path.rpartition("/")[2]
+        return any(fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in self.keep)
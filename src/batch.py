@@ -0,0 +1,82 @@
+"""Markdown to HTML as a filter, for callers that would otherwise start the tool once per document.
+
+    python3 src/batch.py < page.md > page.html                  # one document
+    python3 src/batch.py --jsonl < in.jsonl > out.jsonl         # {"id", "markdown"} -> {"id", "html", "title"}
+    python3 src/batch.py --jsonl --jobs 4 < in.jsonl > out.jsonl
+
+In JSONL mode every input line gets exactly one output line, in input order, flushed as soon as it is
+ready; a record that can't be rendered gets {"id", "error"} instead. With --jobs the documents are rendered
+in worker processes, with a bounded number in flight so memory stays flat on long streams.
+"""
+import argparse
+import collections
+import concurrent.futures
+import json
+import sys
+from typing import Iterable, Iterator
+
+from htmlnode import compile_html
+from utils import markdown_to_html_node, extract_title
+
+# documents submitted ahead of the one being written, per worker
+WINDOW_PER_JOB = 4
+
+
+def render_document(markdown: str) -> tuple[str, str]:
+    """(html, title) for a markdown document; the title is "" when there is no h1"""
+    try:
+        title = extract_title(markdown)
+    except ValueError:
+        title = ""
+    return compile_html(markdown_to_html_node(markdown)).render(), title
+
+
+def render_record(line: str) -> dict:
+    """One JSONL input line -> its output record"""
+    record_id = None
+    try:
+        record = json.loads(line)
+        record_id = record.get("id")
+        html, title = render_document(record["markdown"])
+        return {"id": record_id, "html": html, "title": title}
+    except Exception as e:
+        return {"id": record_id, "error": f"{type(e).__name__}: {e}"}
+
+
+def render_records(lines: Iterable[str], jobs: int=1) -> Iterator[dict]:
+    """Output records for the non-blank lines, in order"""
+    lines = (line for line in lines if line.strip())
+    if jobs <= 1:
+        for line in lines:
+            yield render_record(line)
+        return
+    window = collections.deque()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        for line in lines:
+            window.append(pool.submit(render_record, line))
+            if len(window) >= jobs * WINDOW_PER_JOB:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Render markdown from stdin to HTML on stdout")
+    parser.add_argument("--jsonl", action="store_true", help='read {"id", "markdown"} records, one per line, and write {"id", "html", "title"} records')
+    parser.add_argument("--jobs", type=int, default=1, help="render JSONL records in this many worker processes")
+    args = parser.parse_args(argv)
+
+    if not args.jsonl:
+        html, title = render_document(sys.stdin.read())
+        sys.stdout.write(html)
+        return 0
+    failed = False
+    for record in render_records(sys.stdin, jobs=args.jobs):
+        failed = failed or "error" in record
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
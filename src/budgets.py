@@ -0,0 +1,142 @@
+"""Per-page performance budgets, checked as the build writes each page.
+
+A budget caps one measurement of a page:
+    html    bytes of the page's HTML
+    images  <img> elements in the page's content
+    nodes   elements in the page's content (its HTMLNode tree, without the template)
+    assets  bytes of the static files the finished page loads (src of img, script, source, audio, video and
+            iframe, href of link) plus the url(...) and @import targets of the stylesheets among them and of
+            the page's <style> elements
+
+Nothing is parsed again to measure a page: the element counts come from the PageStats transform's pass over
+the tree, the HTML size from the bytes being written, and the asset sizes from a stat of each static file,
+done once per build. --budget NAME=LIMIT sets a limit for every page and --budget-for GLOB:NAME=LIMIT one
+for the sources matching GLOB (relative to --content); later rules override earlier ones, and a limit of
+"off" lifts the budget.
+"""
+import fnmatch
+import pathlib
+import re
+from typing import Optional
+
+from assets import CSS_REFERENCE_PATTERN, resolve_url, site_root, style_urls
+from scheduler import format_size, parse_size
+
+# name -> whether it is measured in bytes
+METRICS = {"html": True, "images": False, "nodes": False, "assets": True}
+
+LOADED_PATTERN = re.compile(r"""<(?:img|script|source|audio|video|iframe|link)\b[^>]*?\b(?:src|href)\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.IGNORECASE)
+
+
+class OverBudget(Exception):
+    pass
+
+
+def parse_limit(text: str) -> tuple[str, Optional[int]]:
+    """"html=500K" -> ("html", 512000); "images=off" -> ("images", None)"""
+    name, separator, value = text.partition("=")
+    name = name.strip().lower()
+    if not separator or name not in METRICS:
+        raise ValueError(f"invalid budget {text!r}, expected NAME=LIMIT with NAME one of {', '.join(METRICS)}")
+    value = value.strip()
+    if value.lower() == "off":
+        return name, None
+    if METRICS[name]:
+        return name, parse_size(value)
+    if not value.isdigit():
+        raise ValueError(f"invalid budget {text!r}, {name} takes a count")
+    return name, int(value)
+
+
+def parse_override(text: str) -> tuple[str, str, Optional[int]]:
+    """"blog/*:images=60" -> ("blog/*", "images", 60)"""
+    pattern, separator, limit = text.rpartition(":")
+    if not separator or not pattern:
+        raise ValueError(f"invalid budget {text!r}, expected GLOB:NAME=LIMIT")
+    return (pattern, *parse_limit(limit))
+
+
+def format_metric(name: str, value: int) -> str:
+    return format_size(value) if METRICS[name] else str(value)
+
+
+class BudgetViolation:
+    def __init__(self, source: str, metric: str, value: int, limit: int) -> None:
+        self.source = source
+        self.metric = metric
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        return f"{self.source}: {self.metric} {format_metric(self.metric, self.value)} over budget of {format_metric(self.metric, self.limit)}"
+
+
+class PageBudgets:
+    def __init__(self, static_dir: pathlib.Path, basepath: str="/", limits: list[tuple]=(), overrides: list[tuple]=()) -> None:
+        """limits - [(name, limit)] from parse_limit; overrides - [(glob, name, limit)] from parse_override"""
+        self.static_dir = static_dir
+        self.root = site_root(basepath)
+        self.limits = dict(limits)
+        self.overrides = list(overrides)
+        self.sizes = dict()        # static path -> bytes, or 0 if there is no such file
+        self.stylesheets = dict()  # static path of a stylesheet -> the static paths it loads
+        self.pages = 0
+        self.violations = list()
+
+    def limits_for(self, relative: str) -> dict[str, int]:
+        """The limits for the source at relative (to the content directory, / separated); none lifted ones"""
+        limits = dict(self.limits)
+        for pattern, name, limit in self.overrides:
+            if fnmatch.fnmatch(relative, pattern):
+                limits[name] = limit
+        return {name: limit for name, limit in limits.items() if limit is not None}
+
+    def measure(self, page: str, html_bytes: int, html: str, stats: dict) -> dict[str, int]:
+        """page - the output's path relative to the destination; stats - page.data["stats"] from PageStats"""
+        loaded = set()
+        urls = [m.group(1) if m.group(1) is not None else m.group(2) for m in LOADED_PATTERN.finditer(html)]
+        for url in urls + style_urls(html):
+            path = resolve_url(url, page, self.root)
+            if path is not None and path not in loaded:
+                loaded.add(path)
+                if path.endswith(".css"):
+                    loaded.update(self._stylesheet(path))
+        return {"html": html_bytes, "images": stats["images"], "nodes": stats["nodes"], "assets": sum(self._size(path) for path in loaded)}
+
+    def check(self, source: str, relative: str, metrics: dict[str, int]) -> list[BudgetViolation]:
+        """Records and returns the budgets the page is over; source - as reported, relative - as matched by the globs"""
+        self.pages += 1
+        over = [BudgetViolation(source, name, metrics[name], limit) for name, limit in self.limits_for(relative).items() if metrics[name] > limit]
+        self.violations.extend(over)
+        return over
+
+    def report(self) -> str:
+        return f"budgets: {self.pages} pages checked, {len(self.violations)} over budget"
+
+    def _size(self, path: str) -> int:
+        size = self.sizes.get(path)
+        if size is None:
+            try:
+                size = (self.static_dir / path).stat().st_size
+            except OSError:
+                size = 0
+            self.sizes[path] = size
+        return size
+
+    def _stylesheet(self, stylesheet: str) -> set[str]:
+        """Every static path the stylesheet loads, through its @imports too"""
+        loaded = self.stylesheets.get(stylesheet)
+        if loaded is not None:
+            return loaded
+        loaded = self.stylesheets[stylesheet] = set()   # an @import cycle ends here
+        try:
+            css = (self.static_dir / stylesheet).read_text(errors="replace")
+        except OSError:
+            return loaded
+        for m in CSS_REFERENCE_PATTERN.finditer(css):
+            path = resolve_url(next(group for group in m.groups() if group is not None), stylesheet, self.root)
+            if path is not None:
+                loaded.add(path)
+                if path.endswith(".css"):
+                    loaded.update(self._stylesheet(path))
+        return loaded
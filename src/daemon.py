@@ -0,0 +1,173 @@
+"""Long-lived build daemon.
+
+Keeps the interpreter, imports, compiled templates, content directory listings and rendered pages warm
+between requests so editor integrations and hooks only pay for a socket round trip (see ssgc.py).
+
+Protocol: one JSON object per line in each direction.
+    {"cmd": "build", "args": ["--destination", "docs"], "cwd": "/site"} -> {"ok": true, "output": "<build log>"}
+    {"cmd": "render", "markdown": "# Hi"}                -> {"ok": true, "html": "<div>...</div>", "title": "Hi"}
+    {"cmd": "ping"} / {"cmd": "flush"} / {"cmd": "shutdown"}
+"""
+import argparse
+import collections
+import contextlib
+import hashlib
+import io
+import json
+import os
+import pathlib
+import socketserver
+import threading
+import traceback
+
+from main import build, build_parser
+from batch import render_document
+from discovery import IGNORE_FILE, Source, walk_sources
+from templates import TemplateLoader, layout_stamp
+
+DEFAULT_SOCKET = "./.ssg_cache/daemon.sock"
+# "render" results kept, least recently used dropped first
+RENDER_CACHE_SIZE = 256
+
+
+def resolve_paths(args: argparse.Namespace, cwd: str) -> argparse.Namespace:
+    """Makes the path arguments of a build absolute against the client's working directory, not the daemon's"""
+    for name, value in vars(args).items():
+        if isinstance(value, pathlib.Path) and not value.is_absolute():
+            setattr(args, name, pathlib.Path(cwd) / value)
+    return args
+
+
+class WarmState:
+    def __init__(self) -> None:
+        self.pages = dict()      # source path -> ((mtime_ns, size), (html, title)), see generate_page
+        self.listings = dict()   # content dir -> ({directory: mtime_ns}, .ssgignore mtime_ns, [Source])
+        self.rendered = collections.OrderedDict()   # sha256 of markdown -> (html, title) for "render" requests, least recent first
+        self.templates = TemplateLoader()
+        self.layouts = dict()    # content directory -> layout name from .layout files
+        self.layout_stamps = dict()   # content directory -> .layout mtime_ns (None without one) when it was read
+
+    def list_markdown(self, content_dir: pathlib.Path) -> list[Source]:
+        """Returns every source walk_sources finds under content_dir; the previous walk is reused when neither a
+        directory's mtime nor the .ssgignore file has changed"""
+        key = str(content_dir)
+        ignore_mtime = self._ignore_mtime(content_dir)
+        cached = self.listings.get(key)
+        if cached is not None:
+            dir_mtimes, cached_ignore_mtime, files = cached
+            try:
+                if cached_ignore_mtime == ignore_mtime and all(os.stat(d).st_mtime_ns == m for d, m in dir_mtimes.items()):
+                    return files
+            except OSError:
+                pass
+        dir_mtimes = dict()
+        files = list(walk_sources(content_dir, dir_mtimes=dir_mtimes))
+        self.listings[key] = (dir_mtimes, ignore_mtime, files)
+        return files
+
+    @staticmethod
+    def _ignore_mtime(content_dir: pathlib.Path):
+        try:
+            return os.stat(content_dir / IGNORE_FILE).st_mtime_ns
+        except OSError:
+            return None
+
+    def check_layouts(self) -> None:
+        """Forgets the directory layouts if any .layout file read for them was added, edited or removed since.
+        Names are inherited by subdirectories, so the whole cache goes rather than single entries"""
+        if any(layout_stamp(pathlib.Path(d)) != stamp for d, stamp in self.layout_stamps.items()):
+            self.layouts.clear()
+            self.layout_stamps.clear()
+
+    def render(self, markdown: str) -> tuple[str, str]:
+        key = hashlib.sha256(markdown.encode()).digest()
+        cached = self.rendered.get(key)
+        if cached is not None:
+            self.rendered.move_to_end(key)
+            return cached
+        cached = render_document(markdown)
+        self.rendered[key] = cached
+        if len(self.rendered) > RENDER_CACHE_SIZE:
+            self.rendered.popitem(last=False)
+        return cached
+
+    def flush(self) -> None:
+        self.pages.clear()
+        self.listings.clear()
+        self.rendered.clear()
+        self.templates.memory.clear()
+        self.layouts.clear()
+        self.layout_stamps.clear()
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                response = self.server.dispatch(json.loads(line))
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class BuildDaemon(socketserver.UnixStreamServer):
+    """Serves requests one at a time; builds redirect stdout, so they must not overlap"""
+
+    def __init__(self, socket_path: str) -> None:
+        self.state = WarmState()
+        self.socket_path = socket_path
+        super().__init__(socket_path, DaemonHandler)
+
+    def dispatch(self, request: dict) -> dict:
+        match request.get("cmd"):
+            case "ping":
+                return {"ok": True}
+            case "build":
+                log = io.StringIO()
+                with contextlib.redirect_stdout(log):
+                    try:
+                        args = build_parser().parse_args(request.get("args", []))
+                    except SystemExit:
+                        return {"ok": False, "error": "invalid build arguments"}
+                    if request.get("cwd"):
+                        resolve_paths(args, request["cwd"])
+                    build(args, state=self.state)
+                return {"ok": True, "output": log.getvalue()}
+            case "render":
+                html, title = self.state.render(request["markdown"])
+                return {"ok": True, "html": html, "title": title}
+            case "flush":
+                self.state.flush()
+                return {"ok": True}
+            case "shutdown":
+                # shutdown() blocks until serve_forever returns, so it can't be called from the handler itself
+                threading.Thread(target=self.shutdown, daemon=True).start()
+                return {"ok": True}
+            case other:
+                return {"ok": False, "error": f"unknown command {other!r}"}
+
+    def server_close(self) -> None:
+        super().server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.socket_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the static site generator as a warm build daemon")
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET)
+    args = parser.parse_args(argv)
+
+    pathlib.Path(args.socket).parent.mkdir(parents=True, exist_ok=True)
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(args.socket)
+    with BuildDaemon(args.socket) as server:
+        print(f"listening on {args.socket}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
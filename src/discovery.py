@@ -0,0 +1,116 @@
+"""Streaming discovery of markdown sources.
+
+walk_sources walks the content directory with os.scandir and yields each source as soon as it is found,
+so pages can start rendering before the walk finishes. Entries matched by the ignore rules are skipped,
+and an ignored directory is not descended into at all.
+
+Ignore rules come from a .ssgignore file at the top of the content directory, one pattern per line in the
+style of .gitignore:
+    # comment
+    drafts/          a trailing / matches directories only
+    vendor/*/docs    a pattern containing / matches the path relative to the content directory
+    *.tmp.md         anything else matches the entry's name at any depth
+    !keep.tmp.md     a leading ! re-includes what an earlier pattern excluded
+DEFAULT_IGNORE (hidden directories, editor lock and backup files) applies before the file's patterns.
+"""
+import fnmatch
+import os
+import pathlib
+import re
+from typing import Iterator, Optional
+
+IGNORE_FILE = ".ssgignore"
+DEFAULT_IGNORE = [".*/", ".#*", "*~", "#*#"]
+
+
+class IgnoreRules:
+    def __init__(self, patterns: list[str]=()) -> None:
+        self.rules = list()   # (compiled pattern, negated, directories only, matches the relative path)
+        for line in patterns:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated:
+                line = line[1:]
+            directory_only = line.endswith("/")
+            line = line.strip("/") if directory_only else line.lstrip("/")
+            if not line:
+                continue
+            self.rules.append((re.compile(fnmatch.translate(line)), negated, directory_only, "/" in line))
+
+    @classmethod
+    def load(cls, content_dir: pathlib.Path) -> "IgnoreRules":
+        patterns = list(DEFAULT_IGNORE)
+        try:
+            patterns.extend((content_dir / IGNORE_FILE).read_text().splitlines())
+        except OSError:
+            pass
+        return cls(patterns)
+
+    def ignored(self, relative: str, name: str, is_dir: bool) -> bool:
+        """relative - the entry's path below the content directory, with / separators; the last matching rule decides"""
+        for pattern, negated, directory_only, by_path in reversed(self.rules):
+            if directory_only and not is_dir:
+                continue
+            if pattern.match(relative if by_path else name):
+                return not negated
+        return False
+
+    def excluded(self, relative: str, is_dir: bool) -> bool:
+        """Whether a walk would skip the entry: it is ignored itself or lies below an ignored directory"""
+        parts = relative.split("/")
+        for depth in range(1, len(parts)):
+            if self.ignored("/".join(parts[:depth]), parts[depth - 1], True):
+                return True
+        return self.ignored(relative, parts[-1], is_dir)
+
+
+class Source:
+    __slots__ = ("path", "relative", "size")
+
+    def __init__(self, path: str, relative: str, size: int) -> None:
+        self.path = path           # as found, e.g. content/blog/tom/index.md
+        self.relative = relative   # below the content directory, e.g. blog/tom/index.md
+        self.size = size
+
+    @property
+    def name(self) -> str:
+        return self.relative.rpartition("/")[2]
+
+
+def walk_sources(content_dir: pathlib.Path, ignore: Optional[IgnoreRules]=None, suffix: str=".md", dir_mtimes: Optional[dict]=None, below: str="") -> Iterator[Source]:
+    """Yields every file ending in suffix below content_dir that the ignore rules (default: IgnoreRules.load)
+    don't exclude. dir_mtimes, if given, receives {directory path: st_mtime_ns} for every directory walked.
+    below - walk only this subdirectory (relative to content_dir, / separated)"""
+    if ignore is None:
+        ignore = IgnoreRules.load(content_dir)
+    below = below.strip("/")
+    stack = [(os.path.join(content_dir, below) if below else str(content_dir), below + "/" if below else "")]
+    while stack:
+        directory, prefix = stack.pop()
+        try:
+            scanner = os.scandir(directory)
+        except OSError:
+            continue
+        with scanner:
+            if dir_mtimes is not None:
+                dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+            subdirectories = list()
+            for entry in scanner:
+                relative = prefix + entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if ignore.ignored(relative, entry.name, is_dir):
+                    continue
+                if is_dir:
+                    subdirectories.append((entry.path, relative + "/"))
+                elif entry.name.endswith(suffix):
+                    try:
+                        size = entry.stat().st_size
+                    except OSError:
+                        continue
+                    yield Source(entry.path, relative, size)
+        stack.extend(reversed(subdirectories))
@@ -0,0 +1,135 @@
+"""sitemap.xml and an Atom feed, generated from a page metadata index kept in the build cache.
+
+The index holds, per page URL, the page's title, output path, source hash and modification time. Every
+build updates the entries of the pages it renders, and only a changed source hash moves a page's
+modification time forward, so a fresh checkout (every mtime new) changes nothing. Feeds and sitemaps are
+written from the index alone, never by rescanning the sources, and their bytes only change when one of
+their entries does. Unchanged files are not rewritten.
+
+Written under <destination>/:
+    sitemap.xml          every page, or with more than SITEMAP_LIMIT pages a sitemap index of
+    sitemap-<n>.xml      shards; a page's shard is picked by a hash of its URL, so adding pages
+                         rewrites one shard rather than shifting every later one
+    <section>/atom.xml   the FEED_ENTRIES most recently changed pages below content/<section>/
+"""
+import datetime
+import json
+import pathlib
+import zlib
+from typing import Callable, Optional
+from xml.sax.saxutils import escape, quoteattr
+
+from output import write_if_changed
+from search import page_url
+
+# most URLs the sitemap protocol allows in one file
+SITEMAP_LIMIT = 50000
+FEED_ENTRIES = 20
+
+
+def w3c_datetime(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(int(timestamp), datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class PageIndex:
+    def __init__(self, state_path: Optional[pathlib.Path]=None) -> None:
+        self.state_path = state_path
+        self.pages = dict()   # url -> {"title", "path", "hash", "mtime"}
+        self.seen = set()
+        self.changed = 0
+        if state_path is not None and state_path.exists():
+            try:
+                self.pages = json.loads(state_path.read_text())
+            except (OSError, ValueError):
+                pass
+
+    def add_page(self, url: str, path: str, title: str, source_sha256: str, mtime: float) -> None:
+        """path - the output relative to the destination; mtime - the source's, used only if its hash changed"""
+        self.seen.add(url)
+        entry = self.pages.get(url)
+        if entry is not None and entry["hash"] == source_sha256 and entry["title"] == title and entry["path"] == path:
+            return
+        if entry is not None and entry["hash"] == source_sha256:
+            mtime = entry["mtime"]
+        self.changed += 1
+        self.pages[url] = {"title": title, "path": path, "hash": source_sha256, "mtime": mtime}
+
+    def write(self, destination_dir: pathlib.Path, site_url: str, basepath: str="/", feed_section: Optional[str]=None, prune: bool=True,
+              write: Callable[[pathlib.Path, bytes], bool]=write_if_changed, shard_size: int=SITEMAP_LIMIT) -> dict[pathlib.Path, bool]:
+        """Drops pages not seen this build (unless prune is False, for partial builds), writes the sitemap and, if
+        feed_section is given, its feed, and returns {path: whether it was written}.
+        site_url - the scheme and host the site is served from, e.g. https://example.com; page URLs (which
+        include basepath) are appended to it"""
+        if prune:
+            for url in list(self.pages.keys() - self.seen):
+                del self.pages[url]
+        origin = site_url.rstrip("/")
+        written = dict()
+        for path, data in self.sitemaps(origin, basepath, shard_size):
+            written[destination_dir / path] = write(destination_dir / path, data)
+        if feed_section:
+            section = feed_section.strip("/")
+            written[destination_dir / section / "atom.xml"] = write(destination_dir / section / "atom.xml", self.feed(origin, basepath, section))
+        return written
+
+    def sitemaps(self, origin: str, basepath: str="/", shard_size: int=SITEMAP_LIMIT) -> list[tuple[str, bytes]]:
+        """[(path, bytes)] of sitemap.xml and its shards, if there are more pages than fit in one file"""
+        urls = sorted(self.pages)
+        # a power of two with room for twice the pages, so shards are rarely full and the count changes seldom
+        shards = 1
+        while shards * shard_size < 2 * len(urls) and len(urls) > shard_size:
+            shards *= 2
+        buckets = [urls]
+        while True:
+            if shards > 1:
+                buckets = [[] for _ in range(shards)]
+                for url in urls:
+                    buckets[zlib.crc32(url.encode()) % shards].append(url)
+            if all(len(bucket) <= shard_size for bucket in buckets):
+                break
+            shards *= 2
+        if shards == 1:
+            return [("sitemap.xml", self._urlset(origin, urls))]
+        files = list()
+        index = ['<?xml version="1.0" encoding="UTF-8"?>', '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+        for number, bucket in enumerate(buckets, 1):
+            name = f"sitemap-{number}.xml"
+            files.append((name, self._urlset(origin, bucket)))
+            lastmod = max((self.pages[url]["mtime"] for url in bucket), default=0)
+            index.append(f"<sitemap><loc>{escape(origin + page_url(pathlib.Path(name), basepath))}</loc><lastmod>{w3c_datetime(lastmod)}</lastmod></sitemap>")
+        index.append("</sitemapindex>")
+        files.append(("sitemap.xml", ("\n".join(index) + "\n").encode("utf-8")))
+        return files
+
+    def _urlset(self, origin: str, urls: list[str]) -> bytes:
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+        for url in urls:
+            lines.append(f"<url><loc>{escape(origin + url)}</loc><lastmod>{w3c_datetime(self.pages[url]['mtime'])}</lastmod></url>")
+        lines.append("</urlset>")
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def feed(self, origin: str, basepath: str, section: str) -> bytes:
+        """Atom feed of the pages below section (by output path), most recently changed first"""
+        prefix = section + "/"
+        index_page = prefix + "index.html"
+        entries = [(url, page) for url, page in self.pages.items() if page["path"].startswith(prefix) and page["path"] != index_page]
+        entries.sort(key=lambda item: (-item[1]["mtime"], item[0]))
+        entries = entries[:FEED_ENTRIES]
+        section_page = next((page for page in self.pages.values() if page["path"] == index_page), None)
+        title = section_page["title"] if section_page is not None else section
+        section_url = origin + page_url(pathlib.Path(index_page), basepath)
+        updated = max((page["mtime"] for url, page in entries), default=0)
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<feed xmlns="http://www.w3.org/2005/Atom">',
+                 f"<title>{escape(title)}</title>", f"<id>{escape(section_url)}</id>",
+                 f"<link href={quoteattr(section_url)}/>", f'<link rel="self" href={quoteattr(section_url + "atom.xml")}/>',
+                 f"<updated>{w3c_datetime(updated)}</updated>"]
+        for url, page in entries:
+            link = origin + url
+            lines.append(f'<entry><title>{escape(page["title"])}</title><id>{escape(link)}</id><link href={quoteattr(link)}/><updated>{w3c_datetime(page["mtime"])}</updated></entry>')
+        lines.append("</feed>")
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def save(self) -> None:
+        if self.state_path is None:
+            return
+        write_if_changed(self.state_path, json.dumps(self.pages, indent=1, sort_keys=True).encode("utf-8"))
@@ -0,0 +1,159 @@
+"""Build-time syntax highlighting for fenced code blocks.
+
+A small regex lexer per language splits code into (css class, text) tokens, which block_to_code_node turns
+into <span class="tok-...">s. Token lists are cached by (language, sha256 of the code), in memory for the
+life of the process and optionally on disk across builds, since the same snippets repeat across pages.
+"""
+import hashlib
+import json
+import pathlib
+import re
+from typing import Optional
+
+from output import write_if_changed
+
+_STRING = r"""(?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')"""
+_NUMBER = r"(?P<number>\b(?:0[xX][0-9a-fA-F]+|\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)\b)"
+
+
+def _keywords(words: str) -> str:
+    return r"(?P<keyword>\b(?:" + "|".join(words.split()) + r")\b)"
+
+
+LEXERS = {
+    "python": re.compile("|".join([
+        r"(?P<comment>#[^\n]*)",
+        r'''(?P<string>(?:[rRbBfF]{1,2})?(?:"""(?:[^"\\]|\\[\s\S]|"(?!""))*(?:"""|\Z)|\'\'\'(?:[^'\\]|\\[\s\S]|'(?!''))*(?:\'\'\'|\Z)|"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'))''',
+        _keywords("False None True and as assert async await break class continue def del elif else except finally "
+                  "for from global if import in is lambda match case nonlocal not or pass raise return try while with yield"),
+        r"(?P<builtin>\b(?:print|len|range|dict|list|set|tuple|str|int|float|bool|open|super|self|isinstance|enumerate|zip)\b)",
+        _NUMBER,
+    ])),
+    "javascript": re.compile("|".join([
+        r"(?P<comment>//[^\n]*|/\*(?:[^*]|\*(?!/))*(?:\*/|\Z))",
+        r"(?P<string>`(?:[^`\\]|\\[\s\S])*(?:`|\Z)|" + _STRING[len("(?P<string>"):],
+        _keywords("async await break case catch class const continue debugger default delete do else export extends "
+                  "false finally for function if import in instanceof let new null of return super switch this throw "
+                  "true try typeof undefined var void while yield"),
+        _NUMBER,
+    ])),
+    "bash": re.compile("|".join([
+        r"(?P<comment>(?<![\w$])#[^\n]*)",
+        _STRING,
+        _keywords("if then else elif fi for while until do done case esac function in return export local"),
+        r"(?P<variable>\$\{[^}\n]*\}|\$\w+)",
+    ])),
+    "json": re.compile("|".join([
+        r'(?P<key>"(?:[^"\\\n]|\\.)*"(?=\s*:))',
+        r'(?P<string>"(?:[^"\\\n]|\\.)*")',
+        _keywords("true false null"),
+        r"(?P<number>-?\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b)",
+    ])),
+    "css": re.compile("|".join([
+        r"(?P<comment>/\*(?:[^*]|\*(?!/))*(?:\*/|\Z))",
+        _STRING,
+        r"(?P<property>[\w-]+(?=\s*:[^;{}]*[;}]))",
+        r"(?P<number>#[0-9a-fA-F]{3,8}\b|-?\b\d+(?:\.\d+)?(?:px|em|rem|%|vh|vw|s|ms)?)",
+    ])),
+}
+
+ALIASES = {"py": "python", "js": "javascript", "sh": "bash", "shell": "bash", "console": "bash"}
+
+
+def canonical_language(language: Optional[str]) -> Optional[str]:
+    """The LEXERS name for a fence language or one of its aliases ("py" -> "python"), None if unsupported"""
+    if not language:
+        return None
+    language = language.lower()
+    language = ALIASES.get(language, language)
+    return language if language in LEXERS else None
+
+
+def lexer_for(language: Optional[str]):
+    canonical = canonical_language(language)
+    return LEXERS[canonical] if canonical is not None else None
+
+
+def tokenize(code: str, lexer) -> list[tuple[Optional[str], str]]:
+    """Splits code into (token class or None for plain text, text); the texts concatenate back to code"""
+    tokens = list()
+    position = 0
+    for m in lexer.finditer(code):
+        if m.start() == m.end():
+            continue
+        if m.start() > position:
+            tokens.append((None, code[position:m.start()]))
+        tokens.append((m.lastgroup, m.group()))
+        position = m.end()
+    if position < len(code):
+        tokens.append((None, code[position:]))
+    return tokens
+
+
+class HighlightCache:
+    def __init__(self, cache_path: Optional[pathlib.Path]=None) -> None:
+        self.cache_path = None
+        self.entries = dict()   # "language:sha256" -> [[class or None, text], ...], keyed by canonical language
+        self.used = set()       # keys looked up since the last save; save(prune=True) keeps only these
+        self.dirty = False
+        self.log = None         # when a list, new entries are also appended as (key, tokens); see merge
+        self.hits = 0
+        self.misses = 0
+        if cache_path is not None:
+            self.load(cache_path)
+
+    def load(self, cache_path: pathlib.Path) -> None:
+        """Switches the cache to cache_path's entries; loading the file it already uses keeps the warm entries"""
+        if cache_path == self.cache_path:
+            return
+        self.cache_path = cache_path
+        self.entries = dict()
+        self.used = set()
+        self.dirty = False
+        if cache_path.exists():
+            try:
+                self.entries.update(json.loads(cache_path.read_text()))
+            except (OSError, ValueError):
+                pass
+
+    def highlight(self, code: str, language: Optional[str]) -> Optional[list[tuple[Optional[str], str]]]:
+        """Tokens for code, or None when there is no lexer for language"""
+        canonical = canonical_language(language)
+        if canonical is None:
+            return None
+        key = f"{canonical}:{hashlib.sha256(code.encode()).hexdigest()}"
+        self.used.add(key)
+        tokens = self.entries.get(key)
+        if tokens is not None:
+            self.hits += 1
+            return tokens
+        self.misses += 1
+        tokens = tokenize(code, LEXERS[canonical])
+        self.entries[key] = tokens
+        self.dirty = True
+        if self.log is not None:
+            self.log.append((key, tokens))
+        return tokens
+
+    def merge(self, log: list, used: set) -> None:
+        """Adds the entries and lookups of another copy of the cache, e.g. in a worker process"""
+        for key, tokens in log:
+            self.entries[key] = tokens
+            self.dirty = True
+        self.used.update(used)
+
+    def save(self, prune: bool=True) -> None:
+        """Writes the cache. prune - first drop entries not looked up since the last save, i.e. snippets no page
+        of this build contains any more (pass False after a partial build)"""
+        if prune and len(self.used) < len(self.entries):
+            self.entries = {key: tokens for key, tokens in self.entries.items() if key in self.used}
+            self.dirty = True
+        self.used = set()
+        if self.cache_path is None or not self.dirty:
+            return
+        write_if_changed(self.cache_path, json.dumps(self.entries).encode("utf-8"))
+        self.dirty = False
+
+
+# used by block_to_code_node; the build points it at a file under --cache-dir to persist it across builds
+default_cache = HighlightCache()
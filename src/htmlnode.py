@@ -1,5 +1,26 @@
 from typing import Optional
 
+SELF_CLOSING_TAGS = frozenset({"img", "br", "hr", "input", "meta", "link"})
+
+
+def escape_text(s:str) -> str:
+    """Escapes &, < and > for use as element content. Strings without them are returned as-is without copying.
+    A chain of str.replace calls is used rather than str.translate, which is far slower for multi-character
+    replacements on page-sized text"""
+    if "&" in s or "<" in s or ">" in s:
+        return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return s
+
+
+def escape_attr(s) -> str:
+    """Escapes &, <, > and " for use inside a double-quoted attribute value"""
+    if s.__class__ is not str:
+        s = str(s)
+    if "&" in s or "<" in s or ">" in s or '"' in s:
+        return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+    return s
+
+
 class HTMLNode:
     def __init__(self, tag:Optional[str]=None, value:Optional[str]=None, children:Optional[list]=None, props:Optional[dict]=None) -> None:
         """tag - A string representing the HTML tag name (e.g. "p", "a", "h1", etc.)
@@ -17,7 +38,7 @@ class HTMLNode:
     def props_to_html(self) -> str:
         if self.props is None:
             return ""
-        fragments = [f'{key}="{value}"' for key, value in self.props.items()]
+        fragments = [f'{key}="{escape_attr(value)}"' for key, value in self.props.items()]
         return " ".join(fragments)
 
     def __repr__(self) -> str:
@@ -37,16 +58,15 @@ class LeafNode(HTMLNode):
         if self.props is None or len(self.props) == 0:
             prop_string = ""
         else:
-            prop_fragments = [f'{key}="{value}"' for key, value in self.props.items()]
+            prop_fragments = [f'{key}="{escape_attr(value)}"' for key, value in self.props.items()]
             prop_string = " " +  " ".join(prop_fragments)
 
-        self_closing_tags = {"img", "br", "hr", "input", "meta", "link"}
         if self.tag is None or self.tag == "":
-            return self.value
-        elif self.tag in self_closing_tags:
+            return escape_text(self.value)
+        elif self.tag in SELF_CLOSING_TAGS:
             return f'<{self.tag}{prop_string}/>'
         else:
-            return f'<{self.tag}{prop_string}>{self.value}</{self.tag}>'
+            return f'<{self.tag}{prop_string}>{escape_text(self.value)}</{self.tag}>'
 
 class ParentNode(HTMLNode):
     def __init__(self, tag:str, children:list, props:Optional[dict]=None) -> None:
@@ -76,6 +96,119 @@ class ParentNode(HTMLNode):
             inner_string = "".join(fragments)
         else:
             inner_string = ""
-        start = f"<{self.tag}>"
+        if self.props:
+            start = f"<{self.tag} {self.props_to_html()}>"
+        else:
+            start = f"<{self.tag}>"
         end = f"</{self.tag}>"
-        return start + inner_string + end
\ No newline at end of file
+        return start + inner_string + end
+
+
+# pre-rendered opening tags without props or with only a class, keyed by (tag, class, self_closing); these
+# few shapes repeat on every page, while tags carrying an href or src are mostly unique and are not kept
+_open_tag_cache = dict()
+
+
+def _open_tag(tag:str, props:Optional[dict], self_closing:bool=False) -> str:
+    if props and (len(props) > 1 or "class" not in props):
+        prop_string = "".join(f' {k}="{escape_attr(v)}"' for k, v in props.items())
+        return f"<{tag}{prop_string}/>" if self_closing else f"<{tag}{prop_string}>"
+    key = (tag, props["class"] if props else None, self_closing)
+    cached = _open_tag_cache.get(key)
+    if cached is None:
+        prop_string = f' class="{escape_attr(props["class"])}"' if props else ""
+        cached = f"<{tag}{prop_string}/>" if self_closing else f"<{tag}{prop_string}>"
+        _open_tag_cache[key] = cached
+    return cached
+
+
+class _Rendered:
+    """Plan slot for a node type the compiler doesn't know; defers to its own to_html at execution time"""
+    __slots__ = ("node",)
+
+    def __init__(self, node:HTMLNode) -> None:
+        self.node = node
+
+    @property
+    def value(self) -> str:
+        return self.node.to_html()
+
+
+class RenderPlan:
+    """A flattened HTMLNode tree: pre-rendered static fragments interleaved with slots, the LeafNodes whose
+    value is read (and escaped) when the plan is executed. Tags and props are fixed at compile time; leaf
+    values are not. Output is fragments[0] + slot[0] + fragments[1] + ... + fragments[-1]."""
+    __slots__ = ("fragments", "slots", "leaf_only")
+
+    def __init__(self, fragments:list[str], slots:list) -> None:
+        self.fragments = fragments
+        self.slots = slots
+        self.leaf_only = all(slot.__class__ is LeafNode for slot in slots)
+
+    def render(self) -> str:
+        slots = self.slots
+        if self.leaf_only:
+            values = [slot.value for slot in slots]
+            # escape the whole page's text in one pass; most pages have nothing to escape at all
+            joined = "\x00".join(values)
+            if "&" in joined or "<" in joined or ">" in joined:
+                escaped = escape_text(joined).split("\x00")
+                values = escaped if len(escaped) == len(values) else [escape_text(v) for v in values]
+        else:
+            values = [escape_text(slot.value) if slot.__class__ is LeafNode else slot.value for slot in slots]
+        parts = [None] * (2 * len(slots) + 1)
+        parts[::2] = self.fragments
+        parts[1::2] = values
+        return "".join(parts)
+
+
+def compile_html(node:HTMLNode) -> RenderPlan:
+    """Compiles a tree into a RenderPlan; plan.render() == node.to_html() (and raises the same errors up front)"""
+    fragments = list()
+    slots = list()
+    pending = list()   # static text since the last slot
+    add_fragment = fragments.append
+    add_slot = slots.append
+    emit = pending.append
+    join = "".join
+
+    # iterative traversal; a str on the stack is a closing tag to emit once its children are done
+    stack = [node]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        current = pop()
+        cls = current.__class__
+        if cls is str:
+            emit(current)
+        elif cls is LeafNode:
+            if current.value is None:
+                raise ValueError
+            tag = current.tag
+            if tag is None or tag == "":
+                add_fragment(join(pending))
+                pending.clear()
+                add_slot(current)
+            elif tag in SELF_CLOSING_TAGS:
+                emit(_open_tag(tag, current.props, self_closing=True))
+            else:
+                emit(_open_tag(tag, current.props))
+                add_fragment(join(pending))
+                pending.clear()
+                add_slot(current)
+                emit(f"</{tag}>")
+        elif cls is ParentNode:
+            if current.tag is None:
+                raise ValueError
+            children = current.children
+            if children is None or len(children) == 0:
+                raise ValueError
+            emit(_open_tag(current.tag, current.props))
+            push(f"</{current.tag}>")
+            stack.extend(reversed(children))
+        else:
+            add_fragment(join(pending))
+            pending.clear()
+            add_slot(_Rendered(current))
+    fragments.append("".join(pending))
+    return RenderPlan(fragments, slots)
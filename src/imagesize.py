@@ -0,0 +1,190 @@
+import hashlib
+import json
+import pathlib
+import struct
+from typing import Optional
+from urllib.parse import unquote, urlparse
+
+from htmlnode import HTMLNode
+
+# number of bytes read up front; enough for PNG/GIF/WebP headers and the first JPEG segments
+HEADER_BYTES = 4096
+
+# JPEG start-of-frame markers carrying the image dimensions (C4, C8 and CC are not frames)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _png_size(head: bytes) -> Optional[tuple[int, int]]:
+    if len(head) < 24 or head[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", head[16:24])
+
+
+def _gif_size(head: bytes) -> Optional[tuple[int, int]]:
+    if len(head) < 10:
+        return None
+    return struct.unpack("<HH", head[6:10])
+
+
+def _webp_size(head: bytes) -> Optional[tuple[int, int]]:
+    chunk = head[12:16]
+    if chunk == b"VP8 " and len(head) >= 30:
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(head) >= 25:
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X" and len(head) >= 30:
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def _jpeg_size(f) -> Optional[tuple[int, int]]:
+    """Walks the JPEG marker segments, seeking over their payloads, until a start-of-frame marker is found"""
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        code = marker[1]
+        # fill bytes and standalone markers have no length field
+        if code == 0xFF:
+            f.seek(-1, 1)
+            continue
+        if code in (0x01, 0xD8) or 0xD0 <= code <= 0xD7:
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        (length,) = struct.unpack(">H", length_bytes)
+        if code in JPEG_SOF_MARKERS:
+            frame = f.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">HH", frame[1:5])
+            return width, height
+        f.seek(length - 2, 1)
+
+
+def probe_image_size(path: pathlib.Path) -> Optional[tuple[int, int]]:
+    """Returns (width, height) of a PNG, JPEG, GIF or WebP file by reading only its header, or None if unrecognised"""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(HEADER_BYTES)
+            if head[:8] == b"\x89PNG\r\n\x1a\n":
+                size = _png_size(head)
+            elif head[:6] in (b"GIF87a", b"GIF89a"):
+                size = _gif_size(head)
+            elif head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                size = _webp_size(head)
+            elif head[:2] == b"\xff\xd8":
+                size = _jpeg_size(f)
+            else:
+                size = None
+    except (OSError, struct.error):
+        return None
+    if size is None:
+        return None
+    return int(size[0]), int(size[1])
+
+
+def file_digest(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ImageSizeCache:
+    """Persistent cache of image dimensions keyed by file content hash.
+
+    The hash of each file is itself remembered against its path, size and mtime so an unchanged
+    image is neither re-hashed nor re-probed on later builds."""
+
+    def __init__(self, cache_path: Optional[pathlib.Path]=None) -> None:
+        self.cache_path = cache_path
+        self.files = dict()   # path -> [size, mtime_ns, digest]
+        self.sizes = dict()   # digest -> [width, height] or None
+        self.dirty = False
+        self.log = None       # when a list, every new entry is also appended as (table, key, value); see merge
+        if cache_path is not None and cache_path.exists():
+            try:
+                data = json.loads(cache_path.read_text())
+                self.files = data.get("files", {})
+                self.sizes = data.get("sizes", {})
+            except (OSError, ValueError):
+                pass
+
+    def get(self, path: pathlib.Path) -> Optional[tuple[int, int]]:
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        key = str(path)
+        entry = self.files.get(key)
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            digest = entry[2]
+        else:
+            digest = file_digest(path)
+            self.files[key] = [st.st_size, st.st_mtime_ns, digest]
+            self.dirty = True
+            if self.log is not None:
+                self.log.append(("files", key, self.files[key]))
+        if digest not in self.sizes:
+            self.sizes[digest] = probe_image_size(path)
+            self.dirty = True
+            if self.log is not None:
+                self.log.append(("sizes", digest, self.sizes[digest]))
+        size = self.sizes[digest]
+        return None if size is None else (size[0], size[1])
+
+    def merge(self, log: list) -> None:
+        """Adds the entries another copy of the cache logged, e.g. in a worker process"""
+        for table, key, value in log:
+            getattr(self, table)[key] = value
+            self.dirty = True
+
+    def save(self) -> None:
+        if self.cache_path is None or not self.dirty:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self.cache_path.write_text(json.dumps({"files": self.files, "sizes": self.sizes}))
+        self.dirty = False
+
+
+def resolve_image_path(url: Optional[str], static_dir: pathlib.Path) -> Optional[pathlib.Path]:
+    """Maps a site-relative image URL (e.g. /images/tom.png) to the file under static_dir; remote URLs give None"""
+    if not url:
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme or parsed.netloc:
+        return None
+    return static_dir / unquote(parsed.path).lstrip("/")
+
+
+def annotate_image(node: HTMLNode, static_dir: Optional[pathlib.Path]=None, cache: Optional[ImageSizeCache]=None) -> None:
+    """Adds width/height (when the file can be probed), loading="lazy" and decoding="async" to one img node"""
+    props = node.props if node.props is not None else {}
+    if static_dir is not None and cache is not None and "width" not in props:
+        path = resolve_image_path(props.get("src"), static_dir)
+        size = cache.get(path) if path is not None else None
+        if size is not None:
+            props["width"] = str(size[0])
+            props["height"] = str(size[1])
+    props.setdefault("loading", "lazy")
+    props.setdefault("decoding", "async")
+    node.props = props
+
+
+def annotate_images(node: HTMLNode, static_dir: Optional[pathlib.Path]=None, cache: Optional[ImageSizeCache]=None) -> None:
+    """annotate_image for every img in the tree"""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.children:
+            stack.extend(current.children)
+        elif current.tag == "img":
+            annotate_image(current, static_dir, cache)
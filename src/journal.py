@@ -0,0 +1,83 @@
+"""Build journal, so an interrupted build can be resumed.
+
+Every page is appended to the journal as soon as its output is written, as one JSON line with the sha256
+of its source and of its output. The first line holds the build's settings. A build that finishes deletes
+the journal; one that is killed leaves it behind, and `--resume` then skips each page whose source still
+has the journaled hash and whose output still holds the journaled bytes, and renders only the rest. A
+journal written with different settings is ignored, as is a last line cut short by the kill.
+"""
+import hashlib
+import json
+import os
+import pathlib
+from typing import Optional
+
+
+class BuildJournal:
+    def __init__(self, journal_path: pathlib.Path, settings: dict, resume: bool=False) -> None:
+        """settings - everything besides the source that a page's output depends on; resume - keep the entries
+        of an earlier build with the same settings instead of starting a new journal"""
+        self.journal_path = journal_path
+        self.entries = dict()   # source path -> {"source", "source_sha256", "dest", "output_sha256", ...}
+        header = {"settings": settings}
+        if resume:
+            self.entries = self._read(journal_path, header)
+        # rewritten rather than appended to, so a line cut short by the kill doesn't hide the new ones
+        journal_path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(journal_path, "w", encoding="utf-8")
+        self._append(header)
+        for entry in self.entries.values():
+            self._append(entry)
+
+    @staticmethod
+    def _read(journal_path: pathlib.Path, header: dict) -> dict:
+        entries = dict()
+        try:
+            with open(journal_path, encoding="utf-8") as f:
+                lines = iter(f)
+                if json.loads(next(lines, "null")) != header:
+                    return entries
+                for line in lines:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    entries[entry["source"]] = entry
+        except (OSError, ValueError):
+            return dict()
+        return entries
+
+    def _append(self, entry: dict) -> None:
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def finished(self, source: str, source_sha256: str) -> Optional[dict]:
+        """The journal entry of a page whose source is unchanged since it was journaled, else None; check its
+        output with output_matches before skipping it"""
+        entry = self.entries.get(source)
+        if entry is None or entry["source_sha256"] != source_sha256:
+            return None
+        return entry
+
+    @staticmethod
+    def output_matches(entry: dict, output: Optional[bytes]) -> bool:
+        """output - the bytes now at the page's destination, or None if there are none"""
+        return output is not None and hashlib.sha256(output).hexdigest() == entry["output_sha256"]
+
+    def record(self, source: str, source_sha256: str, dest: str, output: bytes, **extra) -> None:
+        """Journals a page whose output has been written; extra - whatever a resumed build needs besides the
+        output, e.g. the page's title and text for the search index"""
+        entry = {"source": source, "source_sha256": source_sha256, "dest": dest, "output_sha256": hashlib.sha256(output).hexdigest(), **extra}
+        self.entries[source] = entry
+        self._append(entry)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def complete(self) -> None:
+        """Closes and deletes the journal once the build has finished; nothing is left to resume"""
+        self._file.close()
+        try:
+            os.unlink(self.journal_path)
+        except OSError:
+            pass
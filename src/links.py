@@ -0,0 +1,73 @@
+"""Internal link checking, done by the build itself.
+
+With --check-links the LinkTargets transform lists the href/src of every link and image as each page
+renders. Once the build has written everything, LinkChecker resolves those targets against the set of
+outputs the build knows about (pages, static files, search index), so nothing is crawled or parsed
+again. A target is found if that path exists, or its index.html or .html does (/blog/tom matches
+blog/tom/index.html). Links to other sites are not checked, nor are #fragments. Only for the broken links
+is the markdown source read again, to report the line each one is on.
+"""
+import pathlib
+from typing import Optional
+
+from assets import resolve_url, site_root
+
+
+class BrokenLinks(Exception):
+    pass
+
+
+class BrokenLink:
+    def __init__(self, source: str, url: str, line: Optional[int]=None) -> None:
+        self.source = source
+        self.url = url
+        self.line = line
+
+    def __str__(self) -> str:
+        location = f"{self.source}:{self.line}" if self.line is not None else self.source
+        return f"{location}: broken link {self.url}"
+
+
+class LinkChecker:
+    def __init__(self, basepath: str="/") -> None:
+        self.root = site_root(basepath)
+        self.pages = list()   # (markdown source path, output path relative to the destination, [url])
+
+    def add_page(self, source: str, page: str, urls: list[str]) -> None:
+        if urls:
+            self.pages.append((source, page, urls))
+
+    def broken(self, outputs: set[str]) -> list[BrokenLink]:
+        """outputs - every output path of the site relative to the destination, / separated"""
+        broken = list()
+        for source, page, urls in self.pages:
+            missing = list()
+            for url in urls:
+                path = resolve_url(url, page, self.root)
+                if path is None or path in outputs or path + "/index.html" in outputs or path + ".html" in outputs:
+                    continue
+                missing.append(url)
+            if missing:
+                broken.extend(locate(source, missing))
+        return broken
+
+
+def locate(source: str, urls: list[str]) -> list[BrokenLink]:
+    """BrokenLinks for the urls in the order they appear in the markdown file source, with their line numbers"""
+    try:
+        text = pathlib.Path(source).read_text()
+    except OSError:
+        return [BrokenLink(source, url) for url in urls]
+    found = list()
+    position = 0
+    for url in urls:
+        # link and image syntax put the target right after "](", so search for that before the bare url
+        index = text.find("](" + url, position)
+        if index == -1:
+            index = text.find(url, position)
+        if index == -1:
+            found.append(BrokenLink(source, url))
+            continue
+        position = index + 1
+        found.append(BrokenLink(source, url, text.count("\n", 0, index) + 1))
+    return found
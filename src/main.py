@@ -1,36 +1,434 @@
-from utils import generate_page
+from utils import render_page, layout_path
+from imagesize import ImageSizeCache, file_digest
+from templates import TemplateLoader, directory_layout
+from output import open_output, sync_tree
+from manifest import ChangeManifest
+from search import SearchIndex, page_url
+from feeds import PageIndex
+from transforms import OPTIONAL_TRANSFORMS, ElementTags, LinkTargets, PageStats, default_pipeline
+from discovery import IgnoreRules, Source, walk_sources
+from journal import BuildJournal
+from assets import AssetReferences
+from links import BrokenLinks, LinkChecker
+from budgets import OverBudget, PageBudgets, parse_limit, parse_override
+from stylesheets import StylesheetInliner
+from scheduler import CostHistory, MemoryProbe, PageCost, format_size, largest_first, parallel_efficiency, parse_size, run_pages
+import highlight
 import pathlib
-import shutil
 import argparse
+import glob
+import os
+import sys
+import time
 
 
-def main():
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
     parser.add_argument("--static", type=pathlib.Path, default="./static")
     parser.add_argument("--content", type=pathlib.Path, default="./content")
     parser.add_argument("--destination", type=pathlib.Path, default="./docs")
     parser.add_argument("--template", type=pathlib.Path, default="./template.html")
     parser.add_argument("--basepath", type=str, default="/")
+    parser.add_argument("--cache-dir", type=pathlib.Path, default="./.ssg_cache")
+    parser.add_argument("--manifest", type=pathlib.Path, default=None, help="where to write the deploy change manifest (default: <cache-dir>/deploy-manifest.json)")
+    parser.add_argument("--search-index", action="store_true", help="write a sharded client-side search index under <destination>/search/")
+    parser.add_argument("--site-url", default=None, metavar="URL", help="scheme and host the site is served from, e.g. https://example.com; writes sitemap.xml and a feed")
+    parser.add_argument("--feed-section", default="blog", metavar="DIR", help="content directory whose pages go into <DIR>/atom.xml with --site-url (default: blog; empty for none)")
+    parser.add_argument("--transforms", type=lambda s: [t for t in s.split(",") if t], default=[], help=f"comma-separated extra tree transforms: {', '.join(OPTIONAL_TRANSFORMS)}")
+    parser.add_argument("--layouts", type=pathlib.Path, default=None, help="directory of named layouts, selected per page with <!-- layout: name --> or per directory with a .layout file")
+    parser.add_argument("--only", action="append", default=[], metavar="GLOB", help="render only the sources matching this glob (relative to --content; repeatable) into the existing destination")
+    parser.add_argument("--with-static", action="store_true", help="also sync static files in an --only build")
+    parser.add_argument("--jobs", type=int, default=None, help="render pages in this many worker processes (default: 1, or one per CPU with --max-memory)")
+    parser.add_argument("--max-memory", type=parse_size, default=None, help="memory budget for pages rendering at once, e.g. 512M or 2G; large pages then run with fewer others alongside")
+    parser.add_argument("--prune-assets", action="store_true", help="copy only the static files the pages (or their stylesheets) reference, and list the others")
+    parser.add_argument("--keep-assets", action="append", default=[], metavar="GLOB", help="static files to copy with --prune-assets even if nothing references them (repeatable)")
+    parser.add_argument("--check-links", choices=["warn", "fail"], default=None, help="check every internal link and image against the site's outputs; fail also makes the build exit with status 1")
+    parser.add_argument("--inline-css", type=parse_size, default=None, metavar="SIZE", help="inline the template's local stylesheets of at most SIZE (e.g. 8K) into a <style> element")
+    parser.add_argument("--trim-css", action="store_true", help="with --inline-css, leave out the rules for tags a page doesn't contain")
+    parser.add_argument("--budget", type=parse_limit, action="append", default=[], metavar="NAME=LIMIT", help="per-page budget, e.g. html=500K, images=40, nodes=3000, assets=2M (repeatable)")
+    parser.add_argument("--budget-for", type=parse_override, action="append", default=[], metavar="GLOB:NAME=LIMIT", help="budget for the sources matching GLOB (relative to --content), e.g. blog/*:images=60 or gallery.md:assets=off (repeatable)")
+    parser.add_argument("--budget-mode", choices=["warn", "fail"], default="warn", help="fail makes a build with pages over budget exit with status 1 (default: warn)")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted build: skip pages it finished whose source and output are unchanged")
+    parser.add_argument("--archive", type=pathlib.Path, default=None, help="write the site into this .tar, .tar.gz, .tgz, .tar.xz or .zip instead of --destination")
+    parser.add_argument("--profile-memory", action="store_true", help="measure each page's peak memory with tracemalloc instead of RSS sampling")
+    return parser
 
-    args = parser.parse_args()
+
+class PageTask:
+    def __init__(self, source: pathlib.Path, template: pathlib.Path, dest: pathlib.Path, source_bytes: int, source_sha256: str=None) -> None:
+        self.source = source
+        self.template = template
+        self.dest = dest
+        self.source_bytes = source_bytes
+        self.source_sha256 = source_sha256
+
+
+class PageRenderer:
+    """Renders PageTasks with one set of caches and transforms; each worker process builds its own"""
+
+    def __init__(self, args: argparse.Namespace, image_cache: ImageSizeCache, template_loader: TemplateLoader, page_cache: dict=None) -> None:
+        self.args = args
+        self.image_cache = image_cache
+        self.template_loader = template_loader
+        self.page_cache = page_cache
+        extra = [OPTIONAL_TRANSFORMS[name]() for name in args.transforms]
+        if args.check_links:
+            extra.append(LinkTargets())
+        if args.budget or args.budget_for:
+            extra.append(PageStats())
+        self.css_inliner = None
+        if args.inline_css is not None:
+            self.css_inliner = StylesheetInliner(args.static, args.basepath, args.inline_css, trim=args.trim_css)
+            if args.trim_css:
+                extra.append(ElementTags())
+        self.transforms = default_pipeline(static_dir=args.static, image_cache=image_cache, extra=extra)
+
+    def __call__(self, task: PageTask):
+        """Returns (RenderedPage, PageCost, {transform name: seconds spent on this page})"""
+        before = dict(self.transforms.timings)
+        with MemoryProbe(trace=self.args.profile_memory) as probe:
+            page = render_page(from_path=task.source, template_path=task.template, basepath=self.args.basepath, static_dir=self.args.static, image_cache=self.image_cache, page_cache=self.page_cache, template_loader=self.template_loader, layouts_dir=self.args.layouts, transforms=self.transforms, css_inliner=self.css_inliner)
+        cost = PageCost(str(task.source), task.source_bytes, probe.peak_bytes, probe.seconds)
+        timings = {name: seconds - before[name] for name, seconds in self.transforms.timings.items()}
+        return page, cost, timings
+
+
+def select_sources(content_dir: pathlib.Path, patterns: list[str], ignore: IgnoreRules=None) -> list[Source]:
+    """Markdown sources matching any of the globs, walking only the directories the globs reach.
+    A pattern may be relative to content_dir or start with it; a matching directory selects every source below it.
+    Sources excluded by the ignore rules (default: IgnoreRules.load) are left out."""
+    if ignore is None:
+        ignore = IgnoreRules.load(content_dir)
+    prefix = content_dir.as_posix().rstrip("/") + "/"
+    selected = dict()
+    for pattern in patterns:
+        if pattern.startswith(prefix):
+            pattern = pattern[len(prefix):]
+        pattern = pattern.strip("/")
+        if not pattern:
+            matches = [content_dir]
+        elif glob.has_magic(pattern):
+            matches = content_dir.glob(pattern)
+        else:
+            matches = [content_dir / pattern] if (content_dir / pattern).exists() else []
+        for match in matches:
+            relative = match.relative_to(content_dir).as_posix()
+            if relative == ".":
+                relative = ""
+            if match.is_dir():
+                if relative and ignore.excluded(relative, True):
+                    continue
+                for source in walk_sources(content_dir, ignore, below=relative):
+                    selected.setdefault(source.relative, source)
+            elif match.suffix == ".md" and not ignore.excluded(relative, False):
+                selected.setdefault(relative, Source(str(match), relative, match.stat().st_size))
+    return list(selected.values())
+
+
+def journal_settings(args: argparse.Namespace) -> dict:
+    """What page outputs depend on besides their sources, so --resume only trusts a journal of the same build"""
+    templates = [args.template]
+    if args.layouts is not None and args.layouts.is_dir():
+        templates.extend(sorted(path for path in args.layouts.rglob("*") if path.is_file()))
+    stamps = dict()
+    for template in templates:
+        try:
+            st = template.stat()
+            stamps[str(template)] = [st.st_mtime_ns, st.st_size]
+        except OSError:
+            pass
+    if args.inline_css is not None and args.static.is_dir():
+        # inlined stylesheets are part of every page
+        for stylesheet in sorted(args.static.rglob("*.css")):
+            st = stylesheet.stat()
+            stamps[str(stylesheet)] = [st.st_mtime_ns, st.st_size]
+    return {"destination": str(args.destination), "basepath": args.basepath, "static": str(args.static),
+            "transforms": list(args.transforms), "search_index": args.search_index, "check_links": bool(args.check_links),
+            "budgets": bool(args.budget or args.budget_for), "site_url": args.site_url, "inline_css": args.inline_css, "trim_css": args.trim_css, "templates": stamps}
+
+
+_worker_renderer = None
+
+
+def _init_worker(args: argparse.Namespace) -> None:
+    global _worker_renderer
+    highlight.default_cache.load(args.cache_dir / "highlight.json")
+    highlight.default_cache.log = list()
+    image_cache = ImageSizeCache(args.cache_dir / "image-sizes.json")
+    image_cache.log = list()
+    template_loader = TemplateLoader(args.cache_dir / "templates.json")
+    template_loader.log = list()
+    _worker_renderer = PageRenderer(args, image_cache, template_loader)
+
+
+def _render_in_worker(task: PageTask):
+    """Like PageRenderer.__call__, plus what the page added to the worker's caches, for the parent to merge and save:
+    (page, cost, timings, (image size log, template log, highlight log, highlight keys used))"""
+    page, cost, timings = _worker_renderer(task)
+    snippets = highlight.default_cache
+    delta = (_worker_renderer.image_cache.log, _worker_renderer.template_loader.log, snippets.log, snippets.used)
+    _worker_renderer.image_cache.log, _worker_renderer.template_loader.log, snippets.log, snippets.used = list(), list(), list(), set()
+    return page, cost, timings, delta
+
+
+def worker_count(args: argparse.Namespace) -> int:
+    """--jobs, or when only --max-memory is given one worker per CPU so the budget decides how many pages run at once"""
+    if args.jobs is not None:
+        return args.jobs
+    return (os.cpu_count() or 1) if args.max_memory is not None else 1
+
+
+def build(args: argparse.Namespace, state=None, output=None) -> None:
+    """Runs one build: a full one, or with args.only a partial one that renders only the selected sources and leaves
+    every other output (and, unless args.with_static, the static files) as it is.
+    state - optional daemon.WarmState whose listing and page caches survive between builds
+    output - optional backend from output.py to write to, e.g. a MemoryOutput; by default --archive or --destination
+    is opened, and closed when the build ends"""
+    if args.archive is not None and args.only:
+        raise ValueError("--only can't update an --archive, which holds a complete build")
+    if args.prune_assets and args.only:
+        raise ValueError("--prune-assets needs every page's references, so it can't be combined with --only")
+    if args.trim_css and args.inline_css is None:
+        raise ValueError("--trim-css trims inlined stylesheets, so it needs --inline-css")
+    if output is not None:
+        _build(args, state, output)
+        return
+    output = open_output(args.destination, args.archive)
+    try:
+        _build(args, state, output)
+    except BaseException:
+        output.close(succeeded=False)
+        raise
+    output.close()
+
+
+def _build(args: argparse.Namespace, state, output) -> None:
     static_dir = args.static
     destination_dir = args.destination
     template_path = args.template
     content_dir = args.content
     basepath = args.basepath
+    partial = bool(args.only)
+    image_cache = ImageSizeCache(args.cache_dir / "image-sizes.json")
+    highlight.default_cache.load(args.cache_dir / "highlight.json")
+
+    # outputs are synced rather than wiped and recreated, so unchanged files keep their mtimes; with
+    # --prune-assets static files are synced after the pages, once it is known which ones they reference
+    manifest = ChangeManifest(destination_dir, args.manifest or args.cache_dir / "deploy-manifest.json")
+    references = AssetReferences(basepath, args.keep_assets) if args.prune_assets else None
+    link_checker = LinkChecker(basepath) if args.check_links else None
+    budgets = PageBudgets(static_dir, basepath, args.budget, args.budget_for) if args.budget or args.budget_for else None
+    orphans = list()
+
+    def sync_static() -> dict:
+        include = None
+        if references is not None:
+            references.add_stylesheets(static_dir)
+            def include(path: str) -> bool:
+                if references.wanted(path):
+                    return True
+                orphans.append(path)
+                return False
+        synced = sync_tree(static_dir, destination_dir, output, include)
+        for static_output in synced:
+            manifest.record_file(static_output, static_dir / static_output.relative_to(destination_dir))
+        return synced
+
+    written = sync_static() if references is None and (not partial or args.with_static) else dict()
+
+    def write_output(path: pathlib.Path, data: bytes) -> bool:
+        changed = output.write(path, data)
+        manifest.record_bytes(path, data)
+        return changed
+
+    # sources are streamed from the walk, so the first pages render while the rest are still being found
+    if partial:
+        sources = select_sources(content_dir, args.only)
+    elif state is not None:
+        sources = state.list_markdown(content_dir)
+    else:
+        sources = walk_sources(content_dir)
+    if state is not None:
+        page_cache = state.pages
+        template_loader = state.templates
+        state.check_layouts()
+        directory_layouts = state.layouts
+        layout_stamps = state.layout_stamps
+    else:
+        page_cache = None
+        template_loader = TemplateLoader(args.cache_dir / "templates.json")
+        directory_layouts = dict()
+        layout_stamps = None
+    layouts_dir = args.layouts
+    unknown = [name for name in args.transforms if name not in OPTIONAL_TRANSFORMS]
+    if unknown:
+        raise ValueError(f"unknown transforms: {', '.join(unknown)}")
+    renderer = PageRenderer(args, image_cache, template_loader, page_cache)
+    transforms = renderer.transforms
+    search_index = SearchIndex(args.cache_dir / "search-index.json") if args.search_index else None
+    page_index = PageIndex(args.cache_dir / "page-index.json") if args.site_url else None
+    history = CostHistory(args.cache_dir / "page-costs.json")
+    journal = BuildJournal(args.cache_dir / "build-journal.jsonl", journal_settings(args), resume=args.resume)
+    resumed = 0
+
+    def index_page(task: PageTask, title: str) -> None:
+        relative = task.dest.relative_to(destination_dir)
+        page_index.add_page(page_url(relative, basepath), relative.as_posix(), title, task.source_sha256, task.source.stat().st_mtime)
+
+    def check_budgets(task: PageTask, metrics: dict) -> None:
+        for violation in budgets.check(str(task.source), task.source.relative_to(content_dir).as_posix(), metrics):
+            print(violation)
+
+    def resume(task: PageTask) -> bool:
+        """Takes over a page the interrupted build finished, if its source and output are still what it journaled"""
+        nonlocal resumed
+        entry = journal.finished(str(task.source), task.source_sha256)
+        if entry is None:
+            return False
+        data = output.read(task.dest)
+        if not journal.output_matches(entry, data):
+            return False
+        written[task.dest] = False
+        manifest.record_bytes(task.dest, data)
+        if references is not None:
+            references.add_page(task.dest.relative_to(destination_dir).as_posix(), data.decode("utf-8"))
+        if link_checker is not None:
+            link_checker.add_page(str(task.source), task.dest.relative_to(destination_dir).as_posix(), entry["links"])
+        if budgets is not None:
+            check_budgets(task, entry["budget"])
+        if search_index is not None:
+            search_index.add_page(page_url(task.dest.relative_to(destination_dir), basepath), entry["title"], entry["text"])
+        if page_index is not None:
+            index_page(task, entry["title"])
+        resumed += 1
+        return True
+
+    def page_tasks():
+        for source in sources:
+            file = pathlib.Path(source.path)
+            output_path = destination_dir / source.relative
+            print(f"{file} -> {output_path}")
+            print(f'destination_dir is {destination_dir}')
+            page_template = template_path
+            if layouts_dir is not None:
+                layout = directory_layout(file, content_dir, directory_layouts, layout_stamps)
+                if layout is not None:
+                    page_template = layout_path(layout, layouts_dir)
+            dest_path = destination_dir / (source.relative[:-len(".md")] + ".html")
+            task = PageTask(file, page_template, dest_path, source.size, file_digest(file))
+            if args.resume and resume(task):
+                print(f"resuming page {str(file)}: {str(dest_path)} is already built")
+                continue
+            print(f"generating page {str(file)} to {str(dest_path)} using {str(page_template)}")
+            yield task
+
+    jobs = worker_count(args)
+    tasks = page_tasks()
+    if jobs > 1:
+        render, initializer = _render_in_worker, _init_worker
+        # a pool finishes soonest when the longest pages start first, so this waits for the whole walk
+        tasks = largest_first(tasks, lambda task: history.estimate_seconds(str(task.source), task.source_bytes))
+    else:
+        render, initializer = renderer, None
+    estimate = lambda task: history.estimate_memory(str(task.source), task.source_bytes)
+    render_start = time.perf_counter()
+    for task, result in run_pages(tasks, render, jobs=jobs, max_memory=args.max_memory, estimate=estimate, initializer=initializer, initargs=(args,)):
+        page, cost, timings = result[:3]
+        if render is not renderer:
+            for name, seconds in timings.items():
+                transforms.timings[name] += seconds
+            transforms.pages += 1
+            image_log, template_log, highlight_log, highlight_used = result[3]
+            image_cache.merge(image_log)
+            template_loader.merge(template_log)
+            highlight.default_cache.merge(highlight_log, highlight_used)
+        data = page.html.encode("utf-8")
+        cost.output_bytes = len(data)
+        history.record(cost)
+        written[task.dest] = write_output(task.dest, data)
+        if references is not None:
+            references.add_page(task.dest.relative_to(destination_dir).as_posix(), page.html)
+        # what a resumed build needs to take the page over without rendering it
+        resume_data = dict()
+        if link_checker is not None:
+            resume_data["links"] = page.data.get("links", [])
+            link_checker.add_page(str(task.source), task.dest.relative_to(destination_dir).as_posix(), resume_data["links"])
+        if budgets is not None:
+            resume_data["budget"] = budgets.measure(task.dest.relative_to(destination_dir).as_posix(), len(data), page.html, page.data["stats"])
+            check_budgets(task, resume_data["budget"])
+        if search_index is not None:
+            search_index.add_page(page_url(task.dest.relative_to(destination_dir), basepath), page.title, page.text)
+            resume_data.update(title=page.title, text=page.text)
+        if page_index is not None:
+            index_page(task, page.title)
+            resume_data["title"] = page.title
+        journal.record(str(task.source), task.source_sha256, str(task.dest), data, **resume_data)
+    render_seconds = time.perf_counter() - render_start
+    if references is not None:
+        written.update(sync_static())
+        print(f"{len(orphans)} orphaned static assets, not copied:" + "".join(f"\n  {orphan}" for orphan in sorted(orphans)))
+
+    if page_index is not None:
+        written.update(page_index.write(destination_dir, args.site_url, basepath, args.feed_section, prune=not partial, write=write_output))
+        page_index.save()
+        print(f"sitemap: {len(page_index.pages)} pages, {page_index.changed} changed")
+
+    if search_index is not None:
+        written.update(search_index.write(destination_dir, prune=not partial, write=write_output))
+        search_index.save()
+        print(f"search index: {len(search_index.docs)} pages, {search_index.tokenized} re-tokenized")
+
+    if resumed:
+        print(f"resumed {resumed} pages finished by the interrupted build")
+    print(transforms.report())
+    busy = history.busy_seconds()
+    print(f"pages: {busy:.2f} s of rendering in {render_seconds:.2f} s on {jobs} worker(s), {parallel_efficiency(busy, render_seconds, jobs):.0%} parallel efficiency")
+    heaviest = history.heaviest()
+    if heaviest:
+        method = "tracemalloc" if args.profile_memory else "RSS"
+        print(f"heaviest pages by peak memory ({method}):")
+        for cost in heaviest:
+            print(f"  {format_size(cost.peak_bytes):>10}  {cost.seconds * 1e3:8.1f} ms  {cost.source}")
+    if partial:
+        manifest.carry_over()
+    else:
+        for stale in output.remove_stale(set(written)):
+            print(f"removed stale output {stale}")
+    print(f"{sum(written.values())} of {len(written)} outputs changed")
+    manifest.save()
+    print("deploy manifest: " + ", ".join(f"{count} {kind}" for kind, count in manifest.summary().items()))
+
+    image_cache.save()
+    template_loader.save()
+    # snippets of resumed pages weren't looked up, so they can't be told from unused ones
+    highlight.default_cache.save(prune=not partial and not resumed)
+    history.save()
+    journal.complete()
+
+    if link_checker is not None:
+        broken = link_checker.broken(set(manifest.current))
+        report = "\n".join([*map(str, broken), f"link check: {sum(len(urls) for source, page, urls in link_checker.pages)} links and images, {len(broken)} broken"])
+        if broken and args.check_links == "fail":
+            raise BrokenLinks(report)
+        print(report)
+
+    if budgets is not None:
+        report = budgets.report()
+        if budgets.violations and args.budget_mode == "fail":
+            raise OverBudget(report)
+        print(report)
 
-    shutil.rmtree(destination_dir)
-    shutil.copytree(static_dir, destination_dir)
 
-    md_files = [f for f in content_dir.rglob("*.md")]
-    for file in md_files:
-        path_inside_content_dir = file.relative_to(content_dir)
-        output_path = destination_dir / path_inside_content_dir
-        print(f"{file} -> {output_path}")
-        print(f'destination_dir is {destination_dir}')
-        generate_page(from_path=file,template_path=template_path, dest_path=output_path.with_suffix(".html"), basepath=basepath)
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        build(args)
+    except (BrokenLinks, OverBudget) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
 
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
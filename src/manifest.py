@@ -0,0 +1,102 @@
+"""Deploy change manifest.
+
+After each build, lists every file under the destination with its content hash, size and how it changed
+since the previous build (added, changed, unchanged or removed), plus an ETag per path derived from the
+content hash. Deploy jobs can upload and invalidate only the added/changed paths and delete the removed
+ones instead of diffing the whole tree against the bucket.
+"""
+import hashlib
+import json
+import pathlib
+from typing import Optional
+
+from output import write_if_changed
+
+ADDED = "added"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+REMOVED = "removed"
+
+
+def etag(digest: str) -> str:
+    """Strong ETag for a sha256 hex digest; stable across builds and machines for the same bytes"""
+    return f'"{digest[:32]}"'
+
+
+class ChangeManifest:
+    def __init__(self, destination_dir: pathlib.Path, manifest_path: Optional[pathlib.Path]=None) -> None:
+        self.destination_dir = destination_dir
+        self.manifest_path = manifest_path
+        self.previous = dict()   # relative path -> {"sha256", "size", "mtime_ns"} from the last build
+        self.current = dict()
+        if manifest_path is not None and manifest_path.exists():
+            try:
+                data = json.loads(manifest_path.read_text())
+                self.previous = {entry["path"]: entry for entry in data["files"] if entry["change"] != REMOVED}
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def _relative(self, path: pathlib.Path) -> str:
+        return path.relative_to(self.destination_dir).as_posix()
+
+    def record_bytes(self, path: pathlib.Path, data: bytes) -> None:
+        """Records an output whose bytes are already in memory (rendered pages); mtime_ns is None when the
+        output is not a file on disk (archive or in-memory builds)"""
+        try:
+            mtime_ns = path.stat().st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        self.current[self._relative(path)] = {"sha256": hashlib.sha256(data).hexdigest(), "size": len(data), "mtime_ns": mtime_ns}
+
+    def record_file(self, path: pathlib.Path, source: Optional[pathlib.Path]=None) -> None:
+        """Records a file on disk (copied static assets); the previous hash is reused when size and mtime match.
+        source - the file the output was copied from, read instead of path when the output isn't on disk"""
+        relative = self._relative(path)
+        if source is not None:
+            path = source
+        st = path.stat()
+        previous = self.previous.get(relative)
+        if previous is not None and previous["size"] == st.st_size and previous.get("mtime_ns") == st.st_mtime_ns:
+            digest = previous["sha256"]
+        else:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 16), b""):
+                    h.update(chunk)
+            digest = h.hexdigest()
+        self.current[relative] = {"sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    def carry_over(self) -> None:
+        """Keeps the previous entries of outputs not recorded this build (a partial build leaves them untouched)"""
+        for relative, previous in self.previous.items():
+            self.current.setdefault(relative, {"sha256": previous["sha256"], "size": previous["size"], "mtime_ns": previous.get("mtime_ns")})
+
+    def entries(self) -> list[dict]:
+        entries = list()
+        for relative, entry in sorted(self.current.items()):
+            previous = self.previous.get(relative)
+            if previous is None:
+                change = ADDED
+            elif previous["sha256"] != entry["sha256"]:
+                change = CHANGED
+            else:
+                change = UNCHANGED
+            entries.append({"path": relative, **entry, "change": change})
+        for relative in sorted(self.previous.keys() - self.current.keys()):
+            previous = self.previous[relative]
+            entries.append({"path": relative, "sha256": previous["sha256"], "size": previous["size"], "change": REMOVED})
+        return entries
+
+    def summary(self) -> dict[str, int]:
+        counts = {ADDED: 0, CHANGED: 0, UNCHANGED: 0, REMOVED: 0}
+        for entry in self.entries():
+            counts[entry["change"]] += 1
+        return counts
+
+    def save(self) -> None:
+        if self.manifest_path is None:
+            return
+        entries = self.entries()
+        etags = {entry["path"]: etag(entry["sha256"]) for entry in entries if entry["change"] != REMOVED}
+        data = json.dumps({"files": entries, "etags": etags}, indent=1)
+        write_if_changed(self.manifest_path, data.encode("utf-8"))
@@ -0,0 +1,252 @@
+import contextlib
+import io
+import os
+import pathlib
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+from typing import Callable, Optional
+
+# files are created with mkstemp's 0600; give them the permissions a plain open() would have
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+def same_contents(path: pathlib.Path, data: bytes) -> bool:
+    """Compares size first, then bytes; a missing file is never the same"""
+    try:
+        if path.stat().st_size != len(data):
+            return False
+        with open(path, "rb") as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+
+def atomic_write(path: pathlib.Path, data: bytes) -> None:
+    """Writes to a temporary file in the same directory and renames it over path, so readers see either
+    the old or the new file and never a partial one"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, FILE_MODE)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+def write_if_changed(path: pathlib.Path, data: bytes) -> bool:
+    """Writes data to path unless it already holds exactly those bytes; returns whether it wrote"""
+    if same_contents(path, data):
+        return False
+    atomic_write(path, data)
+    return True
+
+
+def copy_if_changed(src: pathlib.Path, dest: pathlib.Path) -> bool:
+    """Copies src to dest (atomically, keeping src's mtime) unless dest already has the same bytes"""
+    try:
+        dest_st = dest.stat()
+        if dest_st.st_size == src.stat().st_size and _files_equal(src, dest):
+            return False
+    except OSError:
+        pass
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+    return True
+
+
+def _files_equal(a: pathlib.Path, b: pathlib.Path, chunk_size: int=1 << 16) -> bool:
+    with open(a, "rb") as fa, open(b, "rb") as fb:
+        while True:
+            chunk_a = fa.read(chunk_size)
+            if chunk_a != fb.read(chunk_size):
+                return False
+            if not chunk_a:
+                return True
+
+
+def sync_tree(src_dir: pathlib.Path, dest_dir: pathlib.Path, output=None, include: Callable[[str], bool]=None) -> dict[pathlib.Path, bool]:
+    """copy_if_changed (or output.copy) for every file under src_dir, or only those whose / separated path below
+    src_dir include accepts; returns {dest path: whether it was written}"""
+    copy = output.copy if output is not None else copy_if_changed
+    results = dict()
+    for dirpath, dirnames, filenames in os.walk(src_dir):
+        relative = pathlib.Path(dirpath).relative_to(src_dir)
+        for name in filenames:
+            if include is not None and not include((relative / name).as_posix()):
+                continue
+            dest = dest_dir / relative / name
+            results[dest] = copy(pathlib.Path(dirpath) / name, dest)
+    return results
+
+
+def remove_stale(dest_dir: pathlib.Path, keep: set) -> list[pathlib.Path]:
+    """Deletes files under dest_dir that are not in keep, then any directories left empty; returns the removed files"""
+    removed = list()
+    for dirpath, dirnames, filenames in os.walk(dest_dir, topdown=False):
+        for name in filenames:
+            path = pathlib.Path(dirpath) / name
+            if path not in keep:
+                path.unlink()
+                removed.append(path)
+        if dirpath != str(dest_dir) and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+    return removed
+
+
+
+# Output backends. A build addresses every output by its path under the destination directory; the backend
+# decides where the bytes go. write and copy return whether anything was written, read returns an output
+# written earlier (None if there is none or the backend can't read back), remove_stale drops
+# outputs of earlier builds that are not in keep, and close finishes the output (or, with succeeded=False
+# after a failed build, abandons what it can).
+
+class DirectoryOutput:
+    """Files under root, each written only if its bytes changed (the default)"""
+
+    def __init__(self, root: pathlib.Path) -> None:
+        self.root = root
+        root.mkdir(parents=True, exist_ok=True)
+
+    def write(self, path: pathlib.Path, data: bytes) -> bool:
+        return write_if_changed(path, data)
+
+    def copy(self, src: pathlib.Path, path: pathlib.Path) -> bool:
+        return copy_if_changed(src, path)
+
+    def read(self, path: pathlib.Path) -> Optional[bytes]:
+        try:
+            return path.read_bytes()
+        except OSError:
+            return None
+
+    def remove_stale(self, keep: set) -> list[pathlib.Path]:
+        return remove_stale(self.root, keep)
+
+    def close(self, succeeded: bool=True) -> None:
+        pass
+
+
+class ArchiveOutput:
+    """A .tar, .tar.gz, .tgz, .tar.xz or .zip archive, streamed entry by entry instead of creating a file and
+    directories per output. The archive is written next to archive_path and renamed over it by close(), so
+    it only ever holds one complete build; entries are stamped with SOURCE_DATE_EPOCH when that is set."""
+
+    def __init__(self, root: pathlib.Path, archive_path: pathlib.Path) -> None:
+        self.root = root
+        self.archive_path = archive_path
+        self.mtime = int(os.environ.get("SOURCE_DATE_EPOCH", time.time()))
+        archive_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, self._tmp = tempfile.mkstemp(dir=archive_path.parent, prefix=f".{archive_path.name}.", suffix=".tmp")
+        os.close(fd)
+        name = archive_path.name
+        if name.endswith(".zip"):
+            self._zip = zipfile.ZipFile(self._tmp, "w", compression=zipfile.ZIP_DEFLATED)
+            self._tar = None
+        else:
+            mode = "w:gz" if name.endswith((".tar.gz", ".tgz")) else "w:xz" if name.endswith(".tar.xz") else "w"
+            self._tar = tarfile.open(self._tmp, mode)
+            self._zip = None
+
+    def _name(self, path: pathlib.Path) -> str:
+        return path.relative_to(self.root).as_posix()
+
+    def write(self, path: pathlib.Path, data: bytes) -> bool:
+        if self._zip is not None:
+            info = zipfile.ZipInfo(self._name(path), time.gmtime(self.mtime)[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = FILE_MODE << 16
+            self._zip.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(self._name(path))
+            info.size = len(data)
+            info.mtime = self.mtime
+            info.mode = FILE_MODE
+            self._tar.addfile(info, io.BytesIO(data))
+        return True
+
+    def copy(self, src: pathlib.Path, path: pathlib.Path) -> bool:
+        if self._zip is not None:
+            self._zip.write(src, self._name(path))
+        else:
+            self._tar.add(src, self._name(path), recursive=False, filter=_anonymous)
+        return True
+
+    def read(self, path: pathlib.Path) -> Optional[bytes]:
+        return None
+
+    def remove_stale(self, keep: set) -> list[pathlib.Path]:
+        # the archive is rebuilt from scratch, so there is nothing left over from earlier builds
+        return []
+
+    def close(self, succeeded: bool=True) -> None:
+        """Moves the finished archive into place; after a failed build the earlier archive is left as it was"""
+        (self._zip or self._tar).close()
+        if not succeeded:
+            with contextlib.suppress(OSError):
+                os.unlink(self._tmp)
+            return
+        os.chmod(self._tmp, FILE_MODE)
+        os.replace(self._tmp, self.archive_path)
+
+
+def _anonymous(info: tarfile.TarInfo) -> tarfile.TarInfo:
+    """Copied files get the same owner as written ones rather than the builder's user"""
+    info.uid = info.gid = 0
+    info.uname = info.gname = ""
+    return info
+
+
+class MemoryOutput:
+    """Outputs kept in files, {path relative to root: bytes}, for tests and serving without touching the disk.
+    Reusing one instance across builds makes later builds incremental like DirectoryOutput."""
+
+    def __init__(self, root: pathlib.Path) -> None:
+        self.root = root
+        self.files = dict()
+
+    def write(self, path: pathlib.Path, data: bytes) -> bool:
+        name = path.relative_to(self.root).as_posix()
+        if self.files.get(name) == data:
+            return False
+        self.files[name] = data
+        return True
+
+    def copy(self, src: pathlib.Path, path: pathlib.Path) -> bool:
+        return self.write(path, src.read_bytes())
+
+    def read(self, path: pathlib.Path) -> Optional[bytes]:
+        return self.files.get(path.relative_to(self.root).as_posix())
+
+    def remove_stale(self, keep: set) -> list[pathlib.Path]:
+        keep = {path.relative_to(self.root).as_posix() for path in keep}
+        removed = [self.root / name for name in self.files if name not in keep]
+        for path in removed:
+            del self.files[path.relative_to(self.root).as_posix()]
+        return removed
+
+    def close(self, succeeded: bool=True) -> None:
+        pass
+
+
+def open_output(root: pathlib.Path, archive_path: pathlib.Path=None):
+    """The backend a build writes to: archive_path's archive if given, otherwise the directory root"""
+    if archive_path is not None:
+        return ArchiveOutput(root, archive_path)
+    return DirectoryOutput(root)
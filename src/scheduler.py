@@ -0,0 +1,222 @@
+"""Per-page cost accounting and memory-aware scheduling of page renders.
+
+Every rendered page gets a PageCost: its peak memory (tracemalloc when profiling, RSS sampling
+otherwise), render time and output size. Costs are kept in a CostHistory under the build cache so the
+next build can estimate a page before rendering it; pages never seen before are estimated from their
+source size.
+
+For a parallel build, largest_first orders the pages by their estimated render time so the longest ones
+start first and the short ones fill the gaps at the end (longest-processing-time-first scheduling), rather
+than a few large pages found late keeping one worker busy after the others are done.
+
+run_pages renders tasks either inline or on a process pool. With a memory budget it only starts a page
+when the estimated memory of everything in flight still fits, so a few large documents run alone while
+many small ones run side by side, instead of always keeping a fixed number of workers busy.
+"""
+import concurrent.futures
+import json
+import os
+import pathlib
+import re
+import resource
+import time
+import tracemalloc
+from typing import Callable, Iterable, Iterator, Optional
+
+from output import write_if_changed
+
+# estimate for pages without history: rendering holds roughly this many bytes per byte of markdown
+# (source text, TextNodes, HTMLNode tree, fragments and the final document) on top of a fixed overhead
+BYTES_PER_SOURCE_BYTE = 64
+BASE_PAGE_BYTES = 256 * 1024
+# render time estimate for new pages until a build has been recorded to calibrate it
+SECONDS_PER_SOURCE_BYTE = 3e-7
+
+_DONE = object()
+
+# ru_maxrss is in kilobytes on Linux and bytes on macOS
+_MAXRSS_UNIT = 1 if os.uname().sysname == "Darwin" else 1024
+
+
+def parse_size(text: str) -> int:
+    """"512M" -> 536870912; accepts K, M, G suffixes (powers of 1024) or plain bytes"""
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?)i?B?\s*", text, re.IGNORECASE)
+    if m is None:
+        raise ValueError(f"invalid size {text!r}")
+    return int(float(m.group(1)) * 1024 ** " KMG".index(m.group(2).upper() or " "))
+
+
+def format_size(n: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(n) < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+
+def _proc_status(field: str) -> Optional[int]:
+    """A kB field of /proc/self/status (e.g. VmRSS, VmHWM) in bytes, or None where there is no procfs"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def current_rss() -> int:
+    rss = _proc_status("VmRSS")
+    return rss if rss is not None else peak_rss()
+
+
+def peak_rss() -> int:
+    """The RSS high-water mark, read from the same source as current_rss where possible so the two compare"""
+    hwm = _proc_status("VmHWM")
+    return hwm if hwm is not None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+
+class PageCost:
+    def __init__(self, source: str, source_bytes: int, peak_bytes: int=0, seconds: float=0.0, output_bytes: int=0) -> None:
+        self.source = source
+        self.source_bytes = source_bytes
+        self.peak_bytes = peak_bytes
+        self.seconds = seconds
+        self.output_bytes = output_bytes
+
+    def to_json(self) -> dict:
+        return {"source_bytes": self.source_bytes, "peak_bytes": self.peak_bytes, "seconds": self.seconds, "output_bytes": self.output_bytes}
+
+
+class MemoryProbe:
+    """Measures the peak memory and wall time of the block it wraps.
+
+    With trace=True the peak comes from tracemalloc (exact Python allocations, slower). Otherwise RSS is
+    sampled: if the process reached a new RSS high-water mark during the block, that mark minus the RSS at
+    the start is the peak; otherwise the growth in RSS is used as a lower bound."""
+
+    def __init__(self, trace: bool=False) -> None:
+        self.trace = trace
+        self.peak_bytes = 0
+        self.seconds = 0.0
+
+    def __enter__(self):
+        if self.trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._start_traced = tracemalloc.get_traced_memory()[0]
+        else:
+            self._start_rss = current_rss()
+            self._start_peak = peak_rss()
+        self._start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._start_time
+        if self.trace:
+            self.peak_bytes = max(tracemalloc.get_traced_memory()[1] - self._start_traced, 0)
+        else:
+            end_peak = peak_rss()
+            if end_peak > self._start_peak:
+                self.peak_bytes = max(end_peak - self._start_rss, 0)
+            else:
+                self.peak_bytes = max(current_rss() - self._start_rss, 0)
+        return False
+
+
+class CostHistory:
+    def __init__(self, history_path: Optional[pathlib.Path]=None) -> None:
+        self.history_path = history_path
+        self.previous = dict()   # source path -> PageCost.to_json() from earlier builds
+        self.current = dict()    # source path -> PageCost for this build
+        self._seconds_per_byte = None
+        if history_path is not None and history_path.exists():
+            try:
+                self.previous = json.loads(history_path.read_text())
+            except (OSError, ValueError):
+                pass
+
+    def record(self, cost: PageCost) -> None:
+        self.current[cost.source] = cost
+
+    def estimate_memory(self, source: str, source_bytes: int) -> int:
+        previous = self.previous.get(source)
+        if previous is not None and previous.get("peak_bytes", 0) > 0 and previous.get("source_bytes", 0) > 0:
+            # scale the measured peak if the source has grown or shrunk since
+            return int(previous["peak_bytes"] * max(source_bytes, 1) / previous["source_bytes"])
+        return BASE_PAGE_BYTES + BYTES_PER_SOURCE_BYTE * source_bytes
+
+    def estimate_seconds(self, source: str, source_bytes: int) -> float:
+        previous = self.previous.get(source)
+        if previous is not None and previous.get("seconds", 0) > 0 and previous.get("source_bytes", 0) > 0:
+            return previous["seconds"] * max(source_bytes, 1) / previous["source_bytes"]
+        return self.seconds_per_byte() * source_bytes
+
+    def seconds_per_byte(self) -> float:
+        """Render seconds per source byte over the pages of earlier builds, for pages without history of their own"""
+        if self._seconds_per_byte is None:
+            measured = [cost for cost in self.previous.values() if cost.get("seconds", 0) > 0 and cost.get("source_bytes", 0) > 0]
+            if measured:
+                self._seconds_per_byte = sum(cost["seconds"] for cost in measured) / sum(cost["source_bytes"] for cost in measured)
+            else:
+                self._seconds_per_byte = SECONDS_PER_SOURCE_BYTE
+        return self._seconds_per_byte
+
+    def busy_seconds(self) -> float:
+        """Render time summed over the pages of this build"""
+        return sum(cost.seconds for cost in self.current.values())
+
+    def heaviest(self, n: int=5) -> list[PageCost]:
+        return sorted(self.current.values(), key=lambda cost: -cost.peak_bytes)[:n]
+
+    def save(self) -> None:
+        if self.history_path is None:
+            return
+        merged = {**self.previous, **{source: cost.to_json() for source, cost in self.current.items()}}
+        write_if_changed(self.history_path, json.dumps(merged, indent=1, sort_keys=True).encode("utf-8"))
+
+
+def largest_first(tasks: Iterable, estimate: Callable) -> list:
+    """The tasks sorted by estimate(task), longest first; equal estimates keep their order"""
+    return sorted(tasks, key=estimate, reverse=True)
+
+
+def parallel_efficiency(busy_seconds: float, wall_seconds: float, jobs: int) -> float:
+    """Fraction of the workers' time spent rendering: 1.0 means no worker was ever idle"""
+    if wall_seconds <= 0 or jobs < 1:
+        return 1.0
+    return min(busy_seconds / (wall_seconds * jobs), 1.0)
+
+
+def run_pages(tasks: Iterable, render: Callable, jobs: int=1, max_memory: Optional[int]=None, estimate: Callable=None, initializer: Callable=None, initargs: tuple=()) -> Iterator[tuple]:
+    """Yields (task, result) for every task, rendering with render(task). tasks is consumed lazily, so a
+    generator can keep producing tasks while earlier ones render.
+
+    jobs=1 renders inline, in order. Otherwise up to jobs worker processes (set up with initializer) are
+    used; if max_memory is given, tasks are started in order only while the sum of estimate(task) over the
+    tasks in flight stays within it (a task that alone exceeds the budget runs by itself)."""
+    if jobs <= 1:
+        for task in tasks:
+            yield task, render(task)
+        return
+
+    tasks = iter(tasks)
+    task = next(tasks, _DONE)   # the next task to start
+    in_flight = dict()   # future -> (task, estimated bytes)
+    reserved = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs) as pool:
+        while task is not _DONE or in_flight:
+            while task is not _DONE and len(in_flight) < jobs:
+                needed = estimate(task) if (max_memory is not None and estimate is not None) else 0
+                if in_flight and max_memory is not None and reserved + needed > max_memory:
+                    break
+                in_flight[pool.submit(render, task)] = (task, needed)
+                reserved += needed
+                task = next(tasks, _DONE)
+            done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                done_task, needed = in_flight.pop(future)
+                reserved -= needed
+                yield done_task, future.result()
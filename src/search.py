@@ -0,0 +1,127 @@
+"""Build-time client-side search index.
+
+Written under <destination>/search/:
+    docs.json           [[doc id, url, title], ...]
+    meta.json           {"docs": N, "shards": ["ab", "ac", ...], "prefix": 2}
+    shards/<prefix>.json {"terms": [...], "postings": [[delta-encoded doc ids], ...], "freqs": [[tf, ...], ...]}
+
+A browser tokenizes the query the same way (lowercase \\w+ runs), fetches only the shards for the query
+terms' prefixes and intersects the postings. Postings are sorted doc ids stored as gaps, so they stay
+small integers in JSON.
+
+The forward index (terms per page) is kept in the build cache; pages whose text hash is unchanged are not
+re-tokenized, doc ids are stable across builds and shards whose bytes don't change aren't rewritten.
+"""
+import hashlib
+import json
+import pathlib
+import re
+from collections import Counter
+from typing import Callable, Optional
+
+from output import write_if_changed
+
+TOKEN_PATTERN = re.compile(r"\w+")
+PREFIX_LENGTH = 2
+MIN_TERM_LENGTH = 2
+
+
+def tokenize(text: str) -> Counter:
+    return Counter(t for t in TOKEN_PATTERN.findall(text.lower()) if len(t) >= MIN_TERM_LENGTH)
+
+
+def delta_encode(values: list[int]) -> list[int]:
+    previous = 0
+    deltas = list()
+    for value in values:
+        deltas.append(value - previous)
+        previous = value
+    return deltas
+
+
+def delta_decode(deltas: list[int]) -> list[int]:
+    total = 0
+    values = list()
+    for delta in deltas:
+        total += delta
+        values.append(total)
+    return values
+
+
+def page_url(relative_output: pathlib.Path, basepath: str) -> str:
+    """docs-relative output path -> site URL, e.g. blog/tom/index.html -> /blog/tom/"""
+    url = relative_output.as_posix()
+    if url == "index.html" or url.endswith("/index.html"):
+        url = url[:-len("index.html")]
+    return basepath.rstrip("/") + "/" + url
+
+
+class SearchIndex:
+    def __init__(self, state_path: Optional[pathlib.Path]=None) -> None:
+        self.state_path = state_path
+        self.docs = dict()    # url -> {"id", "title", "hash", "terms": {term: tf}}
+        self.next_id = 0      # ids are never reused, so a new page doesn't need a scan of the others
+        self.seen = set()
+        self.tokenized = 0
+        if state_path is not None and state_path.exists():
+            try:
+                state = json.loads(state_path.read_text())
+                self.docs = state["docs"]
+                self.next_id = state["next_id"]
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+
+    def add_page(self, url: str, title: str, text: str) -> None:
+        self.seen.add(url)
+        digest = hashlib.sha256(f"{title}\0{text}".encode()).hexdigest()
+        doc = self.docs.get(url)
+        if doc is not None and doc["hash"] == digest:
+            return
+        self.tokenized += 1
+        terms = tokenize(title) + tokenize(text)
+        if doc is not None:
+            doc_id = doc["id"]
+        else:
+            doc_id = self.next_id
+            self.next_id += 1
+        self.docs[url] = {"id": doc_id, "title": title, "hash": digest, "terms": dict(terms)}
+
+    def write(self, destination_dir: pathlib.Path, prune: bool=True, write: Callable[[pathlib.Path, bytes], bool]=write_if_changed) -> dict[pathlib.Path, bool]:
+        """Drops pages not seen this build (unless prune is False, for partial builds), writes the index files
+        with write(path, data) and returns {path: whether it was written}"""
+        if prune:
+            for url in list(self.docs.keys() - self.seen):
+                del self.docs[url]
+
+        postings = dict()   # term -> [(doc id, tf)]
+        for doc in self.docs.values():
+            for term, tf in doc["terms"].items():
+                postings.setdefault(term, []).append((doc["id"], tf))
+
+        shards = dict()
+        for term in sorted(postings):
+            shards.setdefault(term[:PREFIX_LENGTH], []).append(term)
+
+        search_dir = destination_dir / "search"
+        written = dict()
+
+        def emit(path: pathlib.Path, obj) -> None:
+            written[path] = write(path, json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+        docs_table = sorted([doc["id"], url, doc["title"]] for url, doc in self.docs.items())
+        emit(search_dir / "docs.json", docs_table)
+        emit(search_dir / "meta.json", {"docs": len(docs_table), "shards": sorted(shards), "prefix": PREFIX_LENGTH})
+        for prefix, terms in shards.items():
+            shard_postings = list()
+            shard_freqs = list()
+            for term in terms:
+                entries = sorted(postings[term])
+                shard_postings.append(delta_encode([doc_id for doc_id, tf in entries]))
+                shard_freqs.append([tf for doc_id, tf in entries])
+            emit(search_dir / "shards" / f"{prefix}.json", {"terms": terms, "postings": shard_postings, "freqs": shard_freqs})
+        return written
+
+    def save(self) -> None:
+        if self.state_path is None:
+            return
+        write_if_changed(self.state_path, json.dumps({"next_id": self.next_id, "docs": self.docs}).encode("utf-8"))
@@ -0,0 +1,226 @@
+"""Static file server for a built site, in place of python3 -m http.server.
+
+    python3 src/serve.py [--root docs] [--port 8888] [--cache-control "*.css=public, max-age=86400"]
+
+Each connection is handled on its own thread with HTTP/1.1 keep-alive. Responses carry an ETag (from the
+file's size and mtime) and Last-Modified, and a matching If-None-Match or If-Modified-Since gets a 304.
+When a file has a precompressed sibling (index.html.br, index.html.gz) that the client accepts, the
+sibling is sent with Content-Encoding; brotli is preferred over gzip. Bodies go out with os.sendfile
+where the platform has it. Cache-Control comes from the first --cache-control GLOB=VALUE rule whose glob
+matches the request path, or DEFAULT_CACHE_CONTROL.
+"""
+import argparse
+import email.utils
+import errno
+import fnmatch
+import http.server
+import mimetypes
+import os
+import posixpath
+import shutil
+import sys
+import urllib.parse
+from typing import Optional
+
+DEFAULT_CACHE_CONTROL = "no-cache"
+# Content-Encoding -> suffix of the precompressed sibling, in order of preference
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+
+def parse_cache_rule(text: str) -> tuple[str, str]:
+    """"*.css=public, max-age=86400" -> ("*.css", "public, max-age=86400")"""
+    pattern, separator, value = text.partition("=")
+    if not separator or not pattern or not value:
+        raise ValueError(f"invalid cache rule {text!r}, expected GLOB=VALUE")
+    return pattern, value.strip()
+
+
+def accepted_encodings(header: Optional[str]) -> set[str]:
+    """Codings an Accept-Encoding header allows, without q=0 ones; "*" allows every coding not listed"""
+    accepted = set()
+    refused = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        (accepted if q > 0 else refused).add(coding)
+    if "*" in accepted:
+        accepted.update(coding for coding, suffix in ENCODINGS if coding not in refused)
+    return accepted
+
+
+def etag(st: os.stat_result, encoding: Optional[str]) -> str:
+    tag = f"{st.st_size:x}-{st.st_mtime_ns:x}"
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+class StaticHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "serve-static"
+    # headers and a sendfile body are separate writes; with Nagle the body would wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        self.respond(send_body=True)
+
+    def do_HEAD(self) -> None:
+        self.respond(send_body=False)
+
+    def log_message(self, format, *args) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def resolve(self) -> Optional[str]:
+        """The file under the server's root for the request path, or None; directories serve their index.html"""
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        if "\0" in path:
+            return None
+        path = posixpath.normpath("/" + path.lstrip("/"))
+        target = os.path.join(self.server.root, *[part for part in path.split("/") if part])
+        if os.path.isdir(target):
+            if not self.path.split("?", 1)[0].endswith("/"):
+                return target   # redirected by respond
+            target = os.path.join(target, "index.html")
+        return target if os.path.isfile(target) else None
+
+    def respond(self, send_body: bool) -> None:
+        target = self.resolve()
+        if target is not None and os.path.isdir(target):
+            location = urllib.parse.urlsplit(self.path)
+            self.send_response(301)
+            self.send_header("Location", urllib.parse.urlunsplit(("", "", location.path + "/", location.query, "")))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        status = 200
+        if target is None:
+            status = 404
+            target = os.path.join(self.server.root, "404.html")
+            if not os.path.isfile(target):
+                self.send_error(404)
+                return
+
+        encoding = None
+        variants = [(coding, target + suffix) for coding, suffix in ENCODINGS if os.path.isfile(target + suffix)]
+        if variants:
+            accepted = accepted_encodings(self.headers.get("Accept-Encoding"))
+            for coding, path in variants:
+                if coding in accepted:
+                    encoding = coding
+                    break
+        body_path = dict(variants)[encoding] if encoding else target
+        try:
+            f = open(body_path, "rb")
+        except OSError:
+            self.send_error(404)
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            tag = etag(st, encoding)
+            if status == 200 and self.not_modified(tag, st):
+                self.send_response(304)
+                self.send_validators(tag, st, variants)
+                self.end_headers()
+                return
+            self.send_response(status)
+            content_type = mimetypes.guess_type(target)[0] or "application/octet-stream"
+            if content_type.startswith("text/") or content_type in ("application/javascript", "application/json", "image/svg+xml"):
+                content_type += "; charset=utf-8"
+            self.send_header("Content-Type", content_type)
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+            self.send_header("Content-Length", str(st.st_size))
+            self.send_validators(tag, st, variants)
+            self.end_headers()
+            if send_body:
+                self.send_file(f, st.st_size)
+
+    def not_modified(self, tag: str, st: os.stat_result) -> bool:
+        """If-None-Match decides when present; otherwise If-Modified-Since"""
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return if_none_match.strip() == "*" or tag in [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return int(st.st_mtime) <= since.timestamp()
+        return False
+
+    def send_validators(self, tag: str, st: os.stat_result, variants: list) -> None:
+        self.send_header("ETag", tag)
+        self.send_header("Last-Modified", email.utils.formatdate(st.st_mtime, usegmt=True))
+        self.send_header("Cache-Control", self.server.cache_control(urllib.parse.urlsplit(self.path).path))
+        if variants:
+            self.send_header("Vary", "Accept-Encoding")
+
+    def send_file(self, f, size: int) -> None:
+        self.wfile.flush()
+        if self.server.use_sendfile:
+            try:
+                offset = 0
+                while offset < size:
+                    sent = os.sendfile(self.connection.fileno(), f.fileno(), offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+                return
+            except OSError as e:
+                # a socket or file sendfile can't handle; anything else (e.g. the client went away) is a real error
+                if offset or e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSOCK):
+                    raise
+        shutil.copyfileobj(f, self.wfile)
+
+
+class StaticServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple, root: str, cache_rules: list[tuple[str, str]]=(), quiet: bool=False, use_sendfile: bool=hasattr(os, "sendfile")) -> None:
+        super().__init__(address, StaticHandler)
+        self.root = os.path.abspath(root)
+        self.cache_rules = list(cache_rules)
+        self.quiet = quiet
+        self.use_sendfile = use_sendfile
+
+    def cache_control(self, path: str) -> str:
+        for pattern, value in self.cache_rules:
+            if fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(posixpath.basename(path), pattern):
+                return value
+        return DEFAULT_CACHE_CONTROL
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve a built site")
+    parser.add_argument("--root", default="./docs", help="directory to serve (default: ./docs)")
+    parser.add_argument("--bind", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--cache-control", type=parse_cache_rule, action="append", default=[], metavar="GLOB=VALUE",
+                        help=f"Cache-Control for request paths matching GLOB, first match wins (default: {DEFAULT_CACHE_CONTROL})")
+    parser.add_argument("--no-sendfile", action="store_true", help="copy file bodies through Python instead of os.sendfile")
+    parser.add_argument("--quiet", action="store_true", help="don't log requests")
+    args = parser.parse_args(argv)
+
+    server = StaticServer((args.bind, args.port), args.root, args.cache_control, quiet=args.quiet, use_sendfile=not args.no_sendfile and hasattr(os, "sendfile"))
+    print(f"serving {server.root} on http://{args.bind}:{server.server_address[1]}/", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
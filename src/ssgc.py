@@ -0,0 +1,54 @@
+"""Thin client for the build daemon (daemon.py). Imports only the standard library modules it needs so
+each invocation costs little more than interpreter start and one socket round trip.
+
+    python3 src/ssgc.py build --basepath /site/     # same arguments as main.py
+    python3 src/ssgc.py render < page.md > page.html
+    python3 src/ssgc.py ping | flush | shutdown
+"""
+import json
+import os
+import socket
+import sys
+
+DEFAULT_SOCKET = "./.ssg_cache/daemon.sock"
+
+
+def request(payload: dict, socket_path: str=DEFAULT_SOCKET) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(payload).encode() + b"\n")
+        with sock.makefile("rb") as f:
+            return json.loads(f.readline())
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    socket_path = os.environ.get("SSG_DAEMON_SOCKET", DEFAULT_SOCKET)
+    if not argv:
+        print(__doc__, file=sys.stderr)
+        return 2
+    cmd, rest = argv[0], argv[1:]
+    if cmd == "build":
+        payload = {"cmd": "build", "args": rest, "cwd": os.getcwd()}
+    elif cmd == "render":
+        payload = {"cmd": "render", "markdown": sys.stdin.read()}
+    else:
+        payload = {"cmd": cmd}
+
+    try:
+        response = request(payload, socket_path)
+    except OSError as e:
+        print(f"cannot reach daemon at {socket_path}: {e}", file=sys.stderr)
+        return 1
+    if not response.get("ok"):
+        print(response.get("error"), file=sys.stderr)
+        return 1
+    if "output" in response:
+        sys.stdout.write(response["output"])
+    if "html" in response:
+        sys.stdout.write(response["html"])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
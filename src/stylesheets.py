@@ -0,0 +1,278 @@
+"""Inlining of small stylesheets into the page template, for --inline-css.
+
+A <link rel="stylesheet" href="/..."> in the template's literal text whose file under the static directory
+is at most max_bytes is replaced by a <style> element holding the stylesheet, which saves every page a
+render-blocking request. Relative url(...) and @import targets are rewritten to absolute paths below the
+site's basepath, since they no longer resolve against the stylesheet's location.
+
+With trim, each page gets only the rules whose selectors can match its elements: a selector is dropped
+when it names a tag (h3, table, pre ...) that neither the template nor the page's content nor its template
+values (e.g. {{ Toc }}) contain. Selectors that only name classes, ids or attributes are kept. The tags
+come from the ElementTags transform's pass over the page's tree.
+
+Stylesheets are parsed once per sha256 of their bytes, a template is rewritten once per build (or when one
+of its stylesheets changes), and a trimmed stylesheet is kept per set of tags it depends on, which pages
+with the same kinds of elements share.
+"""
+import hashlib
+from html import escape
+import os
+import pathlib
+import posixpath
+import re
+from typing import Optional
+
+from assets import site_root
+from templates import CompiledTemplate
+
+LINK_PATTERN = re.compile(r"<link\b[^>]*>", re.IGNORECASE)
+ATTRIBUTE_PATTERN = re.compile(r"""([\w-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""")
+TAG_NAME_PATTERN = re.compile(r"<([a-zA-Z][a-zA-Z0-9-]*)")
+# strings, which are kept, or comments and runs of whitespace, which become one space
+CSS_SPACE_PATTERN = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|(?:/\*.*?\*/|\s)+""", re.DOTALL)
+CSS_URL_PATTERN = re.compile(r"""(url\(\s*)(["']?)([^)"'\s]*)\2(\s*\))|(@import\s+)(["'])([^"']*)\6""", re.IGNORECASE)
+# type selectors: a name at the start of a compound selector
+TYPE_SELECTOR_PATTERN = re.compile(r"(?:^|[\s>+~])([a-zA-Z][a-zA-Z0-9-]*)")
+# elements every document has, whether or not the template spells them out
+IMPLIED_TAGS = frozenset({"html", "head", "body"})
+# at-rules whose block holds further rules, which are trimmed like top-level ones
+GROUPING_RULES = ("media", "supports", "layer", "container", "document")
+_SCHEME = re.compile(r"[a-zA-Z][a-zA-Z0-9+.-]*:")
+
+
+def _skip_string(css: str, index: int) -> int:
+    quote = css[index]
+    index += 1
+    while index < len(css):
+        if css[index] == "\\":
+            index += 2
+            continue
+        if css[index] == quote:
+            return index + 1
+        index += 1
+    return index
+
+
+def _matching_brace(css: str, index: int) -> int:
+    depth = 0
+    while index < len(css):
+        c = css[index]
+        if c in "\"'":
+            index = _skip_string(css, index)
+            continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return index
+        index += 1
+    return len(css)
+
+
+def split_selectors(prelude: str) -> list[str]:
+    """"h1, :is(h2, h3) b" -> ["h1", ":is(h2, h3) b"]"""
+    selectors = list()
+    depth = 0
+    start = 0
+    index = 0
+    while index < len(prelude):
+        c = prelude[index]
+        if c in "\"'":
+            index = _skip_string(prelude, index)
+            continue
+        if c in "([":
+            depth += 1
+        elif c in ")]":
+            depth -= 1
+        elif c == "," and depth == 0:
+            selectors.append(prelude[start:index].strip())
+            start = index + 1
+        index += 1
+    selectors.append(prelude[start:].strip())
+    return [selector for selector in selectors if selector]
+
+
+def selector_tags(selector: str) -> frozenset[str]:
+    """The tag names a selector requires; attribute values and pseudo-class arguments don't count"""
+    selector = re.sub(r"\[[^\]]*\]|\([^)]*\)", "", selector)
+    return frozenset(name.lower() for name in TYPE_SELECTOR_PATTERN.findall(selector))
+
+
+def parse_rules(css: str) -> list[tuple]:
+    """css without comments -> [("rule", [(selector, its tags)], declarations) | ("group", prelude, rules) | ("raw", text)]"""
+    rules = list()
+    start = 0
+    index = 0
+    while index < len(css):
+        c = css[index]
+        if c in "\"'":
+            index = _skip_string(css, index)
+            continue
+        if c == ";":
+            text = css[start:index + 1].strip()
+            if text != ";":
+                rules.append(("raw", text))
+            start = index = index + 1
+            continue
+        if c == "{":
+            close = _matching_brace(css, index)
+            prelude = css[start:index].strip()
+            body = css[index + 1:close]
+            if prelude.startswith("@"):
+                keyword = prelude[1:].split(None, 1)[0].lower() if len(prelude) > 1 else ""
+                if keyword in GROUPING_RULES:
+                    rules.append(("group", prelude, parse_rules(body)))
+                else:
+                    rules.append(("raw", prelude + "{" + body.strip() + "}"))
+            elif prelude:
+                rules.append(("rule", [(selector, selector_tags(selector)) for selector in split_selectors(prelude)], body.strip()))
+            start = index = close + 1
+            continue
+        if c == "}":
+            start = index + 1
+        index += 1
+    return rules
+
+
+def serialize(rules: list[tuple], tags: Optional[frozenset]=None) -> str:
+    """The rules as css; with tags, only the selectors whose tags are all among them"""
+    out = list()
+    for rule in rules:
+        if rule[0] == "rule":
+            selectors = [selector for selector, needs in rule[1] if tags is None or needs <= tags]
+            if selectors:
+                out.append(",".join(selectors) + "{" + rule[2] + "}")
+        elif rule[0] == "group":
+            inner = serialize(rule[2], tags)
+            if inner:
+                out.append(rule[1] + "{" + inner + "}")
+        else:
+            out.append(rule[1])
+    return "\n".join(out)
+
+
+def _vocabulary(rules: list[tuple]) -> frozenset[str]:
+    names = set()
+    for rule in rules:
+        if rule[0] == "rule":
+            for selector, needs in rule[1]:
+                names.update(needs)
+        elif rule[0] == "group":
+            names.update(_vocabulary(rule[2]))
+    return frozenset(names)
+
+
+class Stylesheet:
+    def __init__(self, css: str) -> None:
+        self.rules = parse_rules(css)
+        self.vocabulary = _vocabulary(self.rules)   # every tag a selector names
+        self.css = serialize(self.rules)
+        self.trimmed = dict()   # the page's tags that are in the vocabulary -> css
+
+
+class StylesheetInliner:
+    def __init__(self, static_dir: pathlib.Path, basepath: str="/", max_bytes: int=8192, trim: bool=False) -> None:
+        self.static_dir = static_dir
+        self.root = site_root(basepath)
+        self.max_bytes = max_bytes
+        self.trim = trim
+        self.stylesheets = dict()   # sha256 -> Stylesheet
+        self.templates = dict()     # id of a CompiledTemplate -> (it, *_rewrite(it))
+
+    def inline(self, template: CompiledTemplate, values: dict, page=None) -> tuple[CompiledTemplate, dict]:
+        """The template with its small stylesheets inlined, and values plus, with trim, the page's trimmed
+        stylesheets; page - the transforms.PageContext, whose data["tags"] the ElementTags transform filled"""
+        cached = self.templates.get(id(template))
+        if cached is None or cached[0] is not template or cached[1] != _stamps(cached[1]):
+            cached = self.templates[id(template)] = (template, *self._rewrite(template))
+        inlined, placeholders, template_tags = cached[2:]
+        if not placeholders:
+            return inlined, values
+        tags = set(template_tags)
+        if page is not None:
+            tags.update(page.data.get("tags", ()))
+            for value in page.values.values():
+                tags.update(name.lower() for name in TAG_NAME_PATTERN.findall(value))
+        values = dict(values)
+        for name, digest in placeholders.items():
+            values[name] = self._trimmed(self.stylesheets[digest], tags)
+        return inlined, values
+
+    def _rewrite(self, template: CompiledTemplate) -> tuple[dict, CompiledTemplate, dict, frozenset]:
+        """(stamps of the inlined stylesheets, the template, {placeholder: sha256}, tags of the template's text)"""
+        stamps = dict()
+        placeholders = dict()
+        out = [""]
+        for index, fragment in enumerate(template.fragments):
+            if index % 2:
+                out.extend([fragment, ""])
+                continue
+            position = 0
+            for m in LINK_PATTERN.finditer(fragment):
+                inlined = self._stylesheet(m.group(0), stamps)
+                if inlined is None:
+                    continue
+                digest, media = inlined
+                out[-1] += fragment[position:m.start()] + ("<style>" if media is None else f'<style media="{escape(media)}">')
+                if self.trim:
+                    name = "stylesheet:" + digest
+                    placeholders[name] = digest
+                    out.extend([name, "</style>"])
+                else:
+                    out[-1] += self.stylesheets[digest].css + "</style>"
+                position = m.end()
+            out[-1] += fragment[position:]
+        tags = IMPLIED_TAGS.union(name.lower() for fragment in template.fragments[::2] for name in TAG_NAME_PATTERN.findall(fragment))
+        return stamps, CompiledTemplate(out, template.dependencies), placeholders, tags
+
+    def _stylesheet(self, link: str, stamps: dict) -> Optional[tuple[str, Optional[str]]]:
+        """(sha256, media) of the stylesheet a <link> loads if it is to be inlined, else None"""
+        attributes = {m.group(1).lower(): next(group for group in m.groups()[1:] if group is not None) for m in ATTRIBUTE_PATTERN.finditer(link)}
+        href = attributes.get("href", "")
+        if "stylesheet" not in attributes.get("rel", "").lower().split() or not href.startswith("/") or href.startswith("//"):
+            return None
+        path = href.split("#", 1)[0].split("?", 1)[0].lstrip("/")
+        file = self.static_dir / path
+        try:
+            st = os.stat(file)
+            if st.st_size > self.max_bytes:
+                return None
+            data = file.read_bytes()
+        except OSError:
+            return None
+        stamps[str(file)] = (st.st_mtime_ns, st.st_size)
+        digest = hashlib.sha256(path.encode() + b"\0" + data).hexdigest()
+        if digest not in self.stylesheets:
+            css = CSS_SPACE_PATTERN.sub(lambda m: m.group(1) or " ", data.decode("utf-8", errors="replace"))
+            css = CSS_URL_PATTERN.sub(lambda m: self._absolute_url(m, path), css)
+            # a </style> in the stylesheet would end the element early
+            self.stylesheets[digest] = Stylesheet(css.replace("</style", "<\\/style"))
+        media = attributes.get("media")
+        return digest, None if media in (None, "", "all") else media
+
+    def _absolute_url(self, m: re.Match, stylesheet: str) -> str:
+        """A url(...) or @import match with a relative target rewritten to an absolute path on the site"""
+        url = m.group(3) if m.group(1) is not None else m.group(7)
+        if not url or url.startswith(("/", "#")) or _SCHEME.match(url):
+            return m.group(0)
+        path, separator, suffix = url.partition("?") if "?" in url else url.partition("#")
+        absolute = self.root + posixpath.normpath(posixpath.join(posixpath.dirname(stylesheet), path)).lstrip("/") + separator + suffix
+        if m.group(1) is not None:
+            return f"{m.group(1)}{m.group(2)}{absolute}{m.group(2)}{m.group(4)}"
+        return f"{m.group(5)}{m.group(6)}{absolute}{m.group(6)}"
+
+    def _trimmed(self, stylesheet: Stylesheet, tags: set) -> str:
+        key = stylesheet.vocabulary.intersection(tags)
+        css = stylesheet.trimmed.get(key)
+        if css is None:
+            css = stylesheet.trimmed[key] = serialize(stylesheet.rules, key)
+        return css
+
+
+def _stamps(stamps: dict) -> Optional[dict]:
+    """Fresh (mtime_ns, size) of the stylesheets in stamps, or None if one can't be read"""
+    try:
+        return {path: (st.st_mtime_ns, st.st_size) for path, st in ((path, os.stat(path)) for path in stamps)}
+    except OSError:
+        return None
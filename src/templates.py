@@ -0,0 +1,237 @@
+"""Layouts with inheritance and includes.
+
+A template may start with {% extends "base.html" %} and override any {% block name %}...{% endblock %}
+of its parent; {% include "nav.html" %} splices another template in place. Paths are relative to the
+template that mentions them. {{ Name }} placeholders are filled at render time; unknown names are left
+as written.
+
+Every layout is resolved once into a flat CompiledTemplate (alternating literal text and placeholder
+names), so rendering a page is a single join no matter how deep the inheritance chain is. Compiled
+layouts are kept in memory (validated by mtime and size) and persisted across builds keyed by the hash
+of the template and of every file it pulled in.
+"""
+import hashlib
+import json
+import os
+import pathlib
+import re
+from typing import Optional
+
+TAG_PATTERN = re.compile(r'\{%\s*(extends|include|block|endblock)\s*(?:"([^"]*)"|(\w+))?\s*%\}|\{\{ (\w+) \}\}')
+
+# cap on extends/include nesting, so a template that includes itself fails instead of recursing forever
+MAX_DEPTH = 32
+
+
+class TemplateError(Exception):
+    pass
+
+
+class CompiledTemplate:
+    """fragments - literal text at even indices, placeholder names at odd indices
+    dependencies - {path: sha256} of every file the layout was built from"""
+
+    def __init__(self, fragments:list[str], dependencies:dict[str, str]) -> None:
+        self.fragments = fragments
+        self.dependencies = dependencies
+
+    def render(self, values:dict) -> str:
+        fragments = list(self.fragments)
+        for index in range(1, len(fragments), 2):
+            name = fragments[index]
+            fragments[index] = values[name] if name in values else "{{ " + name + " }}"
+        return "".join(fragments)
+
+
+def _parse(text:str, path:pathlib.Path) -> tuple[Optional[str], list, dict]:
+    """Returns (extends target, node list, {block name: node list}). Nodes are ("text", s), ("var", name),
+    ("block", name, nodes) or ("include", target)."""
+    root = list()
+    stack = [("", root)]
+    blocks = dict()
+    extends = None
+    position = 0
+    for m in TAG_PATTERN.finditer(text):
+        current = stack[-1][1]
+        if m.start() > position:
+            current.append(("text", text[position:m.start()]))
+        position = m.end()
+        keyword, quoted, bare, var = m.group(1), m.group(2), m.group(3), m.group(4)
+        if var is not None:
+            current.append(("var", var))
+        elif keyword == "extends":
+            if quoted is None:
+                raise TemplateError(f"{path}: extends needs a quoted path")
+            extends = quoted
+        elif keyword == "include":
+            if quoted is None:
+                raise TemplateError(f"{path}: include needs a quoted path")
+            current.append(("include", quoted))
+        elif keyword == "block":
+            name = bare or quoted
+            if name is None:
+                raise TemplateError(f"{path}: block needs a name")
+            children = list()
+            current.append(("block", name, children))
+            blocks[name] = children
+            stack.append((name, children))
+        else:
+            if len(stack) == 1:
+                raise TemplateError(f"{path}: endblock without block")
+            stack.pop()
+    if len(stack) > 1:
+        raise TemplateError(f"{path}: unclosed block {stack[-1][0]!r}")
+    if position < len(text):
+        stack[-1][1].append(("text", text[position:]))
+    return extends, root, blocks
+
+
+def _stamps(dependencies:dict) -> Optional[tuple]:
+    """(mtime_ns, size) of every dependency, or None if one can't be read"""
+    try:
+        return tuple((st.st_mtime_ns, st.st_size) for st in map(os.stat, dependencies))
+    except OSError:
+        return None
+
+
+class TemplateLoader:
+    def __init__(self, cache_path:Optional[pathlib.Path]=None) -> None:
+        self.cache_path = cache_path
+        self.memory = dict()   # path -> (stamps of the template and everything it extends/includes, CompiledTemplate)
+        self.disk = dict()     # sha256 of template path and bytes -> {"dependencies": {...}, "fragments": [...]}
+        self.dirty = False
+        self.log = None        # when a list, new disk entries are also appended as (digest, entry); see merge
+        if cache_path is not None and cache_path.exists():
+            try:
+                self.disk = json.loads(cache_path.read_text())
+            except (OSError, ValueError):
+                pass
+
+    def load(self, path:pathlib.Path) -> CompiledTemplate:
+        key = str(path)
+        cached = self.memory.get(key)
+        if cached is not None and cached[0] == _stamps(cached[1].dependencies):
+            return cached[1]
+
+        data = path.read_bytes()
+        # the path is part of the key because relative extends/includes resolve differently per directory
+        digest = hashlib.sha256(key.encode() + b"\0" + data).hexdigest()
+        compiled = self._from_disk(digest)
+        if compiled is None:
+            compiled = self._compile(path, data.decode(), depth=0)
+            self.disk[digest] = {"dependencies": compiled.dependencies, "fragments": compiled.fragments}
+            self.dirty = True
+            if self.log is not None:
+                self.log.append((digest, self.disk[digest]))
+        self.memory[key] = (_stamps(compiled.dependencies), compiled)
+        return compiled
+
+    def _from_disk(self, digest:str) -> Optional[CompiledTemplate]:
+        entry = self.disk.get(digest)
+        if entry is None:
+            return None
+        for dep, dep_digest in entry["dependencies"].items():
+            try:
+                if hashlib.sha256(pathlib.Path(dep).read_bytes()).hexdigest() != dep_digest:
+                    return None
+            except OSError:
+                return None
+        return CompiledTemplate(entry["fragments"], entry["dependencies"])
+
+    def _compile(self, path:pathlib.Path, text:str, depth:int) -> CompiledTemplate:
+        if depth > MAX_DEPTH:
+            raise TemplateError(f"{path}: extends/include nested more than {MAX_DEPTH} deep")
+        dependencies = {str(path): hashlib.sha256(text.encode()).hexdigest()}
+        overrides = dict()
+        # walk up the extends chain; the most derived definition of each block wins
+        while True:
+            extends, nodes, blocks = _parse(text, path)
+            for name, children in blocks.items():
+                overrides.setdefault(name, (path, children))
+            if extends is None:
+                break
+            path = path.parent / extends
+            if str(path) in dependencies:
+                raise TemplateError(f"{path}: circular extends")
+            try:
+                text = path.read_text()
+            except OSError as e:
+                raise TemplateError(f"cannot read parent template {path}: {e}")
+            dependencies[str(path)] = hashlib.sha256(text.encode()).hexdigest()
+
+        out = [""]
+
+        def emit(nodes:list, base:pathlib.Path) -> None:
+            for node in nodes:
+                kind = node[0]
+                if kind == "text":
+                    out[-1] += node[1]
+                elif kind == "var":
+                    out.extend([node[1], ""])
+                elif kind == "block":
+                    owner, children = overrides.get(node[1], (base, node[2]))
+                    emit(children, owner)
+                else:
+                    include_path = base.parent / node[1]
+                    try:
+                        included = self._compile(include_path, include_path.read_text(), depth + 1)
+                    except OSError as e:
+                        raise TemplateError(f"cannot read included template {include_path}: {e}")
+                    dependencies.update(included.dependencies)
+                    out[-1] += included.fragments[0]
+                    out.extend(included.fragments[1:])
+
+        emit(nodes, path)
+        return CompiledTemplate(out, dependencies)
+
+    def merge(self, log: list) -> None:
+        """Adds the compiled templates another loader logged, e.g. in a worker process"""
+        for digest, entry in log:
+            self.disk[digest] = entry
+            self.dirty = True
+
+    def save(self) -> None:
+        if self.cache_path is None or not self.dirty:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self.cache_path.write_text(json.dumps(self.disk))
+        self.dirty = False
+
+
+LAYOUT_DIRECTIVE = re.compile(r"\A<!--\s*layout:\s*([\w./-]+)\s*-->[ \t]*\n?")
+
+
+def layout_directive(markdown:str) -> tuple[Optional[str], str]:
+    """Splits an optional first-line <!-- layout: name --> off a page; returns (name or None, remaining markdown)"""
+    m = LAYOUT_DIRECTIVE.match(markdown)
+    if m is None:
+        return None, markdown
+    return m.group(1), markdown[m.end():]
+
+
+def layout_stamp(directory:pathlib.Path) -> Optional[int]:
+    """mtime_ns of the directory's .layout file, or None if it has none"""
+    try:
+        return os.stat(directory / ".layout").st_mtime_ns
+    except OSError:
+        return None
+
+
+def directory_layout(page_path:pathlib.Path, content_dir:pathlib.Path, cache:Optional[dict]=None, stamps:Optional[dict]=None) -> Optional[str]:
+    """Returns the layout named in the nearest .layout file between the page's directory and content_dir.
+    cache - optional {directory: layout name} shared across pages so each directory is checked once
+    stamps - optional {directory: layout_stamp} filled in for every directory read, so a long-lived cache
+    can later be checked against the .layout files (see daemon.WarmState.check_layouts)"""
+    directory = page_path.parent
+    key = str(directory)
+    if cache is not None and key in cache:
+        return cache[key]
+    if stamps is not None:
+        stamps[key] = layout_stamp(directory)
+    layout_file = directory / ".layout"
+    name = layout_file.read_text().strip() if layout_file.is_file() else None
+    if name is None and content_dir in directory.parents:
+        name = directory_layout(directory, content_dir, cache, stamps)
+    if cache is not None:
+        cache[key] = name
+    return name
@@ -9,13 +9,31 @@ class TextType(Enum):
     CODE = "code"
 
 class TextNode:
-    def __init__(self, text: str, text_type: TextType, url: str=None):
-        self.text = text
+    """A run of inline text. The node refers to source[start:end] rather than owning a copy, so splitting a
+    paragraph into nodes shares one string; the substring is only made when .text is read, which the
+    renderer does once per node when it builds the HTML. TextNode(text, text_type) spans all of text."""
+
+    def __init__(self, text: str, text_type: TextType, url: str=None, start: int=0, end: int=None):
+        self.source = text
+        self.start = start
+        self.end = len(text) if end is None else end
         self.text_type = text_type
         self.url = url
 
+    @property
+    def text(self) -> str:
+        if self.start == 0 and self.end == len(self.source):
+            return self.source
+        return self.source[self.start:self.end]
+
+    @text.setter
+    def text(self, value: str) -> None:
+        self.source = value
+        self.start = 0
+        self.end = len(value)
+
     def __eq__(self, other):
         return (self.text == other.text) and (self.text_type == other.text_type) and (self.url == other.url)
 
     def __repr__(self):
-        return f"TextNode({self.text}, {self.text_type.value}, {self.url})"
\ No newline at end of file
+        return f"TextNode({self.text}, {self.text_type.value}, {self.url})"
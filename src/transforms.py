@@ -0,0 +1,300 @@
+"""Tree transforms fused into a single traversal per page.
+
+A Transform registers hooks per node type by returning {tag: callable} from hooks(); "" is the tag of
+plain-text leaves and "*" matches every node. TransformPipeline merges the hooks of all its transforms
+into one dispatch table and walks each page's HTMLNode tree once, in document order, calling every hook
+registered for the node's tag. Hooks may change a node's props and children; children are visited after
+their parent's hooks have run.
+
+Transforms share a PageContext: data for results other transforms or the build can read (e.g. the page
+text), and values, extra {{ Name }} placeholders for the page's template (e.g. {{ Toc }}).
+"""
+import re
+import time
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+from htmlnode import HTMLNode, LeafNode, ParentNode
+from imagesize import annotate_image, resolve_image_path
+
+HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+
+
+class PageContext:
+    def __init__(self, source=None) -> None:
+        self.source = source
+        self.data = dict()
+        self.values = dict()
+
+
+class Transform:
+    name = "transform"
+
+    def hooks(self) -> dict[str, Callable[[HTMLNode, PageContext], None]]:
+        return {}
+
+    def start(self, page: PageContext) -> None:
+        pass
+
+    def finish(self, page: PageContext) -> None:
+        pass
+
+
+class TransformPipeline:
+    def __init__(self, transforms: list[Transform]) -> None:
+        self.transforms = transforms
+        self.timings = {t.name: 0.0 for t in transforms}   # cumulative seconds per transform, across pages
+        self.pages = 0
+        named_hooks = dict()   # tag -> [(name, hook)]
+        for transform in transforms:
+            for tag, hook in transform.hooks().items():
+                named_hooks.setdefault(tag, []).append((transform.name, hook))
+        every = named_hooks.pop("*", [])
+        self.every = every
+        self.dispatch = {tag: hooks + every for tag, hooks in named_hooks.items()}
+
+    def run(self, root: HTMLNode, page: Optional[PageContext]=None) -> PageContext:
+        page = page if page is not None else PageContext()
+        timings = self.timings
+        clock = time.perf_counter
+        for transform in self.transforms:
+            t = clock()
+            transform.start(page)
+            timings[transform.name] += clock() - t
+
+        dispatch = self.dispatch
+        every = self.every
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for name, hook in dispatch.get(node.tag or "", every):
+                t = clock()
+                hook(node, page)
+                timings[name] += clock() - t
+            if node.children:
+                stack.extend(reversed(node.children))
+
+        for transform in self.transforms:
+            t = clock()
+            transform.finish(page)
+            timings[transform.name] += clock() - t
+        self.pages += 1
+        return page
+
+    def report(self) -> str:
+        lines = [f"transforms over {self.pages} pages:"]
+        for name, seconds in sorted(self.timings.items(), key=lambda item: -item[1]):
+            lines.append(f"  {name:<16} {seconds * 1e3:9.2f} ms")
+        return "\n".join(lines)
+
+
+def node_text(node: HTMLNode) -> str:
+    """The visible text of a tree: every leaf value in document order, separated by spaces"""
+    fragments = list()
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.children:
+            stack.extend(reversed(current.children))
+        elif current.value:
+            fragments.append(current.value)
+    return " ".join(fragments)
+
+
+class PageText(Transform):
+    """Collects the visible text into page.data["text"]"""
+    name = "text"
+
+    def hooks(self):
+        return {"*": self.visit}
+
+    def start(self, page):
+        page.data["text_fragments"] = list()
+
+    def visit(self, node, page):
+        if not node.children and node.value:
+            page.data["text_fragments"].append(node.value)
+
+    def finish(self, page):
+        page.data["text"] = " ".join(page.data.pop("text_fragments"))
+
+
+class ImageAttributes(Transform):
+    """Dimensions and lazy-loading attributes for images, see imagesize.annotate_image; the files measured are
+    listed in page.data["images"]"""
+    name = "images"
+
+    def __init__(self, static_dir=None, cache=None) -> None:
+        self.static_dir = static_dir
+        self.cache = cache
+
+    def hooks(self):
+        return {"img": self.visit}
+
+    def visit(self, node, page):
+        annotate_image(node, self.static_dir, self.cache)
+        if self.static_dir is not None:
+            path = resolve_image_path((node.props or {}).get("src"), self.static_dir)
+            if path is not None:
+                # lets a cached render be checked against the images it measured
+                page.data.setdefault("images", []).append(str(path))
+
+
+def slugify(text: str) -> str:
+    slug = re.sub(r"[^\w\s-]", "", text.lower()).strip()
+    return re.sub(r"[\s_-]+", "-", slug) or "section"
+
+
+def heading_id(node: HTMLNode, page: PageContext) -> str:
+    """Returns the heading's id, assigning a slug unique within the page if it has none"""
+    props = node.props if node.props else {}
+    if "id" not in props:
+        used = page.data.setdefault("heading_ids", set())
+        base = slugify(node_text(node))
+        slug = base
+        counter = 2
+        while slug in used:
+            slug = f"{base}-{counter}"
+            counter += 1
+        used.add(slug)
+        props["id"] = slug
+        node.props = props
+    return props["id"]
+
+
+class HeadingAnchors(Transform):
+    """Gives every heading an id so it can be linked to"""
+    name = "anchors"
+
+    def hooks(self):
+        return {tag: heading_id for tag in HEADING_TAGS}
+
+
+class TableOfContents(Transform):
+    """Builds a nested list of links to the page's h2-h6 headings, exposed to templates as {{ Toc }}"""
+    name = "toc"
+
+    def hooks(self):
+        return {tag: self.visit for tag in HEADING_TAGS[1:]}
+
+    def start(self, page):
+        page.data["toc"] = list()
+
+    def visit(self, node, page):
+        page.data["toc"].append((int(node.tag[1]), node_text(node), heading_id(node, page)))
+
+    def finish(self, page):
+        entries = page.data["toc"]
+        if not entries:
+            page.values["Toc"] = ""
+            return
+        # (level, ul node) for each open list; a deeper heading opens a list inside the last item
+        root = ParentNode("ul", [], {"class": "toc"})
+        stack = [(entries[0][0], root)]
+        for level, text, anchor in entries:
+            while len(stack) > 1 and level < stack[-1][0]:
+                stack.pop()
+            if level > stack[-1][0] and stack[-1][1].children:
+                nested = ParentNode("ul", [])
+                stack[-1][1].children[-1].children.append(nested)
+                stack.append((level, nested))
+            stack[-1][1].children.append(ParentNode("li", [LeafNode("a", text, {"href": f"#{anchor}"})]))
+        page.values["Toc"] = root.to_html()
+
+
+class ExternalLinks(Transform):
+    """Marks links to other sites with rel="noopener noreferrer external" """
+    name = "external-links"
+
+    def hooks(self):
+        return {"a": self.visit}
+
+    def visit(self, node, page):
+        props = node.props if node.props else {}
+        href = props.get("href") or ""
+        parsed = urlparse(href)
+        if parsed.scheme in ("http", "https") and parsed.netloc:
+            props.setdefault("rel", "noopener noreferrer external")
+            node.props = props
+
+
+class WordCount(Transform):
+    """Counts words of visible text into page.data["word_count"] and {{ WordCount }}"""
+    name = "wordcount"
+
+    def hooks(self):
+        return {"*": self.visit}
+
+    def start(self, page):
+        page.data["word_count"] = 0
+
+    def visit(self, node, page):
+        if not node.children and node.value:
+            page.data["word_count"] += len(node.value.split())
+
+    def finish(self, page):
+        page.values["WordCount"] = str(page.data["word_count"])
+
+
+class LinkTargets(Transform):
+    """Lists the href of every link and the src of every image in page.data["links"], in document order"""
+    name = "links"
+
+    def hooks(self):
+        return {"a": self.visit, "img": self.visit}
+
+    def start(self, page):
+        page.data["links"] = list()
+
+    def visit(self, node, page):
+        props = node.props or {}
+        url = props.get("href" if node.tag == "a" else "src")
+        if url:
+            page.data["links"].append(url)
+
+
+class PageStats(Transform):
+    """Counts the elements and images of the page's tree into page.data["stats"], for budgets.py"""
+    name = "stats"
+
+    def hooks(self):
+        return {"*": self.visit}
+
+    def start(self, page):
+        page.data["stats"] = {"nodes": 0, "images": 0}
+
+    def visit(self, node, page):
+        if node.tag:
+            stats = page.data["stats"]
+            stats["nodes"] += 1
+            if node.tag == "img":
+                stats["images"] += 1
+
+
+class ElementTags(Transform):
+    """Collects the tag names of the page's tree into page.data["tags"], for stylesheets.py"""
+    name = "tags"
+
+    def hooks(self):
+        return {"*": self.visit}
+
+    def start(self, page):
+        page.data["tags"] = set()
+
+    def visit(self, node, page):
+        if node.tag:
+            page.data["tags"].add(node.tag)
+
+
+# transforms that can be switched on with --transforms
+OPTIONAL_TRANSFORMS = {
+    "anchors": HeadingAnchors,
+    "toc": TableOfContents,
+    "external-links": ExternalLinks,
+    "wordcount": WordCount,
+}
+
+
+def default_pipeline(static_dir=None, image_cache=None, extra: list[Transform]=()) -> TransformPipeline:
+    """The transforms every build runs (image attributes, page text) followed by any extra ones"""
+    return TransformPipeline([ImageAttributes(static_dir, image_cache), PageText(), *extra])
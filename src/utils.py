@@ -1,9 +1,16 @@
 import re
+import os
 import pathlib
 
 from blocktype import BlockType
 from textnode import TextNode, TextType
-from htmlnode import LeafNode, HTMLNode, ParentNode
+from htmlnode import LeafNode, HTMLNode, ParentNode, compile_html, escape_text
+from imagesize import ImageSizeCache
+from transforms import TransformPipeline, PageContext, default_pipeline
+from templates import TemplateLoader, layout_directive
+from stylesheets import StylesheetInliner
+from output import write_if_changed
+import highlight
 
 
 def text_node_to_html_node(node: TextNode) -> LeafNode:
@@ -24,41 +31,52 @@ def text_node_to_html_node(node: TextNode) -> LeafNode:
             raise ValueError()
 
 def split_nodes_delimiter(old_nodes:list[TextNode], delimiter:str, text_type:TextType) -> list[TextNode]:
+    """Splits each node on delimiter; every text between a pair becomes a text_type node.
+
+    Runs in linear time and never raises on malformed input: an unmatched final delimiter and empty
+    delimited spans (e.g. "____") are kept as literal text. The new nodes are spans of the old node's
+    source, so no text is copied."""
     all_new_nodes = list()
+    width = len(delimiter)
     for old_node in old_nodes:
-        initial_delimiter = (old_node.text[0] == delimiter)
-        final_delimiter = (old_node.text[-1] == delimiter)
-        split_string = old_node.text.split(delimiter)
-        # first, if the length is even, then there was an odd number of delimiters, and should raise an error
-        if len(split_string) % 2 == 0:
-            raise ValueError
-        # if there is an initial delimiter, l[0] will be ''
-        # if there is a final delimiter, l[-1] will be ''
-        # in either case, every odd element will be a match
-        new_nodes = list()
-        for index, item in enumerate(split_string):
-            if index %2 == 1:
-                this_type = text_type
-            else:
-                this_type = old_node.text_type # nonmatching should inherit type of containing node
-            new_node = TextNode(text=item,text_type=this_type,url=None)
-            new_nodes.append(new_node)
-
-        if new_nodes[0].text == "":
-            new_nodes = new_nodes[1:]
-        if new_nodes[-1].text == "":
-            new_nodes = new_nodes[:-1]
-        all_new_nodes.extend(new_nodes)
+        source, end = old_node.source, old_node.end
+        opening = source.find(delimiter, old_node.start, end)
+        if opening == -1:
+            all_new_nodes.append(old_node)
+            continue
+        # text before a match, including empty pairs and a final unmatched delimiter, starts at pending
+        pending = old_node.start
+        while opening != -1:
+            closing = source.find(delimiter, opening + width, end)
+            if closing == -1:
+                break
+            if closing > opening + width:
+                if pending < opening:
+                    all_new_nodes.append(TextNode(source, old_node.text_type, None, pending, opening)) # nonmatching should inherit type of containing node
+                all_new_nodes.append(TextNode(source, text_type, None, opening + width, closing))
+                pending = closing + width
+            opening = source.find(delimiter, closing + width, end)
+        if pending < end:
+            all_new_nodes.append(TextNode(source, old_node.text_type, None, pending, end))
     return all_new_nodes
 
+# The bracketed parts allow one level of nested [...] in the text and (...) in the URL, e.g.
+# [the [x] thing](/a) or [w](https://x.org/Foo(bar)), but otherwise exclude brackets/parentheses and newlines
+# rather than using lazy ".*?". Each alternative starts with a different character, so a failed match attempt
+# stops at the next unbalanced bracket instead of rescanning the rest of the line. That keeps matching linear
+# on inputs such as thousands of unmatched "[" or "![".
+_LINK_TEXT = r"((?:[^\[\]\n]|\[[^\[\]\n]*\])*)"
+_LINK_URL = r"((?:[^()\n]|\([^()\n]*\))*)"
+IMAGE_PATTERN = re.compile(r"!\[" + _LINK_TEXT + r"\]\(" + _LINK_URL + r"\)")
+LINK_PATTERN = re.compile(r"\[" + _LINK_TEXT + r"\]\(" + _LINK_URL + r"\)")
+
 def extract_markdown_images(text:str) -> list[tuple[str, str]]:
     """Finds and extract all markdown images and alt text using regex
     Format must match ![alt-text](http://url/a.png)
     """
 
     return_list = list()
-    pattern =  r"!\[(.*?)\]\((.*?)\)"
-    matches = re.finditer(pattern, text)
+    matches = IMAGE_PATTERN.finditer(text)
 
     for m in matches:
         ##print(f'match is {m.group(0)}')  # full match
@@ -70,12 +88,11 @@ def extract_markdown_images(text:str) -> list[tuple[str, str]]:
     return return_list
 
 def split_node_image(old_node:TextNode) -> list[TextNode]:
-    text = old_node.text
-    pattern =  r"!\[(.*?)\]\((.*?)\)"
-    matches = list(re.finditer(pattern, text))
+    source = old_node.source
+    matches = list(IMAGE_PATTERN.finditer(source, old_node.start, old_node.end))
     new_nodes = list()
 
-    previous_end = 0
+    previous_end = old_node.start
     if not matches:
         return [old_node]
     for m in matches:
@@ -83,9 +100,8 @@ def split_node_image(old_node:TextNode) -> list[TextNode]:
         ##print(f'start, end: {m.start()}, {m.end()}')
         ##print(f'alt text is: {m.group(1)}')
         ##print(f'URL is: {m.group(2)}')
-        prior_nonmatching_text = text[previous_end:m.start()]
-        prior_node = TextNode(text=prior_nonmatching_text, text_type=old_node.text_type, url=None)
-        image_node = TextNode(text=m.group(1), url=m.group(2), text_type=TextType.IMAGE)
+        prior_node = TextNode(source, old_node.text_type, None, previous_end, m.start())
+        image_node = TextNode(source, TextType.IMAGE, m.group(2), m.start(1), m.end(1))
         new_nodes.append(prior_node)
         new_nodes.append(image_node)
         previous_end = m.end()
@@ -95,18 +111,19 @@ def split_node_image(old_node:TextNode) -> list[TextNode]:
 
 
 def split_node_regex(old_node:TextNode, split_type:TextType) -> list[TextNode]:
-    text = old_node.text
+    """Splits out the links or images of a node as spans of its source; only the URLs are copied"""
+    source = old_node.source
     if split_type == TextType.LINK:
-        pattern =  r"\[(.*?)\]\((.*?)\)"
+        pattern = LINK_PATTERN
     elif split_type == TextType.IMAGE:
-        pattern = r"!\[(.*?)\]\((.*?)\)"
+        pattern = IMAGE_PATTERN
     else:
         raise ValueError()
 
-    matches = list(re.finditer(pattern, text))
+    matches = list(pattern.finditer(source, old_node.start, old_node.end))
     new_nodes = list()
 
-    previous_end = 0
+    previous_end = old_node.start
     if not matches:
         return [old_node]
     for m in matches:
@@ -114,22 +131,17 @@ def split_node_regex(old_node:TextNode, split_type:TextType) -> list[TextNode]:
         ###print(f'start, end: {m.start()}, {m.end()}')
         ###print(f'alt text is: {m.group(1)}')
         ###print(f'URL is: {m.group(2)}')
-        prior_nonmatching_text = text[previous_end:m.start()]
-        prior_node = TextNode(text=prior_nonmatching_text, text_type=old_node.text_type, url=None)
-        image_node = TextNode(text=m.group(1), url=m.group(2), text_type=split_type)
-        if prior_node.text == "":
-            pass
-        else:
-            new_nodes.append(prior_node)
+        if previous_end < m.start():
+            new_nodes.append(TextNode(source, old_node.text_type, None, previous_end, m.start()))
+        image_node = TextNode(source, split_type, m.group(2), m.start(1), m.end(1))
         new_nodes.append(image_node)
         previous_end = m.end()
         #regex_match = RegexMatch(start=m.start(), end=m.end(), alt_text=m.group(1), url=m.group(2), text_type=TextType.IMAGE)
         #regex_matches.append(regex_match)
 
     # add the rest of the text as a final node
-    if previous_end != len(text):
-        end_text = text[previous_end:]
-        new_nodes.append(TextNode(text=end_text, text_type=old_node.text_type))
+    if previous_end != old_node.end:
+        new_nodes.append(TextNode(source, old_node.text_type, None, previous_end, old_node.end))
 
     return new_nodes
 
@@ -170,7 +182,7 @@ def block_to_blocktype(s:str) -> BlockType:
         return BlockType.CODE
 
     lines = s.split("\n")
-    quote_lines = [x for x in lines if x[0] == ">"]
+    quote_lines = [x for x in lines if x.startswith(">")]
 
     if len(quote_lines) == len(lines):
         return BlockType.QUOTE
@@ -230,9 +242,19 @@ def block_to_code_node(block:str) -> ParentNode:
     # should be a <code> block nested inside a <pre> block
     lines = block.split("\n")
     code_content = "\n".join(lines[1:-1]) #remove backticks
-    text_node = TextNode(code_content, TextType.TEXT)
-    code_node = text_node_to_html_node(text_node)
-    inner_node = ParentNode(tag="code", children=[code_node])
+    language = lines[0][3:].strip().split(" ")[0] # info string after the opening fence, e.g. ```python
+    if not language:
+        text_node = TextNode(code_content, TextType.TEXT)
+        code_node = text_node_to_html_node(text_node)
+        inner_node = ParentNode(tag="code", children=[code_node])
+        return ParentNode(tag="pre", children=[inner_node])
+
+    tokens = highlight.default_cache.highlight(code_content, language)
+    if tokens:
+        children = [LeafNode("span", text, {"class": f"tok-{kind}"}) if kind else LeafNode("", text) for kind, text in tokens]
+    else:
+        children = [LeafNode("", code_content)]
+    inner_node = ParentNode(tag="code", children=children, props={"class": f"language-{language}"})
     return ParentNode(tag="pre", children=[inner_node])
 
 def block_to_block_quote_node(block:str) -> ParentNode:
@@ -321,30 +343,92 @@ def extract_title(markdown:str) -> str:
 
     raise ValueError
 
-def generate_page(from_path: pathlib.Path, template_path: pathlib.Path, dest_path:pathlib.Path, basepath: str) -> None:
-    print(f"generating page {str(from_path)} to {str(dest_path)} using {str(template_path)}")
-
-    with open(from_path) as f:
-        markdown_content = f.read()
-
-    with open(template_path) as f:
-        template_content = f.read()
-
-    html = markdown_to_html_node(markdown_content).to_html()
-    print("\nhtml is:")
-    print(html)
-    print("-----")
-
-    #title = "<h1>" + extract_title(markdown_content) + "</h1>"
-    title = extract_title(markdown_content)
+# used when generate_page is called without a loader; keeps compiled layouts for the life of the process
+default_template_loader = TemplateLoader()
+
+def layout_path(name: str, layouts_dir: pathlib.Path) -> pathlib.Path:
+    path = layouts_dir / name
+    return path if path.suffix else path.with_suffix(".html")
+
+class RenderedPage:
+    def __init__(self, html: str, title: str, content: str, text: str, layout: str=None, data: dict=None) -> None:
+        """html - the complete document
+        title - the page title from extract_title
+        content - the rendered markdown that went into {{ Content }}
+        text - the page's visible text (see transforms.PageText), e.g. for search indexing
+        layout - the layout named by the page's <!-- layout: name --> directive, if any
+        data - what the page's transforms recorded (see transforms.PageContext)"""
+        self.html = html
+        self.title = title
+        self.content = content
+        self.text = text
+        self.layout = layout
+        self.data = data if data is not None else {}
+
+def image_stamps(paths) -> tuple:
+    """(mtime_ns, size) of each image file, None for one that can't be read"""
+    stamps = list()
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stamps.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+def render_page(from_path: pathlib.Path, template_path: pathlib.Path, basepath: str, static_dir: pathlib.Path=None, image_cache: ImageSizeCache=None, page_cache: dict=None, template_loader: TemplateLoader=None, layouts_dir: pathlib.Path=None, transforms: TransformPipeline=None, css_inliner: StylesheetInliner=None) -> RenderedPage:
+    """Renders one markdown source into a complete HTML document.
+    page_cache - optional dict reused across builds (e.g. by the daemon); maps a source path to the
+    (mtime_ns, size) of the source, the render settings (transform names and static dir) and the stamps of the
+    images it references, plus the rendered (html, title, layout, page context), so unchanged sources are not
+    parsed again
+    transforms - the pipeline run over the page's tree; defaults to transforms.default_pipeline
+    layouts_dir - where a page's <!-- layout: name --> directive is looked up; it overrides template_path
+    css_inliner - optional stylesheets.StylesheetInliner that inlines the template's small stylesheets"""
+    print(f"rendering page {str(from_path)} using {str(template_path)}")
+
+    st = from_path.stat()
+    if transforms is None:
+        transforms = default_pipeline(static_dir=static_dir, image_cache=image_cache)
+    key = ((st.st_mtime_ns, st.st_size), tuple(t.name for t in transforms.transforms), str(static_dir))
+    cached = page_cache.get(str(from_path)) if page_cache is not None else None
+    if cached is not None and cached[0] == key and image_stamps(cached[1][3].data.get("images", ())) == cached[2]:
+        html, title, layout, page = cached[1]
+    else:
+        with open(from_path) as f:
+            markdown_content = f.read()
+        layout, markdown_content = layout_directive(markdown_content)
+
+        root = markdown_to_html_node(markdown_content)
+        page = transforms.run(root, PageContext(from_path))
+        html = compile_html(root).render()
+        print("\nhtml is:")
+        print(html)
+        print("-----")
+
+        #title = "<h1>" + extract_title(markdown_content) + "</h1>"
+        title = extract_title(markdown_content)
+        if page_cache is not None:
+            page_cache[str(from_path)] = (key, (html, title, layout, page), image_stamps(page.data.get("images", ())))
     print(f"title is {title}")
 
-    final_html = template_content.replace("{{ Title }}", title).replace("{{ Content }}", html).replace('href="/', f'href="{basepath}').replace('src="/', f'src="{basepath}')
+    if layout is not None and layouts_dir is not None:
+        template_path = layout_path(layout, layouts_dir)
+    loader = template_loader if template_loader is not None else default_template_loader
+    template = loader.load(template_path)
+    values = {**page.values, "Title": escape_text(title), "Content": html}
+    if css_inliner is not None:
+        template, values = css_inliner.inline(template, values, page)
+    final_html = template.render(values).replace('href="/', f'href="{basepath}').replace('src="/', f'src="{basepath}')
+    return RenderedPage(html=final_html, title=title, content=html, text=page.data.get("text", ""), layout=layout, data=page.data)
+
+def generate_page(from_path: pathlib.Path, template_path: pathlib.Path, dest_path:pathlib.Path, basepath: str, **kwargs) -> bool:
+    """Renders from_path (see render_page for the optional keyword arguments) and writes it to dest_path.
+    Returns whether dest_path was written; an output that already holds the same bytes is left untouched."""
+    print(f"generating page {str(from_path)} to {str(dest_path)} using {str(template_path)}")
+    page = render_page(from_path, template_path, basepath, **kwargs)
 
-    # ensure that destination directory exists
+    # write_if_changed creates the destination directory if needed
     print(f'parent is {dest_path.parent}')
-    dest_path.parent.mkdir(parents=True, exist_ok=True)
-
-
-    with open(dest_path, "w") as f:
-        f.write(final_html)
\ No newline at end of file
+    return write_if_changed(dest_path, page.html.encode("utf-8"))
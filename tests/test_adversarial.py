@@ -0,0 +1,81 @@
+import time
+import unittest
+
+from src.utils import split_nodes_delimiter, text_to_textnodes, block_to_blocktype, markdown_to_html_node, BlockType
+from src.textnode import TextNode, TextType
+
+# generous wall-clock bound per input; a quadratic parser needs minutes on these sizes
+TIME_LIMIT = 2.0
+N = 100_000
+
+
+class TestAdversarialInputs(unittest.TestCase):
+    def assertRendersQuickly(self, markdown):
+        start = time.perf_counter()
+        html = markdown_to_html_node(markdown).to_html()
+        elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, TIME_LIMIT, f"{markdown[:20]!r}... took {elapsed:.2f}s")
+        return html
+
+    def test_underscores(self):
+        html = self.assertRendersQuickly("_" * N)
+        self.assertEqual(html, "<div><p>" + "_" * N + "</p></div>")
+
+    def test_odd_number_of_delimiters(self):
+        self.assertRendersQuickly("**" * (N // 2 + 1))
+        self.assertRendersQuickly("`" * (N + 1))
+
+    def test_unmatched_link_brackets(self):
+        self.assertRendersQuickly("[" * N)
+        self.assertRendersQuickly("[a](" * (N // 4))
+        self.assertRendersQuickly("[" * N + "](x)")
+
+    def test_unmatched_image_brackets(self):
+        self.assertRendersQuickly("![" * (N // 2))
+        self.assertRendersQuickly("![a](" * (N // 5))
+
+    def test_unbalanced_nesting(self):
+        self.assertRendersQuickly("[a [b" * (N // 5))
+        self.assertRendersQuickly("[a](b(c" * (N // 7))
+        self.assertRendersQuickly("[[x]" * (N // 4))
+
+    def test_many_short_lines(self):
+        self.assertRendersQuickly("\n".join(["> quote"] * (N // 8)))
+        self.assertRendersQuickly("\n".join(f"{i + 1}. item" for i in range(N // 8)))
+        self.assertRendersQuickly("\n\n".join(["a _b_ **c** `d` [e](f)"] * (N // 25)))
+
+
+class TestNestedBrackets(unittest.TestCase):
+    def test_link_text_with_brackets(self):
+        html = markdown_to_html_node("See [the [x] thing](/a)").to_html()
+        self.assertEqual(html, '<div><p>See <a href="/a">the [x] thing</a></p></div>')
+
+    def test_url_with_parentheses(self):
+        html = markdown_to_html_node("[w](https://x.org/Foo(bar)) ![i](/p(1).png)").to_html()
+        self.assertEqual(html, '<div><p><a href="https://x.org/Foo(bar)">w</a> <img src="/p(1).png" alt="i"/></p></div>')
+
+
+class TestGracefulFallbacks(unittest.TestCase):
+    def test_unmatched_delimiter_is_literal(self):
+        nodes = split_nodes_delimiter([TextNode("a _b_ c_d", TextType.TEXT)], "_", TextType.ITALIC)
+        self.assertEqual([(n.text, n.text_type) for n in nodes], [
+            ("a ", TextType.TEXT),
+            ("b", TextType.ITALIC),
+            (" c_d", TextType.TEXT),
+        ])
+
+    def test_empty_span_is_literal(self):
+        nodes = split_nodes_delimiter([TextNode("a ** b", TextType.TEXT)], "*", TextType.ITALIC)
+        self.assertEqual([(n.text, n.text_type) for n in nodes], [("a ** b", TextType.TEXT)])
+
+    def test_underscore_inside_code(self):
+        nodes = text_to_textnodes("call `snake_case` here")
+        self.assertEqual([n.text for n in nodes], ["call ", "snake_case", " here"])
+
+    def test_empty_lines_in_block(self):
+        self.assertEqual(block_to_blocktype("first\n\nsecond"), BlockType.PARAGRAPH)
+        self.assertEqual(block_to_blocktype("> a\n\n> b"), BlockType.PARAGRAPH)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import pathlib
+import tempfile
+import unittest
+
+from src.assets import AssetReferences
+
+
+class TestResolve(unittest.TestCase):
+    def test_absolute_and_relative(self):
+        refs = AssetReferences("/")
+        self.assertEqual(refs.resolve("/images/a.png", "blog/tom/index.html"), "images/a.png")
+        self.assertEqual(refs.resolve("../b.png?v=2#top", "blog/tom/index.html"), "blog/b.png")
+        self.assertEqual(refs.resolve("/blog/", "index.html"), "blog/index.html")
+        self.assertEqual(refs.resolve("/my%20file.pdf", "index.html"), "my file.pdf")
+
+    def test_outside_the_site(self):
+        refs = AssetReferences("/site/")
+        for url in ["https://example.com/a.png", "//cdn.example.com/a.js", "mailto:me@example.com", "#top", "data:image/png;base64,AA", "/other/a.png", "../../a.png"]:
+            self.assertIsNone(refs.resolve(url, "index.html"), url)
+        self.assertEqual(refs.resolve("/site/a.png", "index.html"), "a.png")
+
+
+class TestAssetReferences(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = pathlib.Path(self.tmp.name)
+        (self.static / "css").mkdir()
+        (self.static / "css" / "site.css").write_text('@import "fonts.css";\nbody { background: url(../img/bg.png) }')
+        (self.static / "css" / "fonts.css").write_text("@font-face { src: url('/fonts/a.woff2') format('woff2') }")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_pages_and_stylesheets(self):
+        refs = AssetReferences("/")
+        refs.add_page("blog/index.html", '<link rel="stylesheet" href="/css/site.css"><img src="cat.png" alt=""><a href=\'https://x.org\'>x</a>')
+        refs.add_stylesheets(self.static)
+        self.assertEqual(refs.referenced, {"css/site.css", "blog/cat.png", "css/fonts.css", "img/bg.png", "fonts/a.woff2"})
+
+    def test_wanted(self):
+        refs = AssetReferences("/", keep=["downloads/*"])
+        refs.add_page("index.html", '<img src="/a.png">')
+        self.assertTrue(refs.wanted("a.png"))
+        self.assertTrue(refs.wanted("robots.txt"))
+        self.assertTrue(refs.wanted("downloads/cv.pdf"))
+        self.assertFalse(refs.wanted("b.png"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import json
+import unittest
+
+from src.batch import render_document, render_records
+
+
+class TestBatch(unittest.TestCase):
+    def test_render_document(self):
+        self.assertEqual(render_document("# Hi\n\nsome **bold** <b>"), ("<div><h1>Hi</h1><p>some <b>bold</b> &lt;b&gt;</p></div>", "Hi"))
+        self.assertEqual(render_document("## no title")[1], "")
+
+    def test_records_keep_order_and_report_errors(self):
+        lines = [json.dumps({"id": 1, "markdown": "# One"}), "", json.dumps({"id": 2}), "not json", json.dumps({"id": "c", "markdown": "three"})]
+        records = list(render_records(lines))
+        self.assertEqual([record["id"] for record in records], [1, 2, None, "c"])
+        self.assertEqual(records[0], {"id": 1, "html": "<div><h1>One</h1></div>", "title": "One"})
+        self.assertIn("error", records[1])
+        self.assertIn("error", records[2])
+
+    def test_pool_keeps_input_order(self):
+        lines = [json.dumps({"id": i, "markdown": f"# Doc {i}\n\n" + "word " * (i % 7) * 100}) for i in range(40)]
+        self.assertEqual(list(render_records(lines, jobs=3)), list(render_records(lines)))
+
+
+if __name__ == "__main__":
+    unittest.main()
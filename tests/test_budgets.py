@@ -0,0 +1,54 @@
+import pathlib
+import tempfile
+import unittest
+
+from src.budgets import PageBudgets, parse_limit, parse_override
+
+
+class TestParse(unittest.TestCase):
+    def test_limits(self):
+        self.assertEqual(parse_limit("html=500K"), ("html", 512000))
+        self.assertEqual(parse_limit("images=40"), ("images", 40))
+        self.assertEqual(parse_limit("assets=off"), ("assets", None))
+        self.assertEqual(parse_override("blog/*:nodes=3000"), ("blog/*", "nodes", 3000))
+        for text in ["pixels=3", "images=2M", "html", "images=40:x"]:
+            with self.assertRaises(ValueError):
+                parse_limit(text)
+
+
+class TestPageBudgets(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = pathlib.Path(self.tmp.name)
+        (self.static / "images").mkdir()
+        (self.static / "images" / "cat.png").write_bytes(b"x" * 1000)
+        (self.static / "font.woff2").write_bytes(b"x" * 300)
+        (self.static / "base.css").write_text("@font-face { src: url(font.woff2) }")
+        (self.static / "index.css").write_text('@import "base.css"; body { color: red }')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_assets_are_counted_once(self):
+        budgets = PageBudgets(self.static, "/site/")
+        html = ('<link rel="stylesheet" href="/site/index.css"><img src="../images/cat.png"><img src="/site/images/cat.png">'
+                '<a href="/site/images/cat.png">full size</a><img src="https://example.com/x.png"><script src="/site/missing.js"></script>')
+        metrics = budgets.measure("blog/post.html", len(html), html, {"nodes": 12, "images": 3})
+        css = len((self.static / "index.css").read_bytes()) + len((self.static / "base.css").read_bytes())
+        self.assertEqual(metrics, {"html": len(html), "images": 3, "nodes": 12, "assets": 1000 + 300 + css})
+
+    def test_overrides(self):
+        budgets = PageBudgets(self.static, limits=[("images", 2), ("html", 100)], overrides=[("blog/*", "images", 10), ("blog/gallery.md", "images", None)])
+        self.assertEqual(budgets.limits_for("index.md"), {"images": 2, "html": 100})
+        self.assertEqual(budgets.limits_for("blog/post.md"), {"images": 10, "html": 100})
+        self.assertEqual(budgets.limits_for("blog/gallery.md"), {"html": 100})
+        metrics = {"html": 2048, "images": 5, "nodes": 40, "assets": 0}
+        over = budgets.check("content/blog/post.md", "blog/post.md", metrics)
+        self.assertEqual([str(violation) for violation in over], ["content/blog/post.md: html 2.0 KiB over budget of 100 B"])
+        budgets.check("content/index.md", "index.md", metrics)
+        self.assertEqual(len(budgets.violations), 3)
+        self.assertEqual(budgets.report(), "budgets: 2 pages checked, 3 over budget")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import pathlib
+import tempfile
+import unittest
+
+from src.daemon import RENDER_CACHE_SIZE, WarmState, resolve_paths
+from src.main import build_parser
+from src.templates import directory_layout
+
+
+class TestWarmState(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = pathlib.Path(self.tmp.name)
+        (self.dir / "blog").mkdir()
+        (self.dir / "index.md").write_text("# Home")
+        (self.dir / "blog" / "post.md").write_text("# Post")
+        (self.dir / "blog" / "notes.txt").write_text("ignored")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_list_markdown_is_reused(self):
+        state = WarmState()
+        first = state.list_markdown(self.dir)
+        self.assertEqual(sorted(p.name for p in first), ["index.md", "post.md"])
+        self.assertIs(state.list_markdown(self.dir), first)
+
+    def test_list_markdown_sees_new_files(self):
+        state = WarmState()
+        state.list_markdown(self.dir)
+        (self.dir / "blog" / "new.md").write_text("# New")
+        names = sorted(p.name for p in state.list_markdown(self.dir))
+        self.assertEqual(names, ["index.md", "new.md", "post.md"])
+
+    def test_render(self):
+        state = WarmState()
+        self.assertEqual(state.render("# Hi"), ("<div><h1>Hi</h1></div>", "Hi"))
+
+    def test_edited_layout_file_is_picked_up(self):
+        state = WarmState()
+        (self.dir / "blog" / ".layout").write_text("blog")
+        self.assertEqual(directory_layout(self.dir / "blog" / "post.md", self.dir, state.layouts, state.layout_stamps), "blog")
+        state.check_layouts()
+        self.assertEqual(state.layouts[str(self.dir / "blog")], "blog")
+        (self.dir / "blog" / ".layout").write_text("docs")
+        os.utime(self.dir / "blog" / ".layout", ns=(1, 1))
+        state.check_layouts()
+        self.assertEqual(directory_layout(self.dir / "blog" / "post.md", self.dir, state.layouts, state.layout_stamps), "docs")
+
+    def test_render_cache_is_bounded(self):
+        state = WarmState()
+        for i in range(RENDER_CACHE_SIZE + 10):
+            state.render(f"# Page {i}")
+        self.assertEqual(len(state.rendered), RENDER_CACHE_SIZE)
+        self.assertEqual(state.render("# Page 0"), ("<div><h1>Page 0</h1></div>", "Page 0"))
+
+    def test_resolve_paths_uses_client_cwd(self):
+        args = resolve_paths(build_parser().parse_args(["--destination", "out", "--static", "/abs/static"]), "/site")
+        self.assertEqual(args.destination, pathlib.Path("/site/out"))
+        self.assertEqual(args.static, pathlib.Path("/abs/static"))
+        self.assertEqual(args.content, pathlib.Path("/site/content"))
+
+
+if __name__ == "__main__":
+    unittest.main()
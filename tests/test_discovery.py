@@ -0,0 +1,55 @@
+import os
+import pathlib
+import tempfile
+import unittest
+
+from src.discovery import IgnoreRules, walk_sources
+
+
+class TestWalkSources(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = pathlib.Path(self.tmp.name)
+        for name in ["index.md", "notes.txt", "blog/tom/index.md", "blog/tom/.#index.md", "blog/tom/index.md~",
+                     "drafts/idea.md", "vendor/lib/docs/readme.md", "vendor/lib/src/readme.md", ".git/info.md"]:
+            path = self.content / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("# Hi")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def walk(self, **kwargs):
+        return sorted(source.relative for source in walk_sources(self.content, **kwargs))
+
+    def test_defaults_skip_hidden_directories_and_editor_files(self):
+        self.assertEqual(self.walk(), ["blog/tom/index.md", "drafts/idea.md", "index.md", "vendor/lib/docs/readme.md", "vendor/lib/src/readme.md"])
+
+    def test_ignore_file(self):
+        (self.content / ".ssgignore").write_text("# not published\ndrafts/\nvendor/*/src\n")
+        self.assertEqual(self.walk(), ["blog/tom/index.md", "index.md", "vendor/lib/docs/readme.md"])
+
+    def test_negation_and_name_patterns(self):
+        rules = IgnoreRules(["*.md", "!index.md"])
+        self.assertEqual(self.walk(ignore=rules), ["blog/tom/index.md", "index.md"])
+
+    def test_directory_only_patterns_do_not_match_files(self):
+        rules = IgnoreRules(["index.md/"])
+        self.assertIn("index.md", self.walk(ignore=rules))
+
+    def test_sources_carry_path_and_size(self):
+        sources = {source.relative: source for source in walk_sources(self.content)}
+        source = sources["blog/tom/index.md"]
+        self.assertEqual(source.path, os.path.join(self.content, "blog", "tom", "index.md"))
+        self.assertEqual(source.size, 4)
+        self.assertEqual(source.name, "index.md")
+
+    def test_below_and_dir_mtimes(self):
+        dir_mtimes = dict()
+        found = [source.relative for source in walk_sources(self.content, below="blog", dir_mtimes=dir_mtimes)]
+        self.assertEqual(found, ["blog/tom/index.md"])
+        self.assertEqual(set(dir_mtimes), {os.path.join(self.content, "blog"), os.path.join(self.content, "blog", "tom")})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import pathlib
+import tempfile
+import unittest
+
+from src.feeds import PageIndex
+
+
+class TestPageIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = pathlib.Path(self.tmp.name)
+        self.state = self.dir / "page-index.json"
+        self.docs = self.dir / "docs"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, pages, **kwargs):
+        """pages - [(output path, title, source hash, mtime)]; runs one build and returns what it wrote"""
+        index = PageIndex(self.state)
+        for path, title, digest, mtime in pages:
+            url = "/" + path[:-len("index.html")] if path.endswith("index.html") else "/" + path
+            index.add_page(url, path, title, digest, mtime)
+        written = index.write(self.docs, "https://example.com", feed_section="blog", **kwargs)
+        index.save()
+        return index, written
+
+    def test_unchanged_source_keeps_its_date_and_files(self):
+        pages = [("index.html", "Home", "h1", 1_000_000), ("blog/a/index.html", "A", "h2", 2_000_000)]
+        index, written = self.build(pages)
+        self.assertTrue(all(written.values()))
+        self.assertIn(b"<loc>https://example.com/blog/a/</loc><lastmod>1970-01-24T03:33:20Z</lastmod>", (self.docs / "sitemap.xml").read_bytes())
+        # a fresh checkout touches every source, but the hashes say nothing changed
+        index, written = self.build([(path, title, digest, mtime + 500) for path, title, digest, mtime in pages])
+        self.assertEqual(index.changed, 0)
+        self.assertFalse(any(written.values()))
+
+    def test_feed_lists_section_pages_newest_first(self):
+        self.build([("blog/index.html", "Blog", "h0", 1), ("blog/old/index.html", "Old", "h1", 10), ("blog/new/index.html", "New & shiny", "h2", 20), ("about/index.html", "About", "h3", 30)])
+        feed = (self.docs / "blog" / "atom.xml").read_text()
+        self.assertIn("<title>Blog</title>", feed)
+        self.assertLess(feed.index("New &amp; shiny"), feed.index("Old"))
+        self.assertNotIn("About", feed)
+
+    def test_large_sitemaps_are_split(self):
+        pages = [(f"p{n}/index.html", f"P{n}", f"h{n}", n) for n in range(30)]
+        index, written = self.build(pages, shard_size=10)
+        shards = sorted(path.name for path in written if path.name.startswith("sitemap-"))
+        self.assertGreaterEqual(len(shards), 4)
+        sitemap = (self.docs / "sitemap.xml").read_text()
+        self.assertIn("<sitemapindex", sitemap)
+        urls = sum((self.docs / name).read_text().count("<url>") for name in shards)
+        self.assertEqual(urls, 30)
+        # one new page rewrites the shard it lands in (and the index), not the others
+        index, written = self.build(pages + [("extra/index.html", "Extra", "hx", 50)], shard_size=10)
+        self.assertEqual(sum(written[self.docs / name] for name in shards), 1)
+
+    def test_partial_build_keeps_other_pages(self):
+        self.build([("a/index.html", "A", "h1", 1), ("b/index.html", "B", "h2", 2)])
+        index, written = self.build([("a/index.html", "A", "h1", 1)], prune=False)
+        self.assertEqual(len(index.pages), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import pathlib
+import tempfile
+import time
+import unittest
+
+from src.highlight import HighlightCache, tokenize, lexer_for
+
+
+class TestHighlight(unittest.TestCase):
+    def test_tokens_round_trip(self):
+        code = 'def f(x):  # add one\n    return x + 1 if x else "none"\n'
+        tokens = tokenize(code, lexer_for("py"))
+        self.assertEqual("".join(text for kind, text in tokens), code)
+        self.assertIn(("keyword", "def"), tokens)
+        self.assertIn(("comment", "# add one"), tokens)
+        self.assertIn(("string", '"none"'), tokens)
+        self.assertIn(("number", "1"), tokens)
+
+    def test_languages(self):
+        self.assertIn(("key", '"a"'), tokenize('{"a": true}', lexer_for("json")))
+        self.assertIn(("variable", "$HOME"), tokenize("echo $HOME # hi", lexer_for("sh")))
+        self.assertIn(("keyword", "const"), tokenize("const x = `t`;", lexer_for("JavaScript")))
+        self.assertIsNone(lexer_for("brainfuck"))
+
+    def test_cache(self):
+        cache = HighlightCache()
+        first = cache.highlight("x = 1", "python")
+        self.assertIs(cache.highlight("x = 1", "python"), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertIsNone(cache.highlight("x = 1", "unknown"))
+
+    def test_aliases_share_entries(self):
+        cache = HighlightCache()
+        cache.highlight("x = 1", "py")
+        cache.highlight("x = 1", "Python")
+        self.assertEqual((len(cache.entries), cache.hits), (1, 1))
+
+    def test_save_drops_unused_entries(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = pathlib.Path(tmp) / "highlight.json"
+            cache = HighlightCache(path)
+            cache.highlight("a = 1", "python")
+            cache.highlight("b = 2", "python")
+            cache.save()
+            cache = HighlightCache(path)
+            cache.highlight("a = 1", "python")
+            cache.save(prune=False)
+            self.assertEqual(len(HighlightCache(path).entries), 2)
+            cache.save()
+            self.assertEqual(len(HighlightCache(path).entries), 0)
+
+    def test_unterminated_strings_and_comments_are_linear(self):
+        for code, language in [('"""' + "x" * 200_000, "python"), ('x """' * 50_000, "python"), ("/*" * 100_000, "css"), ("`a /*" * 50_000, "js")]:
+            start = time.perf_counter()
+            tokens = tokenize(code, lexer_for(language))
+            self.assertLess(time.perf_counter() - start, 2.0)
+            self.assertEqual("".join(text for kind, text in tokens), code)
+
+
+if __name__ == "__main__":
+    unittest.main()
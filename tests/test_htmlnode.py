@@ -1,5 +1,5 @@
 import unittest
-from src.htmlnode import HTMLNode, LeafNode, ParentNode
+from src.htmlnode import HTMLNode, LeafNode, ParentNode, compile_html
 
 class TestHTMLNode(unittest.TestCase):
 
@@ -198,5 +198,51 @@ class TestParentNode(unittest.TestCase):
         self.assertEqual(node.to_html(), expected_html)
 
 
+class TestCompileHtml(unittest.TestCase):
+    def test_matches_to_html(self):
+        node = ParentNode("div", [
+            ParentNode("p", [
+                LeafNode("b", "Bold"),
+                LeafNode(None, " plain "),
+                LeafNode("a", "link", {"href": "https://example.com", "target": "_blank"}),
+                LeafNode("img", "", {"src": "a.png", "alt": "A"}),
+            ]),
+            ParentNode("ul", [ParentNode("li", [LeafNode("", "one")]), ParentNode("li", [LeafNode("i", "two")])]),
+        ])
+        self.assertEqual(compile_html(node).render(), node.to_html())
+
+    def test_parent_props_are_rendered(self):
+        node = ParentNode("h2", [LeafNode(None, "Intro")], {"id": "intro"})
+        self.assertEqual(node.to_html(), '<h2 id="intro">Intro</h2>')
+        self.assertEqual(compile_html(node).render(), node.to_html())
+
+    def test_leaf_values_are_read_at_render_time(self):
+        leaf = LeafNode("b", "before")
+        plan = compile_html(ParentNode("p", [leaf]))
+        leaf.value = "after"
+        self.assertEqual(plan.render(), "<p><b>after</b></p>")
+
+    def test_static_fragments_are_merged(self):
+        plan = compile_html(ParentNode("p", [LeafNode("br", ""), LeafNode("hr", "")]))
+        self.assertEqual(plan.fragments, ["<p><br/><hr/></p>"])
+        self.assertEqual(plan.slots, [])
+
+    def test_escapes_text_and_attributes(self):
+        node = ParentNode("p", [
+            LeafNode(None, "a < b & c"),
+            LeafNode("a", "x>y", {"href": 'https://example.com/?q=1&r="2"'}),
+            LeafNode("code", "\x00<tag>"),
+        ])
+        expected = '<p>a &lt; b &amp; c<a href="https://example.com/?q=1&amp;r=&quot;2&quot;">x&gt;y</a><code>\x00&lt;tag&gt;</code></p>'
+        self.assertEqual(node.to_html(), expected)
+        self.assertEqual(compile_html(node).render(), expected)
+
+    def test_invalid_trees_raise_at_compile_time(self):
+        with self.assertRaises(ValueError):
+            compile_html(ParentNode("div", []))
+        with self.assertRaises(ValueError):
+            compile_html(ParentNode("div", [LeafNode("b", None)]))
+
+
 if __name__ == "__main__":
     unittest.main()
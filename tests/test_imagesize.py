@@ -0,0 +1,79 @@
+import struct
+import tempfile
+import unittest
+import pathlib
+
+from src.imagesize import probe_image_size, ImageSizeCache, annotate_images
+from src.htmlnode import LeafNode, ParentNode
+
+
+def png_bytes(width, height):
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", width, height) + b"\x08\x06\x00\x00\x00"
+
+def gif_bytes(width, height):
+    return b"GIF89a" + struct.pack("<HH", width, height) + b"\x00" * 8
+
+def jpeg_bytes(width, height):
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+    sof = b"\xff\xc0" + struct.pack(">HBHH", 17, 8, height, width) + b"\x03" + b"\x00" * 9
+    return b"\xff\xd8" + app0 + sof + b"\xff\xd9"
+
+def webp_vp8x_bytes(width, height):
+    payload = b"\x00" * 4 + (width - 1).to_bytes(3, "little") + (height - 1).to_bytes(3, "little")
+    return b"RIFF" + struct.pack("<I", 4 + 8 + len(payload)) + b"WEBP" + b"VP8X" + struct.pack("<I", len(payload)) + payload
+
+
+class TestProbeImageSize(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = pathlib.Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, data):
+        path = self.dir / name
+        path.write_bytes(data)
+        return path
+
+    def test_png(self):
+        self.assertEqual(probe_image_size(self.write("a.png", png_bytes(640, 480))), (640, 480))
+
+    def test_gif(self):
+        self.assertEqual(probe_image_size(self.write("a.gif", gif_bytes(32, 16))), (32, 16))
+
+    def test_jpeg(self):
+        self.assertEqual(probe_image_size(self.write("a.jpg", jpeg_bytes(1024, 768))), (1024, 768))
+
+    def test_webp(self):
+        self.assertEqual(probe_image_size(self.write("a.webp", webp_vp8x_bytes(300, 200))), (300, 200))
+
+    def test_unknown_format(self):
+        self.assertIsNone(probe_image_size(self.write("a.txt", b"not an image")))
+
+    def test_missing_file(self):
+        self.assertIsNone(probe_image_size(self.dir / "missing.png"))
+
+    def test_cache_round_trip(self):
+        image = self.write("a.png", png_bytes(10, 20))
+        cache_path = self.dir / "cache" / "image-sizes.json"
+        cache = ImageSizeCache(cache_path)
+        self.assertEqual(cache.get(image), (10, 20))
+        cache.save()
+        reloaded = ImageSizeCache(cache_path)
+        self.assertEqual(reloaded.get(image), (10, 20))
+        self.assertFalse(reloaded.dirty)
+
+    def test_annotate_images(self):
+        (self.dir / "images").mkdir()
+        self.write("images/tom.png", png_bytes(100, 50))
+        image = LeafNode("img", "", {"src": "/images/tom.png", "alt": "Tom"})
+        remote = LeafNode("img", "", {"src": "https://example.com/x.png", "alt": "x"})
+        root = ParentNode("div", [ParentNode("p", [image, remote])])
+        annotate_images(root, static_dir=self.dir, cache=ImageSizeCache())
+        self.assertEqual(image.to_html(), '<img src="/images/tom.png" alt="Tom" width="100" height="50" loading="lazy" decoding="async"/>')
+        self.assertEqual(remote.to_html(), '<img src="https://example.com/x.png" alt="x" loading="lazy" decoding="async"/>')
+
+
+if __name__ == "__main__":
+    unittest.main()
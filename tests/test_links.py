@@ -0,0 +1,31 @@
+import pathlib
+import tempfile
+import unittest
+
+from src.links import LinkChecker
+
+
+class TestLinkChecker(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = pathlib.Path(self.tmp.name) / "index.md"
+        self.source.write_text("# Home\n\nSee [tom](/blog/tom) and [gone](/blog/gone).\n\n![cat](cat.png)\n[again](/blog/gone)\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_broken_links_with_lines(self):
+        checker = LinkChecker("/")
+        checker.add_page(str(self.source), "index.html", ["/blog/tom", "/blog/gone", "cat.png", "/blog/gone", "https://example.com", "#top"])
+        broken = checker.broken({"index.html", "blog/tom/index.html"})
+        self.assertEqual([(link.url, link.line) for link in broken], [("/blog/gone", 3), ("cat.png", 5), ("/blog/gone", 6)])
+        self.assertEqual(str(broken[0]), f"{self.source}:3: broken link /blog/gone")
+
+    def test_basepath_and_html_suffix(self):
+        checker = LinkChecker("/site/")
+        checker.add_page(str(self.source), "blog/index.html", ["/site/about", "tom/", "/elsewhere/x"])
+        self.assertEqual(checker.broken({"about.html", "blog/tom/index.html"}), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+import json
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+from src.main import PageRenderer, build, build_parser, select_sources, worker_count
+from src.output import MemoryOutput
+
+
+class TestSelectSources(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = pathlib.Path(self.tmp.name) / "content"
+        for name in ["index.md", "blog/tom/index.md", "blog/tom/notes.txt", "blog/majesty/index.md", "contact/index.md"]:
+            path = self.content / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("# Hi")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def selected(self, *patterns):
+        return sorted(source.relative for source in select_sources(self.content, list(patterns)))
+
+    def test_directory_selects_sources_below_it(self):
+        self.assertEqual(self.selected("blog/tom"), ["blog/tom/index.md"])
+        self.assertEqual(self.selected("blog/"), ["blog/majesty/index.md", "blog/tom/index.md"])
+
+    def test_globs_and_content_prefix(self):
+        self.assertEqual(self.selected("blog/m*/*.md", str(self.content / "contact") + "/"), ["blog/majesty/index.md", "contact/index.md"])
+        self.assertEqual(self.selected("*.md"), ["index.md"])
+
+    def test_overlapping_patterns_select_once(self):
+        self.assertEqual(self.selected("blog/tom", "blog/*/index.md"), ["blog/majesty/index.md", "blog/tom/index.md"])
+
+    def test_no_match(self):
+        self.assertEqual(self.selected("missing", "blog/*.txt"), [])
+
+
+class TestWorkerCount(unittest.TestCase):
+    def test_default_is_in_process(self):
+        self.assertEqual(worker_count(build_parser().parse_args([])), 1)
+
+    def test_memory_budget_uses_a_pool(self):
+        self.assertGreater(worker_count(build_parser().parse_args(["--max-memory", "1G", "--jobs", "2"])), 1)
+        self.assertGreaterEqual(worker_count(build_parser().parse_args(["--max-memory", "1G"])), 1)
+
+
+class BuildTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmp.name)
+        for name in ["index.md", "blog/index.md"]:
+            path = self.root / "content" / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(f"# {name}\n\n```python\nprint({name!r})\n```\n")
+        (self.root / "static").mkdir()
+        (self.root / "template.html").write_text("<title>{{ Title }}</title>{{ Content }}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def args(self, *extra):
+        root = self.root
+        return build_parser().parse_args(["--content", str(root / "content"), "--static", str(root / "static"), "--destination", str(root / "docs"),
+                                          "--template", str(root / "template.html"), "--cache-dir", str(root / "cache"), *extra])
+
+
+class TestParallelBuild(BuildTestCase):
+    def test_worker_caches_are_saved_by_the_parent(self):
+        root = self.root
+        build(self.args("--jobs", "2"))
+        self.assertTrue((root / "docs" / "blog" / "index.html").exists())
+        self.assertEqual(len(json.loads((root / "cache" / "highlight.json").read_text())), 2)
+        self.assertTrue(json.loads((root / "cache" / "templates.json").read_text()))
+
+    def test_build_into_memory(self):
+        output = MemoryOutput(self.root / "docs")
+        build(self.args("--search-index"), output=output)
+        self.assertFalse((self.root / "docs").exists())
+        self.assertIn("blog/index.html", output.files)
+        self.assertIn("search/docs.json", output.files)
+        manifest = json.loads((self.root / "cache" / "deploy-manifest.json").read_text())
+        self.assertEqual({entry["path"] for entry in manifest["files"]}, set(output.files))
+
+
+class TestPruneAssets(BuildTestCase):
+    def test_orphans_are_not_copied(self):
+        static = self.root / "static"
+        (static / "used.png").write_bytes(b"png")
+        (static / "orphan.png").write_bytes(b"png")
+        (static / "robots.txt").write_text("")
+        (self.root / "content" / "index.md").write_text("# Home\n\n![used](/used.png)")
+        build(self.args())
+        self.assertTrue((self.root / "docs" / "orphan.png").exists())
+        build(self.args("--prune-assets"))
+        self.assertEqual(sorted(path.name for path in (self.root / "docs").iterdir() if path.is_file()), ["index.html", "robots.txt", "used.png"])
+
+
+class TestCheckLinks(BuildTestCase):
+    def test_fail_mode(self):
+        (self.root / "content" / "index.md").write_text("# Home\n\n[blog](/blog/) and [x](/blog/tom)")
+        build(self.args("--check-links", "warn"))
+        # main.py imports links as a top-level module, so its BrokenLinks isn't src.links.BrokenLinks
+        with self.assertRaises(Exception) as raised:
+            build(self.args("--check-links", "fail"))
+        self.assertEqual(type(raised.exception).__name__, "BrokenLinks")
+        self.assertIn("index.md:3: broken link /blog/tom", str(raised.exception))
+        self.assertNotIn("/blog/\n", str(raised.exception))
+
+
+class TestBudgets(BuildTestCase):
+    def test_fail_mode_and_override(self):
+        (self.root / "content" / "index.md").write_text("# Home\n\n![a](/a.png) ![b](/b.png)")
+        (self.root / "static" / "a.png").write_bytes(b"x" * 4096)
+        build(self.args("--budget", "images=1", "--budget-mode", "fail", "--budget-for", "index.md:images=off"))
+        with self.assertRaises(Exception) as raised:
+            build(self.args("--budget", "images=1", "--budget", "assets=2K", "--budget-mode", "fail"))
+        self.assertEqual(type(raised.exception).__name__, "OverBudget")
+        self.assertIn("2 over budget", str(raised.exception))
+
+
+class TestInlineCss(BuildTestCase):
+    def test_inline_and_prune(self):
+        static = self.root / "static"
+        (static / "index.css").write_text("body { background: url(bg.png) } table { border: 0 }")
+        (static / "bg.png").write_bytes(b"png")
+        (self.root / "template.html").write_text('<link href="/index.css" rel="stylesheet"><title>{{ Title }}</title>{{ Content }}')
+        build(self.args("--inline-css", "1K", "--trim-css", "--prune-assets"))
+        html = (self.root / "docs" / "index.html").read_text()
+        self.assertTrue(html.startswith("<style>body{background: url(/bg.png)}</style>"))
+        self.assertTrue((self.root / "docs" / "bg.png").exists())
+        self.assertFalse((self.root / "docs" / "index.css").exists())
+        with self.assertRaises(ValueError):
+            build(self.args("--trim-css"))
+
+
+class TestResume(BuildTestCase):
+    def render_counting(self, fail_at=None):
+        """Patches PageRenderer to count its pages and raise on page fail_at, like a build killed midway"""
+        calls = list()
+        real = PageRenderer.__call__
+
+        def render(renderer, task):
+            calls.append(task.source.name)
+            if len(calls) == fail_at:
+                raise RuntimeError("killed")
+            return real(renderer, task)
+        return calls, mock.patch.object(PageRenderer, "__call__", render)
+
+    def test_resume_renders_only_the_remainder(self):
+        (self.root / "content" / "about.md").write_text("# About\n\nUs.")
+        calls, patch = self.render_counting(fail_at=3)
+        with patch, self.assertRaises(RuntimeError):
+            build(self.args("--search-index"))
+        self.assertTrue((self.root / "cache" / "build-journal.jsonl").exists())
+
+        calls, patch = self.render_counting()
+        with patch:
+            build(self.args("--search-index", "--resume"))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(list((self.root / "docs").rglob("*.html"))), 3)
+        docs = json.loads((self.root / "docs" / "search" / "docs.json").read_text())
+        self.assertEqual(len(docs), 3)
+        self.assertFalse((self.root / "cache" / "build-journal.jsonl").exists())
+
+    def test_changed_output_is_rendered_again(self):
+        build(self.args())
+        calls, patch = self.render_counting(fail_at=2)
+        with patch, self.assertRaises(RuntimeError):
+            build(self.args())
+        journal = (self.root / "cache" / "build-journal.jsonl").read_text().splitlines()
+        finished = pathlib.Path(json.loads(journal[1])["dest"])
+        finished.write_text("tampered")
+        calls, patch = self.render_counting()
+        with patch:
+            build(self.args("--resume"))
+        self.assertEqual(len(calls), 2)
+        self.assertNotEqual(finished.read_text(), "tampered")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import json
+import pathlib
+import tempfile
+import unittest
+
+from src.manifest import ChangeManifest, etag
+
+
+class TestChangeManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = pathlib.Path(self.tmp.name)
+        self.out = self.dir / "docs"
+        self.out.mkdir()
+        self.manifest_path = self.dir / "manifest.json"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, files, partial=False):
+        manifest = ChangeManifest(self.out, self.manifest_path)
+        for name, data in files.items():
+            path = self.out / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+            if name.endswith(".html"):
+                manifest.record_bytes(path, data)
+            else:
+                manifest.record_file(path)
+        if partial:
+            manifest.carry_over()
+        manifest.save()
+        return {entry["path"]: entry["change"] for entry in manifest.entries()}
+
+    def test_change_kinds(self):
+        first = self.build({"index.html": b"a", "blog/tom/index.html": b"b", "index.css": b"c"})
+        self.assertEqual(set(first.values()), {"added"})
+        second = self.build({"index.html": b"a", "blog/tom/index.html": b"changed", "new.html": b"d"})
+        self.assertEqual(second, {
+            "blog/tom/index.html": "changed",
+            "index.html": "unchanged",
+            "index.css": "removed",
+            "new.html": "added",
+        })
+
+    def test_partial_build_keeps_other_outputs(self):
+        self.build({"index.html": b"a", "blog/tom/index.html": b"b"})
+        second = self.build({"blog/tom/index.html": b"changed"}, partial=True)
+        self.assertEqual(second, {"blog/tom/index.html": "changed", "index.html": "unchanged"})
+
+    def test_etags_are_stable(self):
+        self.build({"index.html": b"a"})
+        first = json.loads(self.manifest_path.read_text())["etags"]
+        self.build({"index.html": b"a"})
+        second = json.loads(self.manifest_path.read_text())["etags"]
+        self.assertEqual(first, second)
+        self.assertEqual(first["index.html"], etag("ca978112ca1bbdcafac231b39a23dc4da786eff8147c4e72b9807785afee48bb"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import pathlib
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from src.output import ArchiveOutput, MemoryOutput, write_if_changed, copy_if_changed, sync_tree, remove_stale
+
+
+class TestWriteIfChanged(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = pathlib.Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_unchanged_file_is_not_rewritten(self):
+        path = self.dir / "a" / "index.html"
+        self.assertTrue(write_if_changed(path, b"<p>hi</p>"))
+        os.utime(path, ns=(1, 1))
+        self.assertFalse(write_if_changed(path, b"<p>hi</p>"))
+        self.assertEqual(path.stat().st_mtime_ns, 1)
+
+    def test_changed_file_is_replaced(self):
+        path = self.dir / "index.html"
+        write_if_changed(path, b"old")
+        self.assertTrue(write_if_changed(path, b"new"))
+        self.assertEqual(path.read_bytes(), b"new")
+        self.assertEqual([p.name for p in self.dir.iterdir()], ["index.html"])
+
+    def test_copy_if_changed(self):
+        src = self.dir / "src.css"
+        src.write_bytes(b"body {}")
+        dest = self.dir / "out" / "index.css"
+        self.assertTrue(copy_if_changed(src, dest))
+        self.assertFalse(copy_if_changed(src, dest))
+        self.assertEqual(dest.read_bytes(), b"body {}")
+
+    def test_sync_and_remove_stale(self):
+        static = self.dir / "static"
+        (static / "images").mkdir(parents=True)
+        (static / "images" / "a.png").write_bytes(b"png")
+        out = self.dir / "out"
+        (out / "old").mkdir(parents=True)
+        (out / "old" / "gone.html").write_bytes(b"x")
+        written = sync_tree(static, out)
+        self.assertEqual(written, {out / "images" / "a.png": True})
+        removed = remove_stale(out, set(written))
+        self.assertEqual(removed, [out / "old" / "gone.html"])
+        self.assertFalse((out / "old").exists())
+        self.assertEqual(sync_tree(static, out), {out / "images" / "a.png": False})
+
+
+class TestOutputBackends(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = pathlib.Path(self.tmp.name)
+        self.root = self.dir / "docs"
+        self.static = self.dir / "static"
+        self.static.mkdir()
+        (self.static / "index.css").write_bytes(b"body {}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fill(self, output):
+        sync_tree(self.static, self.root, output)
+        output.write(self.root / "blog" / "index.html", b"<p>hi</p>")
+
+    def test_tar_archive(self):
+        archive = self.dir / "site.tar.gz"
+        output = ArchiveOutput(self.root, archive)
+        self.fill(output)
+        self.assertFalse(archive.exists())
+        output.close()
+        with tarfile.open(archive) as tar:
+            self.assertEqual(sorted(tar.getnames()), ["blog/index.html", "index.css"])
+            self.assertEqual(tar.extractfile("blog/index.html").read(), b"<p>hi</p>")
+        self.assertFalse(self.root.exists())
+
+    def test_zip_archive(self):
+        archive = self.dir / "site.zip"
+        output = ArchiveOutput(self.root, archive)
+        self.fill(output)
+        output.close()
+        with zipfile.ZipFile(archive) as z:
+            self.assertEqual(sorted(z.namelist()), ["blog/index.html", "index.css"])
+            self.assertEqual(z.read("index.css"), b"body {}")
+
+    def test_failed_build_keeps_the_previous_archive(self):
+        archive = self.dir / "site.tar"
+        archive.write_bytes(b"previous")
+        output = ArchiveOutput(self.root, archive)
+        self.fill(output)
+        output.close(succeeded=False)
+        self.assertEqual(archive.read_bytes(), b"previous")
+        self.assertEqual([p.name for p in self.dir.iterdir() if p.name.startswith(".")], [])
+
+    def test_memory_output_is_incremental(self):
+        output = MemoryOutput(self.root)
+        self.fill(output)
+        self.assertEqual(output.files, {"index.css": b"body {}", "blog/index.html": b"<p>hi</p>"})
+        self.assertFalse(output.write(self.root / "index.css", b"body {}"))
+        self.assertEqual(output.remove_stale({self.root / "index.css"}), [self.root / "blog" / "index.html"])
+        self.assertEqual(list(output.files), ["index.css"])
+
+
+if __name__ == "__main__":
+    unittest.main()
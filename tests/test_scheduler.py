@@ -0,0 +1,114 @@
+import pathlib
+import tempfile
+import time
+import unittest
+
+from src.scheduler import BASE_PAGE_BYTES, BYTES_PER_SOURCE_BYTE, SECONDS_PER_SOURCE_BYTE, CostHistory, MemoryProbe, PageCost, largest_first, parallel_efficiency, parse_size, run_pages
+
+
+def timed_sleep(seconds):
+    start = time.time()
+    time.sleep(seconds)
+    return start, time.time()
+
+
+class TestParseSize(unittest.TestCase):
+    def test_suffixes(self):
+        self.assertEqual(parse_size("512"), 512)
+        self.assertEqual(parse_size("4K"), 4096)
+        self.assertEqual(parse_size("512M"), 512 * 1024 ** 2)
+        self.assertEqual(parse_size("1.5g"), 3 * 1024 ** 3 // 2)
+        self.assertEqual(parse_size("2GiB"), 2 * 1024 ** 3)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            parse_size("lots")
+
+
+class TestCostHistory(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmp.name) / "page-costs.json"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_unknown_page_is_estimated_from_source_size(self):
+        history = CostHistory(self.path)
+        self.assertEqual(history.estimate_memory("a.md", 1000), BASE_PAGE_BYTES + 1000 * BYTES_PER_SOURCE_BYTE)
+
+    def test_recorded_peak_is_reused_and_scaled(self):
+        history = CostHistory(self.path)
+        history.record(PageCost("a.md", 1000, peak_bytes=5_000_000))
+        history.save()
+        history = CostHistory(self.path)
+        self.assertEqual(history.estimate_memory("a.md", 1000), 5_000_000)
+        self.assertEqual(history.estimate_memory("a.md", 2000), 10_000_000)
+
+    def test_non_positive_peak_falls_back_to_source_size(self):
+        history = CostHistory(self.path)
+        history.record(PageCost("a.md", 1000, peak_bytes=-4096))
+        history.save()
+        history = CostHistory(self.path)
+        self.assertEqual(history.estimate_memory("a.md", 1000), BASE_PAGE_BYTES + 1000 * BYTES_PER_SOURCE_BYTE)
+
+    def test_render_time_is_estimated_from_history(self):
+        history = CostHistory(self.path)
+        self.assertEqual(history.estimate_seconds("new.md", 1000), 1000 * SECONDS_PER_SOURCE_BYTE)
+        history.record(PageCost("a.md", 1000, seconds=0.5))
+        history.record(PageCost("b.md", 3000, seconds=0.5))
+        history.save()
+        history = CostHistory(self.path)
+        self.assertAlmostEqual(history.estimate_seconds("a.md", 2000), 1.0)
+        # new pages use the rate of the recorded ones: 1 s per 4000 bytes
+        self.assertAlmostEqual(history.estimate_seconds("new.md", 2000), 0.5)
+
+    def test_heaviest(self):
+        history = CostHistory()
+        for name, peak in [("a", 10), ("b", 30), ("c", 20)]:
+            history.record(PageCost(name, 1, peak_bytes=peak))
+        self.assertEqual([cost.source for cost in history.heaviest(2)], ["b", "c"])
+
+
+class TestMemoryProbe(unittest.TestCase):
+    def test_traced_peak_covers_allocation(self):
+        with MemoryProbe(trace=True) as probe:
+            block = bytearray(4 * 1024 * 1024)
+            del block
+        self.assertGreaterEqual(probe.peak_bytes, 4 * 1024 * 1024)
+        self.assertGreater(probe.seconds, 0)
+
+    def test_rss_peak_is_never_negative(self):
+        # freeing memory inside the block can leave RSS below where it started
+        block = bytearray(16 * 1024 * 1024)
+        with MemoryProbe() as probe:
+            del block
+        self.assertGreaterEqual(probe.peak_bytes, 0)
+
+
+class TestLargestFirst(unittest.TestCase):
+    def test_order(self):
+        sizes = {"a": 1, "b": 5, "c": 3, "d": 5}
+        self.assertEqual(largest_first(sizes, sizes.get), ["b", "d", "c", "a"])
+
+    def test_parallel_efficiency(self):
+        self.assertEqual(parallel_efficiency(8.0, 2.0, 4), 1.0)
+        self.assertEqual(parallel_efficiency(4.0, 2.0, 4), 0.5)
+        self.assertEqual(parallel_efficiency(0.0, 0.0, 4), 1.0)
+
+
+class TestRunPages(unittest.TestCase):
+    def test_inline_keeps_order(self):
+        results = list(run_pages([3, 1, 2], lambda n: n * 10))
+        self.assertEqual(results, [(3, 30), (1, 10), (2, 20)])
+
+    def test_parallel_renders_every_task(self):
+        results = list(run_pages([0.01, 0.02, 0.03, 0.04], timed_sleep, jobs=3))
+        self.assertEqual(sorted(task for task, interval in results), [0.01, 0.02, 0.03, 0.04])
+
+    def test_budget_limits_concurrency(self):
+        # every task alone fills the budget, so they must run one after another despite jobs=3
+        results = list(run_pages([0.05] * 3, timed_sleep, jobs=3, max_memory=100, estimate=lambda task: 100))
+        intervals = sorted(interval for task, interval in results)
+        for (_, end), (start, _) in zip(intervals, intervals[1:]):
+            self.assertGreaterEqual(start, end)
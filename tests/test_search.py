@@ -0,0 +1,79 @@
+import json
+import pathlib
+import tempfile
+import unittest
+
+from src.search import SearchIndex, tokenize, delta_encode, delta_decode, page_url
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = pathlib.Path(self.tmp.name)
+        self.state = self.dir / "state.json"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def lookup(self, term):
+        search_dir = self.dir / "docs" / "search"
+        shard = json.loads((search_dir / "shards" / f"{term[:2]}.json").read_text())
+        docs = {doc_id: url for doc_id, url, title in json.loads((search_dir / "docs.json").read_text())}
+        position = shard["terms"].index(term)
+        return [docs[doc_id] for doc_id in delta_decode(shard["postings"][position])]
+
+    def test_helpers(self):
+        self.assertEqual(tokenize("Tom, tom and a Hobbit!"), {"tom": 2, "and": 1, "hobbit": 1})
+        self.assertEqual(delta_encode([2, 5, 9]), [2, 3, 4])
+        self.assertEqual(delta_decode([2, 3, 4]), [2, 5, 9])
+        self.assertEqual(page_url(pathlib.Path("blog/tom/index.html"), "/site/"), "/site/blog/tom/")
+
+    def test_index_and_incremental_update(self):
+        index = SearchIndex(self.state)
+        index.add_page("/", "Home", "Tolkien fan club")
+        index.add_page("/blog/tom/", "Tom", "Tom Bombadil and Tolkien")
+        index.write(self.dir / "docs")
+        index.save()
+        self.assertEqual(self.lookup("tolkien"), ["/", "/blog/tom/"])
+
+        index = SearchIndex(self.state)
+        index.add_page("/", "Home", "Tolkien fan club")
+        index.add_page("/blog/tom/", "Tom", "Glorfindel instead")
+        written = index.write(self.dir / "docs")
+        self.assertEqual(index.tokenized, 1)
+        self.assertEqual(self.lookup("tolkien"), ["/"])
+        self.assertEqual(self.lookup("glorfindel"), ["/blog/tom/"])
+        self.assertFalse(written[self.dir / "docs" / "search" / "shards" / "fa.json"])
+
+    def test_ids_are_not_reused(self):
+        index = SearchIndex(self.state)
+        index.add_page("/a/", "A", "x")
+        index.add_page("/b/", "B", "x")
+        index.seen = {"/b/"}
+        index.write(self.dir / "docs")
+        index.save()
+        index = SearchIndex(self.state)
+        index.add_page("/b/", "B", "x")
+        index.add_page("/c/", "C", "x")
+        self.assertEqual({url: doc["id"] for url, doc in index.docs.items()}, {"/b/": 1, "/c/": 2})
+
+    def test_removed_pages_are_dropped(self):
+        index = SearchIndex()
+        index.add_page("/a/", "A", "shared words")
+        index.add_page("/b/", "B", "shared words")
+        index.write(self.dir / "docs")
+        index.seen = {"/a/"}
+        index.write(self.dir / "docs")
+        self.assertEqual(self.lookup("shared"), ["/a/"])
+
+    def test_partial_write_keeps_unseen_pages(self):
+        index = SearchIndex()
+        index.add_page("/a/", "A", "shared words")
+        index.add_page("/b/", "B", "shared words")
+        index.seen = {"/a/"}
+        index.write(self.dir / "docs", prune=False)
+        self.assertEqual(self.lookup("shared"), ["/a/", "/b/"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import gzip
+import http.client
+import pathlib
+import tempfile
+import threading
+import unittest
+
+from src.serve import StaticServer, accepted_encodings, parse_cache_rule
+
+
+class TestAcceptEncoding(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(accepted_encodings("gzip, deflate, br"), {"gzip", "deflate", "br"})
+        self.assertEqual(accepted_encodings("br;q=0, gzip;q=0.5"), {"gzip"})
+        self.assertEqual(accepted_encodings("*;q=1, br;q=0"), {"*", "gzip"})
+        self.assertEqual(accepted_encodings(None), set())
+
+    def test_cache_rule(self):
+        self.assertEqual(parse_cache_rule("*.css=public, max-age=60"), ("*.css", "public, max-age=60"))
+        with self.assertRaises(ValueError):
+            parse_cache_rule("no-cache")
+
+
+class TestStaticServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = pathlib.Path(self.tmp.name) / "docs"
+        (root / "blog").mkdir(parents=True)
+        (root / "index.html").write_text("<h1>Home</h1>")
+        (root / "blog" / "index.html").write_text("<h1>Blog</h1>")
+        (root / "index.css").write_text("body {}" * 100)
+        (root / "index.css.gz").write_bytes(gzip.compress(b"body {}" * 100))
+        (pathlib.Path(self.tmp.name) / "secret.txt").write_text("no")
+        self.server = StaticServer(("127.0.0.1", 0), str(root), [parse_cache_rule("*.css=public, max-age=60")], quiet=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self.thread.start()
+        self.connection = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1], timeout=5)
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def get(self, path, **headers):
+        self.connection.request("GET", path, headers=headers)
+        response = self.connection.getresponse()
+        return response, response.read()
+
+    def test_validators_and_304(self):
+        response, body = self.get("/")
+        self.assertEqual((response.status, body), (200, b"<h1>Home</h1>"))
+        self.assertEqual(response.getheader("Content-Type"), "text/html; charset=utf-8")
+        self.assertEqual(response.getheader("Cache-Control"), "no-cache")
+        tag = response.getheader("ETag")
+        response, body = self.get("/", **{"If-None-Match": tag})
+        self.assertEqual((response.status, body), (304, b""))
+        response, body = self.get("/", **{"If-Modified-Since": response.getheader("Last-Modified")})
+        self.assertEqual(response.status, 304)
+
+    def test_precompressed_sibling(self):
+        response, body = self.get("/index.css", **{"Accept-Encoding": "gzip"})
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        self.assertEqual(gzip.decompress(body), b"body {}" * 100)
+        self.assertEqual(response.getheader("Vary"), "Accept-Encoding")
+        self.assertEqual(response.getheader("Cache-Control"), "public, max-age=60")
+        gzip_tag = response.getheader("ETag")
+        response, body = self.get("/index.css")
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertEqual(body, b"body {}" * 100)
+        self.assertNotEqual(response.getheader("ETag"), gzip_tag)
+
+    def test_directories_and_missing_files(self):
+        response, body = self.get("/blog")
+        self.assertEqual((response.status, response.getheader("Location")), (301, "/blog/"))
+        response, body = self.get("/blog/")
+        self.assertEqual(body, b"<h1>Blog</h1>")
+        self.assertEqual(self.get("/missing.html")[0].status, 404)
+        self.assertEqual(self.get("/../secret.txt")[0].status, 404)
+        self.assertEqual(self.get("/%2e%2e/secret.txt")[0].status, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import pathlib
+import tempfile
+import unittest
+
+from src.stylesheets import StylesheetInliner, parse_rules, selector_tags, serialize, split_selectors
+from src.templates import CompiledTemplate
+from src.transforms import PageContext
+
+CSS = """/* site */
+body { margin: 0 }
+h1, h2 > b, .note { color: red }
+@media (max-width: 600px) { table td { padding: 0 } pre { overflow: auto } }
+@font-face { font-family: x; src: url(fonts/x.woff2) }
+a[href^="http"]:not(.plain)::after { content: "}" }
+"""
+
+
+class TestParse(unittest.TestCase):
+    def test_selectors(self):
+        self.assertEqual(split_selectors("h1, :is(h2, h3) b,.x"), ["h1", ":is(h2, h3) b", ".x"])
+        self.assertEqual(selector_tags("ul > li.item a:hover"), {"ul", "li", "a"})
+        self.assertEqual(selector_tags('.toc [data-x="p"]:not(div)'), set())
+
+    def test_trim(self):
+        rules = parse_rules(" ".join(CSS.split("*/", 1)[1].split()))
+        self.assertEqual(serialize(rules, frozenset({"body", "h1"})).splitlines(), [
+            "body{margin: 0}", "h1,.note{color: red}", "@font-face{font-family: x; src: url(fonts/x.woff2)}"])
+        trimmed = serialize(rules, frozenset({"body", "pre", "a"}))
+        self.assertIn("@media (max-width: 600px){pre{overflow: auto}}", trimmed)
+        self.assertIn('a[href^="http"]:not(.plain)::after{content: "}"}', trimmed)
+
+
+class TestStylesheetInliner(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = pathlib.Path(self.tmp.name)
+        (self.static / "css").mkdir()
+        (self.static / "css" / "site.css").write_text(CSS)
+        (self.static / "big.css").write_text("p { color: red }" * 100)
+        self.template = CompiledTemplate(['<html><head><link rel="stylesheet" href="/css/site.css" media="print"><link href="/big.css" rel="stylesheet">'
+                                          '<link rel="icon" href="/favicon.ico"></head><body><h1>', "Title", "</h1>", "Content", "</body></html>"], {})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_inline_small_stylesheets(self):
+        inliner = StylesheetInliner(self.static, "/site/", max_bytes=1024)
+        template, values = inliner.inline(self.template, {"Title": "Hi", "Content": ""})
+        html = template.render(values)
+        self.assertIn('<style media="print">body{margin: 0}', html)
+        self.assertIn("url(/site/css/fonts/x.woff2)", html)
+        self.assertNotIn("site.css", html)
+        self.assertIn('<link href="/big.css" rel="stylesheet">', html)
+        self.assertIs(inliner.inline(self.template, {})[0], template)
+
+        (self.static / "css" / "site.css").write_text("body { margin: 1px }")
+        os.utime(self.static / "css" / "site.css", ns=(1, 1))
+        self.assertIn("body{margin: 1px}", inliner.inline(self.template, {})[0].render({}))
+
+    def test_trim_per_page(self):
+        inliner = StylesheetInliner(self.static, max_bytes=1024, trim=True)
+        page = PageContext()
+        page.data["tags"] = {"p", "pre"}
+        page.values["Toc"] = '<ul><li><a href="#x">x</a></li></ul>'
+        template, values = inliner.inline(self.template, {"Title": "Hi", "Content": "<p>x</p>"}, page)
+        html = template.render(values)
+        self.assertIn("pre{overflow: auto}", html)
+        self.assertIn("::after", html)
+        self.assertNotIn("td{", html)
+        self.assertNotIn("h2 > b", html)
+        stylesheet, = inliner.stylesheets.values()
+        self.assertEqual(len(stylesheet.trimmed), 1)
+        inliner.inline(self.template, {}, page)
+        self.assertEqual(len(stylesheet.trimmed), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import pathlib
+import tempfile
+import unittest
+
+from src.templates import TemplateLoader, TemplateError, layout_directive, directory_layout
+
+
+class TestTemplateLoader(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = pathlib.Path(self.tmp.name)
+        self.write("base.html", '<html><title>{{ Title }}</title>{% include "partials/nav.html" %}'
+                                '<main>{% block main %}<article>{{ Content }}</article>{% endblock %}</main>'
+                                '<footer>{% block footer %}base footer{% endblock %}</footer></html>')
+        self.write("partials/nav.html", "<nav>{{ Nav }}</nav>")
+        self.write("blog.html", '{% extends "base.html" %}{% block footer %}blog footer{% endblock %}')
+        self.write("docs.html", '{% extends "blog.html" %}{% block main %}<div class="docs">{{ Content }}</div>{% endblock %}')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        path = self.dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+        return path
+
+    def test_plain_template_is_unchanged(self):
+        path = self.write("plain.html", "<title>{{ Title }}</title><p>{{ Content }}</p>{{ Other }}")
+        rendered = TemplateLoader().load(path).render({"Title": "T", "Content": "C"})
+        self.assertEqual(rendered, "<title>T</title><p>C</p>{{ Other }}")
+
+    def test_extends_and_include(self):
+        rendered = TemplateLoader().load(self.dir / "blog.html").render({"Title": "T", "Content": "C", "Nav": "N"})
+        self.assertEqual(rendered, "<html><title>T</title><nav>N</nav><main><article>C</article></main><footer>blog footer</footer></html>")
+
+    def test_multi_level_extends(self):
+        rendered = TemplateLoader().load(self.dir / "docs.html").render({"Title": "T", "Content": "C", "Nav": "N"})
+        self.assertEqual(rendered, '<html><title>T</title><nav>N</nav><main><div class="docs">C</div></main><footer>blog footer</footer></html>')
+
+    def test_compiled_once_and_persisted(self):
+        cache_path = self.dir / "cache" / "templates.json"
+        loader = TemplateLoader(cache_path)
+        first = loader.load(self.dir / "blog.html")
+        self.assertIs(loader.load(self.dir / "blog.html"), first)
+        loader.save()
+        reloaded = TemplateLoader(cache_path)
+        self.assertEqual(reloaded.load(self.dir / "blog.html").fragments, first.fragments)
+        self.assertFalse(reloaded.dirty)
+
+    def test_changed_dependency_invalidates_disk_cache(self):
+        cache_path = self.dir / "templates.json"
+        loader = TemplateLoader(cache_path)
+        loader.load(self.dir / "blog.html")
+        loader.save()
+        self.write("partials/nav.html", "<nav>changed</nav>")
+        rendered = TemplateLoader(cache_path).load(self.dir / "blog.html").render({"Title": "T", "Content": "C"})
+        self.assertIn("<nav>changed</nav>", rendered)
+
+    def test_changed_parent_invalidates_memory_cache(self):
+        loader = TemplateLoader()
+        loader.load(self.dir / "blog.html")
+        path = self.write("base.html", "<body>{% block main %}{% endblock %}{% block footer %}{% endblock %}</body>")
+        os.utime(path, ns=(1, 1))
+        self.assertEqual(loader.load(self.dir / "blog.html").render({}), "<body>blog footer</body>")
+
+    def test_errors(self):
+        with self.assertRaises(TemplateError):
+            TemplateLoader().load(self.write("bad.html", "{% block a %}unclosed"))
+        with self.assertRaises(TemplateError):
+            TemplateLoader().load(self.write("loop.html", '{% include "loop.html" %}'))
+
+
+class TestLayoutSelection(unittest.TestCase):
+    def test_layout_directive(self):
+        self.assertEqual(layout_directive("<!-- layout: docs -->\n# Title"), ("docs", "# Title"))
+        self.assertEqual(layout_directive("# Title"), (None, "# Title"))
+
+    def test_directory_layout(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            content = pathlib.Path(tmp)
+            (content / "blog" / "tom").mkdir(parents=True)
+            (content / "blog" / ".layout").write_text("blog\n")
+            cache = dict()
+            self.assertEqual(directory_layout(content / "blog" / "tom" / "index.md", content, cache), "blog")
+            self.assertIsNone(directory_layout(content / "index.md", content, cache))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 from src.textnode import TextNode, TextType
+from src.utils import text_to_textnodes
 
 class TestTextNode(unittest.TestCase):
     def test_equal_nodes(self):
@@ -46,6 +47,18 @@ class TestTextNode(unittest.TestCase):
         for text_type in TextType:
             node = TextNode("Example", text_type)
             self.assertEqual(node.text_type, text_type)
+    def test_span_reads_its_part_of_the_source(self):
+        source = "plain **bold** plain"
+        node = TextNode(source, TextType.BOLD, start=8, end=12)
+        self.assertEqual(node.text, "bold")
+        self.assertEqual(node, TextNode("bold", TextType.BOLD))
+        self.assertEqual(repr(node), "TextNode(bold, bold, None)")
+
+    def test_split_nodes_share_the_source(self):
+        source = "a **b** _c_ [d](/e) `f`"
+        nodes = text_to_textnodes(source)
+        self.assertTrue(all(node.source is source for node in nodes))
+        self.assertEqual([node.text for node in nodes], ["a ", "b", " ", "c", " ", "d", " ", "f"])
 
 if __name__ == "__main__":
     unittest.main()
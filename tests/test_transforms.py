@@ -0,0 +1,99 @@
+import os
+import pathlib
+import tempfile
+import unittest
+
+from src.htmlnode import LeafNode, ParentNode
+from src.transforms import Transform, TransformPipeline, PageText, HeadingAnchors, TableOfContents, ExternalLinks, WordCount, default_pipeline
+from src.utils import render_page
+from src.imagesize import ImageSizeCache
+
+
+class CountingTransform(Transform):
+    name = "counting"
+
+    def __init__(self):
+        self.visited = list()
+
+    def hooks(self):
+        return {"p": self.visit, "b": self.visit}
+
+    def visit(self, node, page):
+        self.visited.append(node.tag)
+
+
+def sample_tree():
+    return ParentNode("div", [
+        ParentNode("h1", [LeafNode("", "Title")]),
+        ParentNode("p", [LeafNode("", "Some "), LeafNode("b", "bold"), LeafNode("", " words")]),
+        ParentNode("h2", [LeafNode("", "First part")]),
+        ParentNode("h3", [LeafNode("", "Detail")]),
+        ParentNode("h2", [LeafNode("", "First part")]),
+        ParentNode("p", [LeafNode("a", "out", {"href": "https://example.com"}), LeafNode("a", "in", {"href": "/blog/tom"})]),
+    ])
+
+
+class TestTransformPipeline(unittest.TestCase):
+    def test_hooks_run_per_tag_in_document_order(self):
+        counting = CountingTransform()
+        pipeline = TransformPipeline([counting, PageText()])
+        page = pipeline.run(sample_tree())
+        self.assertEqual(counting.visited, ["p", "b", "p"])
+        self.assertEqual(page.data["text"], "Title Some  bold  words First part Detail First part out in")
+        self.assertEqual(set(pipeline.timings), {"counting", "text"})
+        self.assertEqual(pipeline.pages, 1)
+
+    def test_builtin_transforms_in_one_pass(self):
+        root = sample_tree()
+        pipeline = TransformPipeline([HeadingAnchors(), TableOfContents(), ExternalLinks(), WordCount()])
+        page = pipeline.run(root)
+        self.assertEqual([child.props["id"] for child in root.children if child.tag.startswith("h")],
+                         ["title", "first-part", "detail", "first-part-2"])
+        self.assertEqual(page.values["Toc"],
+                         '<ul class="toc"><li><a href="#first-part">First part</a><ul><li><a href="#detail">Detail</a></li></ul></li>'
+                         '<li><a href="#first-part-2">First part</a></li></ul>')
+        links = root.children[-1].children
+        self.assertEqual(links[0].props["rel"], "noopener noreferrer external")
+        self.assertNotIn("rel", links[1].props)
+        self.assertEqual(page.values["WordCount"], "11")
+
+
+class TestRenderPageCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = pathlib.Path(self.tmp.name)
+        self.page = self.dir / "index.md"
+        self.page.write_text("# Title\n\n## Part\n\n![img](/a.png)")
+        self.template = self.dir / "template.html"
+        self.template.write_text("{{ Content }}")
+        self.static = self.dir / "static"
+        self.static.mkdir()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def render(self, cache, extra=()):
+        transforms = default_pipeline(static_dir=self.static, image_cache=ImageSizeCache(), extra=list(extra))
+        return render_page(self.page, self.template, "/", static_dir=self.static, page_cache=cache, transforms=transforms).html
+
+    def test_changed_transforms_are_not_served_from_cache(self):
+        cache = dict()
+        plain = self.render(cache)
+        anchored = self.render(cache, [HeadingAnchors()])
+        self.assertNotIn('id="part"', plain)
+        self.assertIn('id="part"', anchored)
+        self.assertEqual(self.render(cache), plain)
+
+    def test_changed_image_invalidates_cache(self):
+        cache = dict()
+        self.assertNotIn('width=', self.render(cache))
+        (self.static / "a.png").write_bytes(b"\x89PNG\r\n\x1a\n" + b"\0\0\0\rIHDR" + (3).to_bytes(4, "big") + (2).to_bytes(4, "big"))
+        self.assertIn('width="3" height="2"', self.render(cache))
+
+    def test_pipeline_without_page_text(self):
+        page = render_page(self.page, self.template, "/", transforms=TransformPipeline([HeadingAnchors()]))
+        self.assertEqual(page.text, "")
+
+
+if __name__ == "__main__":
+    unittest.main()